@@ -0,0 +1,140 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.schema import SCHEMAS, load_schema
+from data.shards import ShardedDataset
+from model.export import reset_peak_rss, rss
+from model.loader import ShardLoader, feature_stats, normalization_layer, split_indices
+from model.model import ARCHITECTURES, read_data
+from src.engine import WINDOW_SHAPE, make_live_predictor
+
+# Learnable synthetic signs: every class is a random trajectory, samples are that trajectory plus noise
+def synthetic_dataset(num_classes, samples_per_class, schema, seed=0):
+    rng = np.random.default_rng(seed)
+    prototypes = rng.random((num_classes, WINDOW_SHAPE[0], schema.size), dtype=np.float32)
+    labels = np.repeat(np.arange(num_classes), samples_per_class)
+    windows = prototypes[labels] + rng.normal(0, 0.2, (len(labels),) + prototypes.shape[1:]).astype(np.float32)
+    return ShardedDataset([windows], labels, schema)
+
+# Captured dataset written by process.py, or synthetic windows when there is none
+def load_dataset(data_path, num_classes, samples_per_class, schema):
+    if data_path:
+        sign_mapping, dataset, _ = read_data(data_path)
+        return dataset, len(sign_mapping)
+    return synthetic_dataset(num_classes, samples_per_class, schema), num_classes
+
+# Seconds one call takes
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+# Runs in a fresh process per architecture, so the peak memory is that model's alone and one model's
+# graphs and threads do not slow the next one down
+def measure_architecture(task):
+    name, data_path, num_classes, samples_per_class, schema, batch_sizes, live_windows, repeats, epochs = task
+    dataset, num_classes = load_dataset(data_path, num_classes, samples_per_class, schema)
+    train_idx, test_idx = split_indices(dataset.labels, test_size=0.2, seed=42)
+    normalization = normalization_layer(*feature_stats(dataset, train_idx))
+    windows = dataset.take(test_idx)
+
+    # Cost does not depend on the weights, so it is measured before training
+    reset_peak_rss()
+    baseline = rss()
+    model = ARCHITECTURES[name](num_classes, dataset.shape[-1], normalization)
+
+    # One window per call like detect.py
+    predict = make_live_predictor(model)
+    predict(windows[0])
+    times = []
+    for i in range(live_windows):
+        start = time.perf_counter()
+        predict(windows[i % len(windows)])
+        times.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(times, [50, 99])
+
+    # Batches like video_to_text, best of a few runs
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = windows[np.arange(batch_size) % len(windows)]
+        model.predict_on_batch(batch)
+        best = min(timed(model.predict_on_batch, batch) for _ in range(repeats))
+        throughput[batch_size] = batch_size / best
+    peak = rss('VmHWM') - baseline
+
+    # Held-out accuracy after a short training run
+    accuracy = None
+    if epochs:
+        model.compile(optimizer='Adam', loss='categorical_crossentropy', metrics=['categorical_accuracy'])
+        model.fit(ShardLoader(dataset, train_idx, num_classes, batch_size=32, seed=42, workers=1), epochs=epochs, verbose=0)
+        test_data = ShardLoader(dataset, test_idx, num_classes, batch_size=256, shuffle=False, workers=1)
+        predictions = np.argmax(model.predict(test_data, verbose=0), axis=1)
+        accuracy = float(np.mean(predictions == dataset.labels[test_idx]))
+
+    return {
+        'architecture': name,
+        'params': int(model.count_params()),
+        'latency_p50_ms': p50 * 1e3,
+        'latency_p99_ms': p99 * 1e3,
+        'throughput': throughput,
+        'peak_rss_mb': peak,
+        'accuracy': accuracy,
+    }
+
+# JSON keeps the throughput per batch size as a mapping, the CSV has one column per batch size
+def write_report(results, output):
+    with open(output + '.json', 'w') as f:
+        json.dump(results, f, indent=4)
+    batch_sizes = sorted({int(b) for r in results for b in r['throughput']})
+    with open(output + '.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['architecture', 'params', 'latency_p50_ms', 'latency_p99_ms', 'peak_rss_mb', 'accuracy']
+                        + [f'throughput_b{b}' for b in batch_sizes])
+        for r in results:
+            writer.writerow([r['architecture'], r['params'], f'{r["latency_p50_ms"]:.3f}', f'{r["latency_p99_ms"]:.3f}',
+                             f'{r["peak_rss_mb"]:.1f}', '' if r['accuracy'] is None else f'{r["accuracy"]:.4f}']
+                            + [f'{r["throughput"][b]:.1f}' for b in batch_sizes])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost and accuracy of every registered model architecture on the CPU')
+    parser.add_argument('--architectures', nargs='+', choices=ARCHITECTURES, default=list(ARCHITECTURES))
+    parser.add_argument('--data', help='processed dataset to use instead of synthetic windows')
+    parser.add_argument('--schema', choices=SCHEMAS, default='full', help='feature schema of the synthetic windows')
+    parser.add_argument('--classes', type=int, default=6, help='synthetic signs')
+    parser.add_argument('--samples', type=int, default=40, help='synthetic windows per sign')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--live-windows', type=int, default=200, help='single windows timed for the percentiles')
+    parser.add_argument('--repeats', type=int, default=5, help='runs per batch size, the fastest counts')
+    parser.add_argument('--epochs', type=int, default=5, help='training epochs before the accuracy, 0 skips it')
+    parser.add_argument('--output', default='architectures', help='report is written to OUTPUT.json and OUTPUT.csv')
+    args = parser.parse_args()
+
+    # CPU only, like the servers. Set before the architecture processes start and import TensorFlow
+    os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+    schema = load_schema(args.data) if args.data else SCHEMAS[args.schema]
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in args.architectures:
+        task = (name, args.data, args.classes, args.samples, schema, args.batch_sizes, args.live_windows, args.repeats, args.epochs)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(measure_architecture, task).result())
+
+    print(f'{"architecture":<14}{"params":>10}{"p50 ms":>9}{"p99 ms":>9}{"peak MB":>9}{"accuracy":>10}'
+          + ''.join(f'{f"b{b}/s":>10}' for b in args.batch_sizes))
+    for r in results:
+        accuracy = f'{r["accuracy"] * 100:.2f}%' if r['accuracy'] is not None else '-'
+        print(f'{r["architecture"]:<14}{r["params"]:>10}{r["latency_p50_ms"]:>9.3f}{r["latency_p99_ms"]:>9.3f}'
+              f'{r["peak_rss_mb"]:>9.1f}{accuracy:>10}' + ''.join(f'{r["throughput"][b]:>10.1f}' for b in args.batch_sizes))
+    write_report(results, args.output)
+    print(f'Report written to {args.output}.json and {args.output}.csv')
@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+import timeit
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.augment import Augmenter
+from data.schema import SCHEMAS
+
+# Batch like the captured data: landmarks in [0, 1], left hand missing in a third of the frames
+def make_batch(rng, batch_size, schema):
+    x = rng.random((batch_size, 30, schema.size), dtype=np.float32)
+    x[:, ::3, schema.left_hand_slice] = 0
+    return x
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost of batch augmentation per batch')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--number', type=int, default=20, help='batches per measurement')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Each step alone, then everything together as used in training
+    steps = {
+        'mirror': dict(mirror=1.0, jitter=0, scale=0, shift=0, speed=0, frame_dropout=0),
+        'jitter': dict(mirror=0, jitter=0.003, scale=0, shift=0, speed=0, frame_dropout=0),
+        'scale+shift': dict(mirror=0, jitter=0, scale=0.1, shift=0.05, speed=0, frame_dropout=0),
+        'speed': dict(mirror=0, jitter=0, scale=0, shift=0, speed=0.2, frame_dropout=0),
+        'frame dropout': dict(mirror=0, jitter=0, scale=0, shift=0, speed=0, frame_dropout=0.05),
+        'all': dict(),
+    }
+
+    print(f'{"schema":<18}{"batch":>6}  {"step":<15}{"ms/batch":>10}{"us/sample":>11}')
+    for schema in SCHEMAS.values():
+        for batch_size in args.batch_sizes:
+            x = make_batch(rng, batch_size, schema)
+            for name, options in steps.items():
+                augment = Augmenter(schema, **options)
+                seconds = min(timeit.repeat(lambda: augment(x, rng), number=args.number, repeat=3)) / args.number
+                print(f'{schema.name:<18}{batch_size:>6}  {name:<15}{seconds * 1e3:>10.2f}{seconds / batch_size * 1e6:>11.1f}')
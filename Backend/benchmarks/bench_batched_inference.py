@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from model.model import create_complex_model
+from src.engine import WINDOW_SHAPE, make_live_predictor, predict_windows
+
+# Current approach: model.predict on every frame once 30 frames are buffered
+def per_frame_predict(model, keypoints):
+    sequence, results = [], []
+    for frame in keypoints:
+        sequence.append(frame)
+        sequence = sequence[-30:]
+        if len(sequence) == 30:
+            results.append(model.predict(np.expand_dims(sequence, axis=0), verbose=0)[0])
+    return np.array(results)
+
+# Live path: direct call with a fixed input signature on every frame
+def per_frame_live(model, keypoints):
+    predict = make_live_predictor(model)
+    sequence, results = [], []
+    for frame in keypoints:
+        sequence.append(frame)
+        sequence = sequence[-30:]
+        if len(sequence) == 30:
+            results.append(predict(sequence))
+    return np.array(results)
+
+def time_run(name, func, *args):
+    # Warm up once so graph building is not counted
+    func(*args)
+    start = time.perf_counter()
+    result = func(*args)
+    duration = time.perf_counter() - start
+    return name, duration, result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare per-frame model.predict with batched sliding-window inference')
+    parser.add_argument('--frames', type=int, default=300, help='number of frames in the synthetic video')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--classes', type=int, default=6)
+    args = parser.parse_args()
+
+    model = create_complex_model(args.classes)
+    keypoints = np.random.default_rng(0).random((args.frames, WINDOW_SHAPE[1]), dtype=np.float32)
+
+    runs = [
+        time_run('per-frame predict', per_frame_predict, model, keypoints),
+        time_run('per-frame live', per_frame_live, model, keypoints),
+        time_run(f'batched (batch={args.batch_size})', lambda m, k: predict_windows(m, k, args.batch_size), model, keypoints),
+    ]
+
+    baseline = runs[0][2]
+    print(f'{"method":<28}{"seconds":>10}{"frames/sec":>14}{"max diff":>12}')
+    for name, duration, result in runs:
+        print(f'{name:<28}{duration:>10.3f}{args.frames / duration:>14.1f}{np.abs(result - baseline).max():>12.2e}')
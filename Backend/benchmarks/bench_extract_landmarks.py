@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.helper import NUM_KEYPOINTS, extract_landmarks
+
+# Previous implementation: Python lists per landmark, float64, four arrays concatenated
+def extract_landmarks_lists(results):
+    left_lm = np.array([[res.x, res.y, res.z] for res in results.left_hand_landmarks.landmark]).flatten() if results.left_hand_landmarks else np.zeros(21*3)
+    right_lm = np.array([[res.x, res.y, res.z] for res in results.right_hand_landmarks.landmark]).flatten() if results.right_hand_landmarks else np.zeros(21*3)
+    face_lm = np.array([[res.x, res.y, res.z] for res in results.face_landmarks.landmark]).flatten() if results.face_landmarks else np.zeros(468*3)
+    pose_lm = np.array([[res.x, res.y, res.z, res.visibility] for res in results.pose_landmarks.landmark]).flatten() if results.pose_landmarks else np.zeros(33*4)
+    return np.concatenate([pose_lm, face_lm, right_lm, left_lm])
+
+# Landmark list filled like MediaPipe does, pose also has visibility and presence
+def make_landmarks(rng, count, with_visibility=False):
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for _ in range(count):
+        landmark = landmarks.landmark.add()
+        landmark.x, landmark.y, landmark.z = rng.random(3)
+        if with_visibility:
+            landmark.visibility, landmark.presence = rng.random(2)
+    return landmarks
+
+def make_results(rng, hands=2):
+    return SimpleNamespace(
+        pose_landmarks=make_landmarks(rng, 33, with_visibility=True),
+        face_landmarks=make_landmarks(rng, 468),
+        right_hand_landmarks=make_landmarks(rng, 21) if hands > 0 else None,
+        left_hand_landmarks=make_landmarks(rng, 21) if hands > 1 else None,
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare landmark extraction implementations')
+    parser.add_argument('--number', type=int, default=500, help='calls per measurement')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    out = np.empty(NUM_KEYPOINTS, dtype=np.float32)
+
+    print(f'{"case":<14}{"lists (us)":>12}{"in place (us)":>16}{"speedup":>10}{"max diff":>12}')
+    for hands in (2, 1, 0):
+        results = make_results(rng, hands)
+        expected = extract_landmarks_lists(results)
+        np_diff = np.abs(extract_landmarks(results, out) - expected).max()
+
+        old = min(timeit.repeat(lambda: extract_landmarks_lists(results), number=args.number, repeat=3)) / args.number
+        new = min(timeit.repeat(lambda: extract_landmarks(results, out), number=args.number, repeat=3)) / args.number
+        print(f'{f"{hands} hand(s)":<14}{old * 1e6:>12.1f}{new * 1e6:>16.1f}{old / new:>10.1f}x{np_diff:>11.1e}')
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.schema import FULL
+from src.pipeline import extract_keypoints_pipelined
+from src.Video_to_Text import extract_keypoints
+
+# Synthetic clip of moving shapes, long enough that process start-up is not the whole measurement
+def write_video(path, seconds, fps=30, size=(1280, 720)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        cv2.circle(frame, (100 + (i * 7) % (size[0] - 200), size[1] // 2), 80, (0, 200, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Landmark extraction throughput by number of MediaPipe processes')
+    parser.add_argument('--video', help='video to use instead of a synthetic clip')
+    parser.add_argument('--seconds', type=float, default=20, help='length of the synthetic clip')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='MediaPipe processes to try, the serial run (1) is always measured first as the baseline')
+    args = parser.parse_args()
+    if min(args.workers) < 1:
+        parser.error('--workers must be at least 1')
+    # Speedups are relative to the single process loop of Video_to_Text
+    worker_counts = [1] + sorted(set(args.workers) - {1})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            video = os.path.join(tmp, 'clip.mp4')
+            write_video(video, args.seconds)
+
+        print(f'{os.cpu_count()} CPUs')
+        print(f'{"workers":<10}{"frames":>8}{"seconds":>10}{"fps":>10}{"speedup":>10}')
+        baseline = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            if workers == 1:
+                keypoints = extract_keypoints(video, FULL)
+            else:
+                keypoints = extract_keypoints_pipelined(video, FULL, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f'{workers:<10}{len(keypoints):>8}{elapsed:>10.2f}{len(keypoints) / elapsed:>10.1f}{baseline / elapsed:>9.2f}x')
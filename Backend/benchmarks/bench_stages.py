@@ -0,0 +1,154 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from bench_pipeline_scaling import write_video
+from data.schema import FULL
+from model.model import ARCHITECTURES
+from src.engine import MODEL_DIR, engine
+from src.stages import StageRecorder
+from src.Video_to_Text import video_to_text
+
+# Stored results of an earlier run, later runs are compared against it
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stages_baseline.json')
+
+# A stage is flagged when its time per call grows by more than this fraction, and by more than
+# MIN_REGRESSION_MS so stages that take microseconds do not flag on noise
+TOLERANCE = 0.2
+MIN_REGRESSION_MS = 0.05
+
+# Untrained model with made-up signs, enough to time every stage when there is no trained model
+def synthetic_model_dir(folder, schema=FULL, signs=('hello', 'thanks', 'yes', 'no', 'please', 'sorry')):
+    model = ARCHITECTURES['complex'](len(signs), schema.size)
+    model.save(os.path.join(folder, 'model.keras'))
+    model.save_weights(os.path.join(folder, 'model.weights.h5'))
+    schema.save(folder)
+    mapping_path = os.path.join(folder, 'sign_mapping.json')
+    with open(mapping_path, 'w') as f:
+        json.dump({sign: i for i, sign in enumerate(signs)}, f)
+    return folder, mapping_path
+
+def video_key(width, height, fps, seconds):
+    return f'{width}x{height}@{fps:g}fps_{seconds:g}s'
+
+# Transcribe one video while recording its stages, returns the wall time and the stage totals
+def run_video(video, allocations=False):
+    with StageRecorder(allocations) as recorder:
+        start = time.perf_counter()
+        video_to_text(video)
+        wall = time.perf_counter() - start
+    return wall, recorder.report()
+
+def measure(video, allocations=True):
+    wall, stages = run_video(video)
+    # Frame count recorded by video_to_text, not a timed stage
+    frames = stages.pop('frames', {}).get('calls', 0)
+    # Allocations come from a second run, tracemalloc would distort the wall times
+    if allocations:
+        _, allocated = run_video(video, allocations=True)
+        for name, totals in stages.items():
+            totals['blocks'] = allocated.get(name, {}).get('blocks', 0)
+            totals['peak_bytes'] = allocated.get(name, {}).get('peak_bytes', 0)
+    # Time outside every stage, e.g. opening the video and starting MediaPipe
+    stages['other'] = {'calls': 1, 'seconds': wall - sum(totals['seconds'] for totals in stages.values()),
+                       'blocks': 0, 'peak_bytes': 0}
+    for totals in stages.values():
+        totals['ms_per_call'] = totals['seconds'] / max(totals['calls'], 1) * 1e3
+        totals['share'] = totals['seconds'] / wall
+    return {'wall_seconds': wall, 'frames': frames, 'frames_per_second': frames / wall, 'stages': stages}
+
+# Stages of the run that got slower than the baseline, as printable lines
+def regressions(results, baseline, tolerance=TOLERANCE, min_ms=MIN_REGRESSION_MS):
+    flagged = []
+    for key, result in results['videos'].items():
+        base = baseline['videos'].get(key)
+        if base is None:
+            continue
+        if result['frames_per_second'] < base['frames_per_second'] / (1 + tolerance):
+            flagged.append(f'{key}: {result["frames_per_second"]:.1f} frames/s, baseline {base["frames_per_second"]:.1f}')
+        for name, totals in result['stages'].items():
+            base_totals = base['stages'].get(name)
+            if base_totals is None or name == 'other':
+                continue
+            slower = totals['ms_per_call'] - base_totals['ms_per_call']
+            if totals['ms_per_call'] > base_totals['ms_per_call'] * (1 + tolerance) and slower > min_ms:
+                flagged.append(f'{key} {name}: {totals["ms_per_call"]:.3f} ms/call, baseline {base_totals["ms_per_call"]:.3f}')
+    return flagged
+
+def print_result(key, result):
+    print(f'\n{key}: {result["frames"]} frames in {result["wall_seconds"]:.2f}s, {result["frames_per_second"]:.1f} frames/s')
+    print(f'{"stage":<20}{"calls":>8}{"seconds":>10}{"ms/call":>10}{"share":>8}{"blocks":>10}{"peak KB":>10}')
+    for name, totals in result['stages'].items():
+        print(f'{name:<20}{totals["calls"]:>8}{totals["seconds"]:>10.3f}{totals["ms_per_call"]:>10.3f}'
+              f'{totals["share"] * 100:>7.1f}%{totals["blocks"]:>10}{totals["peak_bytes"] / 1024:>10.1f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time every stage of video_to_text on synthetic videos')
+    parser.add_argument('--resolutions', nargs='+', default=['640x360', '1280x720', '1920x1080'], help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, nargs='+', default=[30, 60])
+    parser.add_argument('--seconds', type=float, nargs='+', default=[3])
+    parser.add_argument('--video-dir', help='keep the generated videos here and reuse them on later runs')
+    parser.add_argument('--model-dir', help='trained model to use, an untrained one is made when there is none')
+    parser.add_argument('--no-allocations', action='store_true', help='skip the second run that counts allocations')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    # gloss reads src/dictionary.csv relative to the working directory of the server
+    for name in ('video_dir', 'model_dir', 'baseline'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    os.chdir(os.path.join(root_path, 'server'))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_dir = args.video_dir or tmp
+        os.makedirs(video_dir, exist_ok=True)
+
+        # The engine is pointed at the model before it loads anything
+        model_dir = args.model_dir or MODEL_DIR
+        if os.path.exists(os.path.join(model_dir, 'model.keras')):
+            engine.model_dir = model_dir
+        else:
+            engine.model_dir, engine.mapping_path = synthetic_model_dir(tmp)
+
+        results = {
+            'environment': {'cpus': os.cpu_count(), 'python': platform.python_version(), 'numpy': np.__version__,
+                            'machine': platform.machine()},
+            'videos': {},
+        }
+        first = True
+        for resolution, fps, seconds in itertools.product(args.resolutions, args.fps, args.seconds):
+            width, height = (int(side) for side in resolution.split('x'))
+            key = video_key(width, height, fps, seconds)
+            video = os.path.join(video_dir, key + '.mp4')
+            # Same seed every time, so the same arguments give the same video
+            if not os.path.exists(video):
+                write_video(video, seconds, fps, (width, height))
+            # Load the model and build its graphs outside the measurements
+            if first:
+                video_to_text(video)
+                first = False
+            results['videos'][key] = measure(video, not args.no_allocations)
+            print_result(key, results['videos'][key])
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f'\nBaseline saved to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            flagged = regressions(results, json.load(f), args.tolerance)
+        print(f'\n{len(flagged)} regressions against {args.baseline}')
+        for line in flagged:
+            print('  ' + line)
+        sys.exit(1 if flagged else 0)
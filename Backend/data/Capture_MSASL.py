@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from helper import mp_detect, extract_landmarks
+from schema import FULL, SCHEMAS, FeatureSchema, get_schema
+from Capture_Video import NUM_FRAMES, MANIFEST_FILE, REPORT_EVERY, append_manifest, file_key, load_manifest, output_data, save_atomic
+
+# Full source videos are downloaded by PreProcessing/main.py as '<file>_full.mp4'
+SOURCE_SUFFIX = '_full.mp4'
+
+# Source frames to sample evenly between start_time and end_time, repeated if the segment is shorter
+def segment_frame_numbers(start_time, end_time, fps, num_frames=NUM_FRAMES):
+    first = int(round(start_time * fps))
+    last = max(first, int(round(end_time * fps)) - 1)
+    return np.linspace(first, last, num_frames).round().astype(int)
+
+# Yield the frames at the given (sorted) source frame numbers. Seeks to the first one, then only
+# grab()s the frames in between, so frames that are not sampled are never converted
+def read_frames_at(capture, frame_numbers):
+    capture.set(cv2.CAP_PROP_POS_FRAMES, int(frame_numbers[0]))
+    position = int(frame_numbers[0]) - 1
+    frame = None
+    for number in frame_numbers:
+        # Frames repeated in a short segment are given again without decoding
+        if number != position or frame is None:
+            while position < number:
+                if not capture.grab():
+                    return
+                position += 1
+            ret, frame = capture.retrieve()
+            if not ret:
+                return
+        yield frame
+
+# Name of the MS-ASL split a JSON file holds, e.g. 'MSASL_train'
+def split_name(json_file_path):
+    return os.path.splitext(os.path.basename(json_file_path))[0]
+
+# Group the MS-ASL entries by source video so each one is opened once, segments in time order.
+# The id of a sample is the split and its position in the JSON file, e.g. 'MSASL_train_12', so the
+# splits can share an output folder
+def group_by_source(data, video_folder, split):
+    sources = defaultdict(list)
+    for index, item in enumerate(data):
+        try:
+            start_time = float(item.get('start_time', 0))
+            end_time = float(item.get('end_time', 0))
+        except (TypeError, ValueError):
+            continue
+        if end_time <= start_time:
+            continue
+        source = os.path.join(video_folder, str(item.get('file', 'video')) + SOURCE_SUFFIX)
+        sources[source].append((f'{split}_{index}', str(item.get('clean_text', 'video')), start_time, end_time, item.get('fps')))
+    for segments in sources.values():
+        segments.sort(key=lambda segment: segment[2])
+    return sources
+
+# Each worker process owns one Holistic instance, created once
+_holistic = None
+_schema = None
+
+def _init_worker(schema_dict):
+    global _holistic, _schema
+    _holistic = mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    _schema = FeatureSchema.from_dict(schema_dict)
+
+# Extract every segment of one source video straight to npy files, returns (sample id, frames, error)
+def extract_source(task):
+    source, segments, npy_folder, num_frames = task
+    results = []
+    cam = cv2.VideoCapture(source)
+    # The container's frame rate is what frame numbers refer to, the JSON value is a fallback
+    video_fps = cam.get(cv2.CAP_PROP_FPS)
+    for sample_id, clean_text, start_time, end_time, fps in segments:
+        count = 0
+        try:
+            frame_landmarks = np.zeros((num_frames, _schema.size), dtype=np.float32)
+            frame_numbers = segment_frame_numbers(start_time, end_time, video_fps or fps or 30, num_frames)
+            for frame in read_frames_at(cam, frame_numbers):
+                _, result = mp_detect(frame, _holistic, to_bgr=False)
+                extract_landmarks(result, out=frame_landmarks[count], schema=_schema)
+                count += 1
+
+            if count == num_frames:
+                output_path = os.path.join(npy_folder, clean_text, f'{sample_id}.npy')
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                save_atomic(output_path, frame_landmarks)
+            results.append((sample_id, clean_text, count, None))
+        except Exception as e:
+            results.append((sample_id, clean_text, count, str(e)))
+    cam.release()
+    return source, results
+
+# Extract landmarks of every MS-ASL sample from the full source videos, no trimmed copies are written.
+# Finished samples are kept in the manifest like Capture_Video.gather_vid_lm, re-runs skip them
+def gather_msasl_lm(json_file_path, video_folder, JSON_folder, npy_folder, schema=FULL, workers=None, num_frames=NUM_FRAMES):
+    os.makedirs(npy_folder, exist_ok=True)
+    os.makedirs(JSON_folder, exist_ok=True)
+    schema.save(npy_folder)
+
+    with open(json_file_path, 'r') as f:
+        data = json.load(f)
+    split = split_name(json_file_path)
+    sources = group_by_source(data, video_folder, split)
+    manifest = load_manifest(npy_folder)
+
+    # Sources that are downloaded and still have samples to extract
+    tasks = []
+    missing, done = 0, 0
+    for source, segments in sources.items():
+        if not os.path.exists(source):
+            missing += len(segments)
+            continue
+        key = file_key(source)
+        todo = []
+        for segment in segments:
+            entry = manifest.get(segment[0])
+            if entry is not None and entry['source'] == source and entry['size'] == key['size'] and entry['mtime'] == key['mtime']:
+                done += 1
+            else:
+                todo.append(segment)
+        if todo:
+            tasks.append((source, todo, npy_folder, num_frames))
+    todo_count = sum(len(task[1]) for task in tasks)
+    print(f'{done} samples already done, {todo_count} to extract, {missing} without a downloaded source video')
+
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    finished, failed = 0, 0
+    if tasks:
+        with open(os.path.join(npy_folder, MANIFEST_FILE), 'a') as manifest_file, \
+                multiprocessing.Pool(min(workers, len(tasks)), initializer=_init_worker, initargs=(schema.to_dict(),)) as pool:
+            for source, results in pool.imap_unordered(extract_source, tasks):
+                key = file_key(source)
+                for sample_id, clean_text, count, error in results:
+                    finished += 1
+                    if error is not None:
+                        # Not recorded, tried again on the next run
+                        failed += 1
+                        print(f'Error capturing sample {sample_id} from {source}: {error}')
+                        continue
+                    if count != num_frames:
+                        print(f'Error: Only {count} of {num_frames} frames captured for sample {sample_id} from {source}')
+
+                    index = int(sample_id[len(split) + 1:])
+                    entry = {'path': sample_id, 'split': split, 'index': index, 'source': source, 'sign': clean_text,
+                             'frames': count, **key}
+                    append_manifest(manifest_file, entry)
+                    manifest[entry['path']] = entry
+
+                    if finished % REPORT_EVERY == 0:
+                        elapsed = time.perf_counter() - start_time
+                        print(f'{finished}/{todo_count} samples, {finished / elapsed:.2f} samples/sec')
+
+        elapsed = time.perf_counter() - start_time
+        print(f'Extracted {finished - failed} samples ({failed} failed) in {elapsed:.1f}s, {finished / elapsed:.2f} samples/sec')
+
+    # Classes and mapping over every sample saved so far, of every split in this folder. Entries without
+    # a split were named by index alone and are extracted again under the new names
+    mapping = {}
+    target = []
+    entries = [entry for entry in manifest.values() if 'split' in entry]
+    for entry in sorted(entries, key=lambda entry: (entry['sign'], entry['split'], entry['index'])):
+        if entry['frames'] == num_frames:
+            mapping.setdefault(entry['sign'], len(mapping))
+            target.append(mapping[entry['sign']])
+
+    # Output data
+    output_data(JSON_folder, target, mapping)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract landmarks of MS-ASL samples straight from the source videos')
+    parser.add_argument('json_file', help='MS-ASL split, e.g. MSASL_train.json')
+    parser.add_argument('video_folder', help='folder of full source videos downloaded by PreProcessing/main.py')
+    parser.add_argument('--name', default='msasl', help='suffix of the Processed_NPY_ and Processed_JSON_ output folders, '
+                                                         'the splits can share them')
+    parser.add_argument('--workers', type=int, default=None, help='extraction processes, defaults to the number of CPUs')
+    # Landmarks saved for each frame, see schema.py
+    parser.add_argument('--schema', default='full', choices=list(SCHEMAS))
+    args = parser.parse_args()
+
+    # Path to output folders
+    OUTPUT_JSON_FOLDER = f'Processed_JSON_{args.name}'
+    OUTPUT_NPY_FOLDER = f'Processed_NPY_{args.name}'
+
+    gather_msasl_lm(args.json_file, args.video_folder, OUTPUT_JSON_FOLDER, OUTPUT_NPY_FOLDER, get_schema(args.schema), args.workers)
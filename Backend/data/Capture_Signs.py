@@ -3,7 +3,9 @@ import os
 import json
 import numpy as np
 import mediapipe as mp
-from helper import mp_detect, draw_landmarks, extract_landmarks
+from frames import FramePreprocessor
+from helper import KeypointWindow, mp_detect, draw_landmarks, extract_landmarks
+from schema import get_schema
 
 def create_output_folder(OUTPUT_NPY_FOLDER, signs):
     for sign in signs: 
@@ -20,8 +22,10 @@ def create_JSON_output(OUTPUT_JSON_FOLDER, OUTPUT_NPY_FOLDER):
 
     # Go though each sign 
     for sign in os.listdir(OUTPUT_NPY_FOLDER):
-        # Create path to the sign with videos stored in npy files
+        # Create path to the sign with videos stored in npy files, skip files like the feature schema
         sign_path = os.path.join(OUTPUT_NPY_FOLDER, sign)
+        if not os.path.isdir(sign_path):
+            continue
         # Create a dictionary to map the sign to the corresponding index
         mapping[sign] = count
         count += 1
@@ -45,26 +49,6 @@ def create_JSON_output(OUTPUT_JSON_FOLDER, OUTPUT_NPY_FOLDER):
     except Exception as e:
         print('Error exporting:', e)
             
-def resize_portrait(frame, target_size=(720,1280)):
-    target_w, target_h = target_size
-    h, w = frame.shape[:2]
-
-    # scale factor to englarge the height from 720 to 1280 or 16:9 aspect ratio
-    scale_factor = float(16) / 9
-
-    # Resize the frame with the scale factor
-    resized_frame = cv2.resize(frame, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_LINEAR)
-
-    # Reset new width to new frame
-    w = resized_frame.shape[1]
-
-    # Compute the starting x coordinatefor center-cropping to 720p width
-    start_x = (w - target_w) // 2
-    end_x = start_x + target_w
-    portrait_frame = resized_frame[:, start_x:end_x]
-
-    return portrait_frame
-
 # Path for exported data, numpy arrays and json files
 OUTPUT_FOLDER_NAME = 'test_dataset'
 OUTPUT_NPY_FOLDER = os.path.join(os.getcwd(), f'Processed_NPY_{OUTPUT_FOLDER_NAME}')
@@ -78,7 +62,11 @@ num_videos = 80
 # Number of frames in each video
 num_frames = 30
 
+# Landmarks saved for each frame, see schema.py. Recorded with the data so training and inference match it
+SCHEMA = get_schema('full')
+
 create_output_folder(OUTPUT_NPY_FOLDER, signs)
+SCHEMA.save(OUTPUT_NPY_FOLDER)
 
 # Set this flag to False to disable video output if not needed (for speed)
 ENABLE_VIDEO_OUTPUT = True
@@ -89,6 +77,9 @@ webcam = cv2.VideoCapture(0)
 # Zooms out the portrait mode image to fit on screen
 zoom_out_factor = 0.6  
 
+# Crops and scales webcam frames to 720x1280 portrait mode
+portrait = FramePreprocessor(size=(720, 1280), rgb=False)
+
 # Video codec
 fourcc = cv2.VideoWriter_fourcc(*'m', 'p', '4', 'v')
 
@@ -103,6 +94,9 @@ print(f"Capture width: {webcam.get(cv2.CAP_PROP_FRAME_WIDTH)}, height: {webcam.g
 mp_holistic = mp.solutions.holistic
 mp_drawings = mp.solutions.drawing_utils
 
+# Keypoints of the video currently being captured
+video_landmarks = KeypointWindow(num_frames, SCHEMA.size)
+
 # Intialized holistic model and Capture data for signs
 with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
     # Flag to end capture early 
@@ -121,7 +115,7 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
                 break
 
             # Change to portrait mode
-            frame = resize_portrait(frame)
+            frame = portrait.process(frame)
 
             # Mediapipe landmarking
             image, result = mp_detect(frame, holistic)
@@ -152,7 +146,7 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
         # Capture sign data
         for video in range(num_videos):
             output_path = os.path.join(OUTPUT_NPY_FOLDER, str(sign), f'{video}')
-            video_landmarks = []
+            video_landmarks.reset()
             
             if ENABLE_VIDEO_OUTPUT:
                 out = cv2.VideoWriter(
@@ -165,7 +159,7 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
                 ret, frame = webcam.read()
                 if not ret:
                     break
-                frame = resize_portrait(frame)
+                frame = portrait.process(frame)
                 frame = cv2.resize(frame, None, fx=zoom_out_factor, fy=zoom_out_factor, interpolation=cv2.INTER_LINEAR)
 
                 cv2.putText(frame, f'Starting in {countdown}...', (int(frame.shape[1] * 0.2) ,
@@ -183,12 +177,14 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
                     break
                 
                 # Change to portrait mode
-                frame = resize_portrait(frame)
+                frame = portrait.process(frame)
 
                 # Mediapipe landmarking
                 image, result = mp_detect(frame, holistic)
                 draw_landmarks(image, result, mp_holistic, mp_drawings)
-                lm = extract_landmarks(result)
+                # Write landmarks in frame straight into the window
+                extract_landmarks(result, out=video_landmarks.next_frame(), schema=SCHEMA)
+                video_landmarks.advance()
 
                 cv2.putText(image, f'Collecting data for {sign}', (20, 32), 
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (128, 255, 128), 2)
@@ -203,9 +199,6 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
                 # Show Frame to screen
                 cv2.imshow('Collecting data', zoomed_out_image)
                 
-                # Append landmarks in frame to array
-                video_landmarks.append(lm)
-                
                 # Write to video output if enabled (full resolution, pre-zoom)
                 if ENABLE_VIDEO_OUTPUT:
                     frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
@@ -221,7 +214,7 @@ with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=
                 break
             
             # Save landmark array to npy file. Should have 30 frames worth of video output    
-            np.save(output_path, video_landmarks)
+            np.save(output_path, video_landmarks.frames())
             cv2.waitKey(250)
             
         # Check exit flag if actiavted during capture
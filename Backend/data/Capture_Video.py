@@ -1,11 +1,23 @@
+import argparse
+import json
+import multiprocessing
 import os
 import time
 import cv2
-import json
-import mediapipe as mp 
+import mediapipe as mp
 import numpy as np
 
-from helper import mp_detect, draw_landmarks, extract_landmarks
+from helper import mp_detect, extract_landmarks
+from schema import FULL, SCHEMAS, FeatureSchema, get_schema
+
+# Frames kept from the start of every video, one model window
+NUM_FRAMES = 30
+
+# Completed videos, one JSON line each, kept in the npy output folder
+MANIFEST_FILE = 'manifest.jsonl'
+
+# Print throughput every this many videos
+REPORT_EVERY = 50
 
 def create_output_folder(output_folder, input_folder):
     # loops through the video data and makes directory
@@ -18,7 +30,7 @@ def create_output_folder(output_folder, input_folder):
 def output_data(output_folder, target, mapping):
     mapping_file = 'mapping.json'
     target_file = 'target.json'
-    
+
     # Try exporting mapping to json
     try:
         with open(os.path.join(output_folder, mapping_file), 'w') as f:
@@ -34,125 +46,169 @@ def output_data(output_folder, target, mapping):
     except Exception as e:
         print('Error exporting:', e)
 
-def gather_vid_lm(vid_dir, JSON_folder, npy_folder, model):
-    exit_flag = False
-    
-    # Classes and mapping
-    target = []
-    mapping = {}
+# Size and modification time identify a version of a video, a changed file is extracted again
+def file_key(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+# Read the manifest, later lines win. A line cut off by an interrupted run is ignored
+def load_manifest(npy_folder):
+    manifest = {}
+    path = os.path.join(npy_folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return manifest
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            manifest[entry['path']] = entry
+    return manifest
+
+# Append one finished video, flushed to disk before the next one is recorded
+def append_manifest(f, entry):
+    f.write(json.dumps(entry) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+# Save through a temporary file and rename it, a crash never leaves a half written npy behind
+def save_atomic(path, array):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+# Each worker process owns one Holistic instance, created once
+_holistic = None
+_schema = None
+
+def _init_worker(schema_dict):
+    global _holistic, _schema
+    _holistic = mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    _schema = FeatureSchema.from_dict(schema_dict)
+
+# Extract the first num_frames frames of a video to an npy file, no windows are opened
+def extract_video(task):
+    mp4_file, output_path, num_frames = task
+    frame_landmarks = np.zeros((num_frames, _schema.size), dtype=np.float32)
     count = 0
-    
-    # Loop through every class in this directory
-    for sign in os.listdir(vid_dir):
+    try:
+        cam = cv2.VideoCapture(mp4_file)
+        while count != num_frames:
+            # Skip if file cannot be read
+            ret, frame = cam.read()
+            if not ret:
+                break
+            _, result = mp_detect(frame, _holistic, to_bgr=False)
+
+            # Write the landmarks in frame straight into the array
+            extract_landmarks(result, out=frame_landmarks[count], schema=_schema)
+            count += 1
+        cam.release()
+
+        # Videos shorter than a window are recorded but not saved
+        if count == num_frames:
+            save_atomic(output_path, frame_landmarks)
+    except Exception as e:
+        return mp4_file, count, str(e)
+    return mp4_file, count, None
+
+# Every video under vid_dir as (sign, video path, npy path), signs in sorted order
+def list_videos(vid_dir, npy_folder):
+    videos = []
+    for sign in sorted(os.listdir(vid_dir)):
         VID_PATH = os.path.join(vid_dir, sign)
-        OUTPUT_SIGN_PATH = os.path.join(npy_folder, sign)
-        
-        # Map the current sign and increment index
-        mapping[sign] = count
-        count += 1
-        
-        # Go thorugh each sign and get videos
-        for video in os.listdir(VID_PATH):
-            mp4_file = os.path.join(VID_PATH, video)
-            
-            # Split name and file extension
+        if not os.path.isdir(VID_PATH):
+            continue
+        for video in sorted(os.listdir(VID_PATH)):
             name, ext = os.path.splitext(video)
-            OUTPUT_SIGN_VIDEO_PATH = os.path.join(OUTPUT_SIGN_PATH, name)
-            
-            print(f'Capturing data for video: {video}')
-            
-            # Open capture for that video
-            cam = cv2.VideoCapture(mp4_file)
-            
-            num_frames = 0
-            exit_vid_capture_flag = False
-            
-            #start_time = time.time()
-            
-            frame_landmarks = []
-            
-            while num_frames != 30:
-                # Skip if file cannot be read
-                ret, frame = cam.read()
-                if not ret:
-                    print(f'{mp4_file} cannot be read')
-                    break
-            
-                image, result = mp_detect(frame, model)
-                draw_landmarks(image, result, mp_holistic, mp_drawings)
-                
-                # Append the landmarks in frame to the array
-                frame_landmarks.append(extract_landmarks(result))
-                
-                cv2.imshow('Collecting data', image)
-
-                if cv2.waitKey(1) == ord('q'):
-                    exit_vid_capture_flag = True
-                    exit_flag = True
-                    break
-                num_frames += 1
-            
-            # Check shape of output, if it's not expected throw it out
-            try:
-                if np.array(frame_landmarks).shape != (30, 1662):
-                    print('Error: Shape not (30, 1662)')
+            videos.append((sign, os.path.join(VID_PATH, video), os.path.join(npy_folder, sign, name + '.npy')))
+    return videos
+
+# Extract landmarks of every video in a process pool. Videos already in the manifest with the same
+# size and modification time are skipped, so an interrupted run carries on where it stopped
+def gather_vid_lm(vid_dir, JSON_folder, npy_folder, schema=FULL, workers=None, num_frames=NUM_FRAMES):
+    # Record which landmarks the npy files hold
+    os.makedirs(npy_folder, exist_ok=True)
+    schema.save(npy_folder)
+
+    videos = list_videos(vid_dir, npy_folder)
+    manifest = load_manifest(npy_folder)
+
+    # Only videos that are new, changed, or whose npy file went missing
+    tasks = []
+    for sign, mp4_file, output_path in videos:
+        key = file_key(mp4_file)
+        entry = manifest.get(mp4_file)
+        done = entry is not None and entry['size'] == key['size'] and entry['mtime'] == key['mtime']
+        # A saved video whose npy file was deleted is extracted again
+        if done and entry['frames'] == num_frames and not os.path.exists(output_path):
+            done = False
+        if not done:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tasks.append((mp4_file, output_path, num_frames))
+    print(f'{len(videos) - len(tasks)} of {len(videos)} videos already done, {len(tasks)} to extract')
+
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    finished, failed = 0, 0
+    if tasks:
+        with open(os.path.join(npy_folder, MANIFEST_FILE), 'a') as manifest_file, \
+                multiprocessing.Pool(min(workers, len(tasks)), initializer=_init_worker, initargs=(schema.to_dict(),)) as pool:
+            for mp4_file, count, error in pool.imap_unordered(extract_video, tasks):
+                finished += 1
+                if error is not None:
+                    # Not recorded, tried again on the next run
+                    failed += 1
+                    print(f'Error capturing {mp4_file}: {error}')
                     continue
-            except Exception as e:
-                print(f'Error: {video} due to {e}')
-                # print(frame_landmarks)
-                continue
-            
-            # Add the current target to the array
+                if count != num_frames:
+                    print(f'Error: Only {count} of {num_frames} frames captured for {mp4_file}')
+
+                entry = {'path': mp4_file, 'frames': count, **file_key(mp4_file)}
+                append_manifest(manifest_file, entry)
+                manifest[mp4_file] = entry
+
+                if finished % REPORT_EVERY == 0:
+                    elapsed = time.perf_counter() - start_time
+                    print(f'{finished}/{len(tasks)} videos, {finished / elapsed:.2f} videos/sec')
+
+        elapsed = time.perf_counter() - start_time
+        print(f'Extracted {finished - failed} videos ({failed} failed) in {elapsed:.1f}s, {finished / elapsed:.2f} videos/sec')
+
+    # Classes and mapping, only videos with all frames are part of the target
+    mapping = {}
+    target = []
+    for sign, mp4_file, output_path in videos:
+        mapping.setdefault(sign, len(mapping))
+        entry = manifest.get(mp4_file)
+        if entry is not None and entry['frames'] == num_frames:
             target.append(mapping[sign])
-            
-            # Try saving npy
-            try:
-                np.save(OUTPUT_SIGN_VIDEO_PATH, frame_landmarks)
-            except Exception as e:
-                print(f'Error exporting to npy: {e}')
-            
-            #end_time = time.time()
-            #duration = end_time - start_time
-            #print(f'Capturing 30 frames took {duration} seconds')
-            
-            if exit_vid_capture_flag:
-                break
-            
-        if exit_flag:
-            cv2.waitKey(10)
-            cam.release()
-            cv2.destroyAllWindows()
-            break
-        
-    cv2.waitKey(10)
-    cam.release()
-    cv2.destroyAllWindows()  
-    
+
     # Output data
-    output_data(JSON_folder, target, mapping)    
+    output_data(JSON_folder, target, mapping)
 
 
 if __name__ == '__main__':
-    mp_holistic = mp.solutions.holistic
-    mp_drawings = mp.solutions.drawing_utils
-
-    holistic = mp_holistic.Holistic(
-        min_detection_confidence=0.5, 
-        min_tracking_confidence=0.5
-    )
-    
+    parser = argparse.ArgumentParser(description='Extract landmarks from every video of a sign dataset')
     # Path to training videos
-    VID_FOLDER = 'train_video_folder'
-    
+    parser.add_argument('video_folder', nargs='?', default='train_video_folder')
+    parser.add_argument('--workers', type=int, default=None, help='extraction processes, defaults to the number of CPUs')
+    # Landmarks saved for each frame, see schema.py
+    parser.add_argument('--schema', default='full', choices=list(SCHEMAS))
+    args = parser.parse_args()
+
+    VID_FOLDER = args.video_folder
+
     # Path to output folders
-    OUTPUT_JSON_FOLDER = F'Processed_JSON_{VID_FOLDER}'
-    OUTPUT_NPY_FOLDER = f'Processed_NPY_{VID_FOLDER}'
-    
+    OUTPUT_JSON_FOLDER = F'Processed_JSON_{os.path.basename(os.path.normpath(VID_FOLDER))}'
+    OUTPUT_NPY_FOLDER = f'Processed_NPY_{os.path.basename(os.path.normpath(VID_FOLDER))}'
+
     # Create output folders
     os.makedirs(OUTPUT_JSON_FOLDER, exist_ok=True)
-    
+
     # Npy data folders
     create_output_folder(OUTPUT_NPY_FOLDER, VID_FOLDER)
-    
-    print(os.getcwd())
-    gather_vid_lm(VID_FOLDER, OUTPUT_JSON_FOLDER, OUTPUT_NPY_FOLDER, holistic)
\ No newline at end of file
+
+    gather_vid_lm(VID_FOLDER, OUTPUT_JSON_FOLDER, OUTPUT_NPY_FOLDER, get_schema(args.schema), args.workers)
@@ -0,0 +1,156 @@
+import numpy as np
+
+try:
+    from data.schema import FACE_FIELDS, FULL, HAND_FIELDS, POSE_FIELDS
+except ImportError:
+    from schema import FACE_FIELDS, FULL, HAND_FIELDS, POSE_FIELDS
+
+# MediaPipe pose landmarks that swap places when the image is mirrored (left eye <-> right eye, ...)
+POSE_MIRROR_PAIRS = [(1, 4), (2, 5), (3, 6), (7, 8), (9, 10), (11, 12), (13, 14), (15, 16), (17, 18),
+                     (19, 20), (21, 22), (23, 24), (25, 26), (27, 28), (29, 30), (31, 32)]
+
+# Face mesh points that swap places when the image is mirrored, points on the midline (nose, lips
+# center, chin, ...) map to themselves. Found by mirroring FACEMESH_TESSELATION out from the lips
+# contour, every point has a twin and all but 6 of the 1322 mesh edges mirror onto mesh edges
+FACE_MIRROR_PAIRS = [(3, 248), (7, 249), (20, 250), (21, 251), (22, 252), (23, 253), (24, 254), (25, 255), (26, 256),
+                     (27, 257), (28, 258), (29, 259), (30, 260), (31, 261), (32, 262), (33, 263), (34, 264),
+                     (35, 265), (36, 266), (37, 267), (38, 268), (39, 269), (40, 270), (41, 271), (42, 272),
+                     (43, 273), (44, 274), (45, 275), (46, 276), (47, 277), (48, 278), (49, 279), (50, 280),
+                     (51, 281), (52, 282), (53, 283), (54, 284), (55, 285), (56, 286), (57, 287), (58, 288),
+                     (59, 289), (60, 290), (61, 291), (62, 292), (63, 293), (64, 294), (65, 295), (66, 296),
+                     (67, 297), (68, 298), (69, 299), (70, 300), (71, 301), (72, 302), (73, 303), (74, 304),
+                     (75, 305), (76, 306), (77, 307), (78, 308), (79, 309), (80, 310), (81, 311), (82, 312),
+                     (83, 313), (84, 314), (85, 315), (86, 316), (87, 317), (88, 318), (89, 319), (90, 320),
+                     (91, 321), (92, 322), (93, 323), (95, 324), (96, 325), (97, 326), (98, 327), (99, 328),
+                     (100, 329), (101, 330), (102, 331), (103, 332), (104, 333), (105, 334), (106, 335), (107, 336),
+                     (108, 337), (109, 338), (110, 339), (111, 340), (112, 341), (113, 342), (114, 343), (115, 344),
+                     (116, 345), (117, 346), (118, 347), (119, 348), (120, 349), (121, 350), (122, 351), (123, 352),
+                     (124, 353), (125, 354), (126, 355), (127, 356), (128, 357), (129, 358), (130, 359), (131, 360),
+                     (132, 361), (133, 362), (134, 363), (135, 364), (136, 365), (137, 366), (138, 367), (139, 368),
+                     (140, 369), (141, 370), (142, 371), (143, 372), (144, 373), (145, 374), (146, 375), (147, 376),
+                     (148, 377), (149, 378), (150, 379), (153, 380), (154, 381), (155, 382), (156, 383), (157, 384),
+                     (158, 385), (159, 386), (160, 387), (161, 388), (162, 389), (163, 390), (165, 391), (166, 392),
+                     (167, 393), (169, 394), (170, 395), (171, 396), (172, 397), (173, 398), (174, 399), (176, 400),
+                     (177, 401), (178, 402), (179, 403), (180, 404), (181, 405), (182, 406), (183, 407), (184, 408),
+                     (185, 409), (186, 410), (187, 411), (188, 412), (189, 413), (190, 414), (191, 415), (192, 416),
+                     (193, 417), (194, 418), (196, 419), (198, 420), (201, 421), (202, 422), (203, 423), (204, 424),
+                     (205, 425), (206, 426), (207, 427), (208, 428), (209, 429), (210, 430), (211, 431), (212, 432),
+                     (213, 433), (214, 434), (215, 435), (216, 436), (217, 437), (218, 438), (219, 439), (220, 440),
+                     (221, 441), (222, 442), (223, 443), (224, 444), (225, 445), (226, 446), (227, 447), (228, 448),
+                     (229, 449), (230, 450), (231, 451), (232, 452), (233, 453), (234, 454), (235, 455), (236, 456),
+                     (237, 457), (238, 458), (239, 459), (240, 460), (241, 461), (242, 462), (243, 463), (244, 464),
+                     (245, 465), (246, 466), (247, 467)]
+
+# Random changes to whole (batch, frames, features) batches of keypoints, each sample gets its own
+# parameters. Landmarks MediaPipe did not find are zeros and stay zeros whatever is applied
+class Augmenter:
+    def __init__(self, schema=FULL, mirror=0.5, jitter=0.003, scale=0.1, shift=0.05, speed=0.2, frame_dropout=0.05):
+        self.schema = schema
+        # Probability of mirroring a sample left to right
+        self.mirror = mirror
+        # Standard deviation of the noise added to every coordinate
+        self.jitter = jitter
+        # Scale factors are drawn from 1 +- scale around the image center, shifts from +- shift
+        self.scale = scale
+        self.shift = shift
+        # Playback speed is drawn from 1 +- speed, frames are resampled around the middle of the window
+        self.speed = speed
+        # Probability of each frame being lost, as if MediaPipe found nothing
+        self.frame_dropout = frame_dropout
+
+        # Columns of each coordinate and the body part each column belongs to
+        parts = [
+            (schema.pose_slice, POSE_FIELDS),
+            (schema.face_slice, FACE_FIELDS),
+            (schema.right_hand_slice, HAND_FIELDS),
+            (schema.left_hand_slice, HAND_FIELDS),
+        ]
+        self.x_cols, self.y_cols, self.z_cols = [np.concatenate([np.arange(part.start + axis, part.stop, fields) for part, fields in parts])
+                                                 for axis in range(3)]
+        self.part_slices = [part for part, _ in parts if part.stop > part.start]
+        self.visibility_cols = np.arange(schema.pose_slice.start + 3, schema.pose_slice.stop, POSE_FIELDS)
+
+        # Column order of a mirrored frame: pose pairs, face mesh pairs and the two hands swap places
+        mirror_cols = np.arange(schema.size)
+        for a, b in POSE_MIRROR_PAIRS:
+            cols_a = np.arange(a * POSE_FIELDS, (a + 1) * POSE_FIELDS)
+            cols_b = np.arange(b * POSE_FIELDS, (b + 1) * POSE_FIELDS)
+            mirror_cols[cols_a], mirror_cols[cols_b] = cols_b, cols_a
+        # Face points are where the schema keeps them. A schema keeping a point but not its twin cannot
+        # be mirrored, mirroring is turned off for it
+        positions = {landmark: i for i, landmark in enumerate(schema.face_landmarks)}
+        for a, b in FACE_MIRROR_PAIRS:
+            if (a in positions) != (b in positions):
+                self.mirror = 0
+            elif a in positions:
+                cols_a = schema.face_slice.start + np.arange(positions[a] * FACE_FIELDS, (positions[a] + 1) * FACE_FIELDS)
+                cols_b = schema.face_slice.start + np.arange(positions[b] * FACE_FIELDS, (positions[b] + 1) * FACE_FIELDS)
+                mirror_cols[cols_a], mirror_cols[cols_b] = cols_b, cols_a
+        mirror_cols[schema.right_hand_slice] = np.arange(schema.left_hand_slice.start, schema.left_hand_slice.stop)
+        mirror_cols[schema.left_hand_slice] = np.arange(schema.right_hand_slice.start, schema.right_hand_slice.stop)
+        self.mirror_cols = mirror_cols
+        self.moved_cols = np.flatnonzero(mirror_cols != np.arange(schema.size))
+
+    # Which landmarks were found, per frame and body part, as a (batch, frames, features) mask
+    def _present(self, x):
+        present = np.zeros(x.shape, dtype=bool)
+        for part in self.part_slices:
+            present[..., part] = np.any(x[..., part] != 0, axis=-1, keepdims=True)
+        return present
+
+    # Returns an augmented copy of a (batch, frames, features) float32 batch
+    def __call__(self, x, rng):
+        x = np.array(x, dtype=np.float32)
+        batch, frames, _ = x.shape
+        present = self._present(x)
+
+        # Temporal speed warp: frame t is taken from the nearest source frame of a faster or slower playback
+        if self.speed:
+            speeds = rng.uniform(1 - self.speed, 1 + self.speed, size=(batch, 1))
+            center = (frames - 1) / 2
+            source = np.rint(center + (np.arange(frames) - center) * speeds).astype(np.intp)
+            source = np.clip(source, 0, frames - 1) + np.arange(batch)[:, None] * frames
+            # One gather of whole frame rows
+            x = x.reshape(batch * frames, -1)[source.ravel()].reshape(batch, frames, -1)
+            present = present.reshape(batch * frames, -1)[source.ravel()].reshape(batch, frames, -1)
+
+        # Mirroring, scaling and shifting are one multiply-add per column: x * a + b. Mirrored x is 1 - x,
+        # then scaled around the image center (0.5) and shifted; z is only scaled
+        a = np.ones((batch, 1, x.shape[-1]), dtype=np.float32)
+        b = np.zeros((batch, 1, x.shape[-1]), dtype=np.float32)
+        flip = rng.random(batch) < self.mirror
+        signs = np.where(flip, -1, 1).astype(np.float32)[:, None, None]
+        scales = rng.uniform(1 - self.scale, 1 + self.scale, size=(batch, 1, 1)).astype(np.float32)
+        shifts = rng.uniform(-self.shift, self.shift, size=(batch, 1, 2)).astype(np.float32)
+        a[..., self.x_cols] = signs * scales
+        b[..., self.x_cols] = 0.5 - signs * scales / 2 + shifts[..., :1]
+        a[..., self.y_cols] = scales
+        b[..., self.y_cols] = 0.5 - scales / 2 + shifts[..., 1:]
+        a[..., self.z_cols] = scales
+        x *= a
+        x += b
+
+        # Small noise on every coordinate, visibility is left alone. Uniform noise with a standard deviation
+        # of jitter, drawing normal samples costs about 4x more and is the slowest step of the batch
+        if self.jitter:
+            noise = rng.random(x.shape, dtype=np.float32)
+            noise -= 0.5
+            noise *= np.float32(self.jitter * 12 ** 0.5)
+            noise[..., self.visibility_cols] = 0
+            x += noise
+
+        # Left and right body parts of mirrored samples swap places
+        if flip.any():
+            # Only the columns that move are copied
+            rows = np.flatnonzero(flip)[:, None, None]
+            times = np.arange(frames)[None, :, None]
+            x[rows, times, self.moved_cols] = x[rows, times, self.mirror_cols[self.moved_cols]]
+            present[rows, times, self.moved_cols] = present[rows, times, self.mirror_cols[self.moved_cols]]
+
+        # Lose whole frames
+        if self.frame_dropout:
+            present &= (rng.random((batch, frames, 1)) >= self.frame_dropout)
+
+        # Landmarks that were not found, or were dropped, go back to zeros
+        x *= present
+        return x
@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+
+# Frame rate the model was trained on (Capture_Signs.py records 30 frames per second)
+TARGET_FPS = 30
+
+# Longest side of the frames given to MediaPipe for uploaded videos, larger frames are scaled down
+MP_MAX_SIDE = 960
+
+# Fraction of source frames kept when resampling to target_fps, never more than 1 (no upsampling)
+def sample_ratio(capture, target_fps=TARGET_FPS):
+    source_fps = capture.get(cv2.CAP_PROP_FPS)
+    # Some containers don't report a frame rate, keep every frame then
+    if not source_fps or source_fps != source_fps or source_fps <= 0:
+        return 1.0
+    return min(1.0, target_fps / source_fps)
+
+# Source frame numbers of the frames sample_frames keeps, for a stream of frame_count frames
+def sampled_frame_numbers(frame_count, ratio):
+    index = np.arange(int(frame_count))
+    keep = np.ones(len(index), dtype=bool)
+    # Same rule as sample_frames, a frame is kept each time the resampled frame number moves on
+    keep[1:] = (index[1:] * ratio).astype(np.int64) != (index[:-1] * ratio).astype(np.int64)
+    return index[keep]
+
+# Yield frames resampled to target_fps. Frames that are not used are only grabbed, so they are
+# never converted or copied out of the decoder. The first `skip` resampled frames are skipped too.
+# start seeks to a source frame first (one of sampled_frame_numbers), count stops after that many frames
+def sample_frames(capture, target_fps=TARGET_FPS, skip=0, start=0, count=None):
+    ratio = sample_ratio(capture, target_fps)
+    if start:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index, kept = start, 0
+    while capture.grab():
+        # Keep a frame each time the resampled frame number moves on
+        keep = index == 0 or int(index * ratio) != int((index - 1) * ratio)
+        index += 1
+        if not keep:
+            continue
+
+        kept += 1
+        if kept <= skip:
+            continue
+        if count is not None and kept - skip > count:
+            break
+
+        ret, frame = capture.retrieve()
+        if not ret:
+            break
+        yield frame
+
+# Rotates, scales and center-crops every frame of a stream into reused buffers. The crop and sizes are
+# worked out once from the first frame; the full-size frame is only read once, by a resize of the
+# cropped region, and rotation and color conversion run on the small result
+class FramePreprocessor:
+    def __init__(self, size=None, max_side=None, rotate=False, rgb=True):
+        # size=(width, height): scale to cover it and center-crop, like the old resize_portrait
+        # max_side: keep the whole frame, scaled down so its longest side is at most max_side
+        self.size = size
+        self.max_side = max_side
+        # Rotate 90 degrees clockwise, for portrait videos from mobile devices
+        self.rotate = rotate
+        # Output RGB for MediaPipe, otherwise BGR for drawing and display
+        self.rgb = rgb
+        self.output_size = None
+        self._source_shape = None
+        self._crop = None
+        self._interpolation = None
+        self._buffers = []
+
+    # Work out the crop, scaled size and buffers for frames of this shape
+    def _setup(self, shape):
+        height, width = shape[:2]
+
+        # Size of the frame once rotated
+        rot_w, rot_h = (height, width) if self.rotate else (width, height)
+
+        if self.size is not None:
+            out_w, out_h = self.size
+            scale = max(out_w / rot_w, out_h / rot_h)
+        elif self.max_side is not None:
+            scale = min(1.0, self.max_side / max(rot_w, rot_h))
+            out_w, out_h = max(1, round(rot_w * scale)), max(1, round(rot_h * scale))
+        else:
+            scale = 1.0
+            out_w, out_h = rot_w, rot_h
+
+        # Region of the source frame that ends up in the output, centered
+        crop_w, crop_h = (out_h / scale, out_w / scale) if self.rotate else (out_w / scale, out_h / scale)
+        x = int(round((width - crop_w) / 2))
+        y = int(round((height - crop_h) / 2))
+        self._crop = (slice(y, y + int(round(crop_h))), slice(x, x + int(round(crop_w))))
+        self._interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+
+        # Buffers for each step: scaled (before rotation), rotated, color converted
+        scaled_size = (out_h, out_w) if self.rotate else (out_w, out_h)
+        self._buffers = [np.empty((scaled_size[1], scaled_size[0], 3), dtype=np.uint8)]
+        if self.rotate:
+            self._buffers.append(np.empty((out_h, out_w, 3), dtype=np.uint8))
+        if self.rgb:
+            self._buffers.append(np.empty((out_h, out_w, 3), dtype=np.uint8))
+        self.output_size = (out_w, out_h)
+        self._source_shape = shape
+
+    # Shape of the processed frames for source frames of the given shape
+    def output_shape(self, frame_shape):
+        if frame_shape != self._source_shape:
+            self._setup(frame_shape)
+        return (self.output_size[1], self.output_size[0], 3)
+
+    # Returns the processed frame, written into `out` if given (e.g. shared memory). Otherwise the
+    # buffer is reused, copy it to keep it past the next call
+    def process(self, frame, out=None):
+        if frame.shape != self._source_shape:
+            self._setup(frame.shape)
+
+        buffers = list(self._buffers)
+        if out is not None:
+            buffers[-1] = out
+        buffers = iter(buffers)
+        image = next(buffers)
+        cv2.resize(frame[self._crop], (image.shape[1], image.shape[0]), dst=image, interpolation=self._interpolation)
+        if self.rotate:
+            image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE, dst=next(buffers))
+        if self.rgb:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=next(buffers))
+        return image
@@ -2,18 +2,25 @@ import cv2
 import mediapipe as mp
 import numpy as np
 
+try:
+    from data.schema import FULL
+except ImportError:
+    from schema import FULL
+
 # Process image depending on model
-def mp_detect(image: np.ndarray, model: mp.solutions.holistic.Holistic):
+def mp_detect(image: np.ndarray, model: mp.solutions.holistic.Holistic, to_bgr: bool = True, is_rgb: bool = False):
     if not isinstance(image, np.ndarray):
         raise TypeError("Expected 'image' to be a NumPy array, but got {}".format(type(image)))
     if not hasattr(model, 'process'):
         raise ValueError("Expected 'model' to have a 'process' method, but got {}".format(type(model)))
 
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
+    if not is_rgb:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # Convert BGR to RGB
     image.flags.writeable = False
     results = model.process(image)                  # Make prediction based on mp.solutions model
     image.flags.writeable = True
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # Convert RGB back to BGR
+    if to_bgr:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # Convert RGB back to BGR for drawing and display
     return image, results
 
 def draw_landmarks(image: np.ndarray, results: any, mp_holistic: mp.solutions.holistic.Holistic, mp_drawings:  mp.solutions.drawing_utils):
@@ -43,17 +50,99 @@ def draw_landmarks(image: np.ndarray, results: any, mp_holistic: mp.solutions.ho
                                mp_drawings.DrawingSpec(color=(0,0,255), thickness=2, circle_radius=2),
                                mp_drawings.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=1))
 
-def extract_landmarks(results: any):
+# Position of each part in the full keypoint vector: pose (x, y, z, visibility), face, right hand, left hand (x, y, z)
+POSE_SLICE = FULL.pose_slice
+FACE_SLICE = FULL.face_slice
+RIGHT_HAND_SLICE = FULL.right_hand_slice
+LEFT_HAND_SLICE = FULL.left_hand_slice
+NUM_KEYPOINTS = FULL.size
+
+# Protobuf tag bytes of the float fields of a NormalizedLandmark: x, y, z, visibility, presence
+LANDMARK_FIELD_TAGS = b'\x0d\x15\x1d\x25\x2d'
+
+# Copy the first `num_fields` of (x, y, z, visibility) of every landmark (or only those in `rows`) into `out`
+def fill_landmarks(landmarks: any, out: np.ndarray, num_fields: int, rows: list = None):
+    n = len(landmarks.landmark)
+    buf = landmarks.SerializeToString()
+    record = len(buf) // n if n else 0
+    tags = buf[2:record:5]
+
+    # Every landmark is serialized as 0x0a, length, then (tag, 4 byte float) for each field that is set.
+    # When all landmarks have x, y, z (and visibility) set, the floats sit at fixed offsets and are
+    # read straight out of the buffer instead of through the Python attribute of each landmark
+    if n and record * n == len(buf) and tags[:num_fields] == LANDMARK_FIELD_TAGS[:num_fields] \
+            and (np.frombuffer(buf, dtype=np.uint8).reshape(n, record)[:, 2::5] == np.frombuffer(tags, dtype=np.uint8)).all():
+        values = np.ndarray((n, num_fields), dtype='<f4', buffer=buf, offset=3, strides=(record, 5))
+        out.reshape(-1, num_fields)[:] = values if rows is None else values[rows]
+        return
+
+    # Fall back to reading each landmark when some fields are missing
+    selected = landmarks.landmark if rows is None else [landmarks.landmark[i] for i in rows]
+    out[:] = np.fromiter((getattr(res, attr) for res in selected for attr in ('x', 'y', 'z', 'visibility')[:num_fields]),
+                         dtype=np.float32, count=len(selected) * num_fields)
+
+# Write keypoints for every part of the schema into `out` (float32, schema.size long), missing parts are zero-filled
+def extract_landmarks(results: any, out: np.ndarray = None, schema: any = FULL):
     if not hasattr(results, 'pose_landmarks'):
         raise ValueError("Invalid 'results' object. Expected MediaPipe detection results.")
+    if out is None:
+        out = np.empty(schema.size, dtype=np.float32)
+
+    parts = [
+        (results.pose_landmarks, schema.pose_slice, 4, None),
+        (results.face_landmarks, schema.face_slice, 3, None if schema.is_full else schema.face_landmarks),
+        (results.right_hand_landmarks, schema.right_hand_slice, 3, None),
+        (results.left_hand_landmarks, schema.left_hand_slice, 3, None),
+    ]
+    for landmarks, part, num_fields, rows in parts:
+        if part.start == part.stop:
+            continue
+        if landmarks:
+            fill_landmarks(landmarks, out[part], num_fields, rows)
+        else:
+            out[part].fill(0)
+    return out
+
+# Fixed size window of the most recent keypoint frames, stored as float32 without per-frame allocations
+class KeypointWindow:
+    def __init__(self, length: int = 30, num_features: int = 1662):
+        self.length = length
+        self.num_features = num_features
+        # Every frame is written twice, length rows apart, so the last `length` frames
+        # are always one contiguous slice in order
+        self._buffer = np.zeros((2 * length, num_features), dtype=np.float32)
+        self._pos = 0
+        self.count = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.length
+
+    # Row the next frame should be written into, call advance() once it is filled
+    def next_frame(self) -> np.ndarray:
+        return self._buffer[self._pos]
+
+    def advance(self):
+        self._buffer[self._pos + self.length] = self._buffer[self._pos]
+        self._pos = (self._pos + 1) % self.length
+        self.count += 1
+
+    def append(self, keypoints: np.ndarray):
+        self._buffer[self._pos] = keypoints
+        self.advance()
+
+    # Ordered (length, num_features) view of the window, oldest frame first. Not a copy
+    def view(self) -> np.ndarray:
+        return self._buffer[self._pos:self._pos + self.length]
+
+    # Only the frames written since the last reset, at most `length` of them
+    def frames(self) -> np.ndarray:
+        return self.view()[self.length - min(self.count, self.length):]
+
+    # Same view with a batch axis, ready to pass to the model
+    def batch_view(self) -> np.ndarray:
+        return self.view()[np.newaxis]
 
-    left_lm, right_lm, face_lm, pose_lm = [],[],[],[]
-    # Grab coords for each left hand landmark
-    left_lm = np.array([[res.x, res.y, res.z] for res in results.left_hand_landmarks.landmark]).flatten() if results.left_hand_landmarks else np.zeros(21*3)
-    # Right hand landmark
-    right_lm = np.array([[res.x, res.y, res.z] for res in results.right_hand_landmarks.landmark]).flatten() if results.right_hand_landmarks else np.zeros(21*3)
-    # Face landmark
-    face_lm = np.array([[res.x, res.y, res.z] for res in results.face_landmarks.landmark]).flatten() if results.face_landmarks else np.zeros(468*3)
-    # Pose Landmark
-    pose_lm = np.array([[res.x, res.y, res.z, res.visibility] for res in results.pose_landmarks.landmark]).flatten() if results.pose_landmarks else np.zeros(33*4)
-    return np.concatenate([pose_lm, face_lm, right_lm, left_lm])
\ No newline at end of file
+    def reset(self):
+        self._pos = 0
+        self.count = 0
@@ -1,55 +1,101 @@
+import argparse
 import os 
 import json
 import numpy as np
+from schema import FULL, get_schema, load_schema
+from shards import SHARD_SIZE, write_shards
 #from sklearn.model_selection import train_test_split
 #from keras.src.utils import to_categorical
 
-def extract_signs(DATA_PATH):
-    sign_mapping, dataset, target  = {}, [], []
+# First pass: find every captured window without loading it, returns the sign mapping, the npy
+# files and their targets
+def extract_signs(DATA_PATH, schema=FULL):
+    sign_mapping, files, target  = {}, [], []
     # Return empy map and lists when path does not exists
     if not os.path.exists(DATA_PATH):
-        return sign_mapping, dataset, target
+        return sign_mapping, files, target
+
+    # Landmarks the videos were captured with, they can be reduced to a smaller schema but not grown
+    captured_schema = load_schema(DATA_PATH)
+    if captured_schema != schema and not captured_schema.is_full:
+        raise ValueError(f'Data captured with {captured_schema} cannot be converted to {schema}')
+
     count = 0
     # Loop through each sign 
     for sign in os.listdir(DATA_PATH):
+        # Skip files like the feature schema
+        if not os.path.isdir(os.path.join(DATA_PATH, sign)):
+            continue
         sign_mapping[sign] = count
         count += 1
-        print('Working on sign ' + sign)
         # Video Directory
         vid_dir = os.path.join(DATA_PATH, sign)
         vids = os.listdir(vid_dir)
         # Loop through each video
         for vid in vids:
-            # Path to each video
-            window = np.load(os.path.join(vid_dir, vid))
-        
-            # Append full video to array
+            # Skip anything that is not a saved window, e.g. an interrupted capture's .tmp file
+            if not vid.endswith('.npy'):
+                continue
+            files.append(os.path.join(vid_dir, vid))
             target.append(sign_mapping[sign])
-            print(f'{vid} ') 
-            # print(str(np.array(window).shape))
-            dataset.append(window)
-            
-    return sign_mapping, dataset, target
-
-DATA_DIR = 'Processed_NPY_test_dataset'
-DATA_PATH = os.path.join(os.getcwd(), DATA_DIR)
-OUTPUT_PATH = os.path.join(os.getcwd(), 'Processed_test_dataset')
-
-if not os.path.exists(OUTPUT_PATH):
-    os.makedirs(OUTPUT_PATH)
-
-print('Extracting data!')
-sign_mapping, dataset, target = extract_signs(DATA_PATH)
-
-# Export signs to json file
-with open(os.path.join(OUTPUT_PATH, 'sign_mapping.json'), 'w') as f:
-    json.dump(sign_mapping, f, indent=4)
-    f.close()
-
-# Export target col
-with open(os.path.join(OUTPUT_PATH, 'target.json'), 'w') as f:
-    json.dump(target, f, indent=4)
-    f.close()
-
-# Export Preprocessed video data
-np.save(os.path.join(OUTPUT_PATH, 'full_dataset'), dataset)
\ No newline at end of file
+
+    return sign_mapping, files, target
+
+# Frames per window, taken from the header of the first file without reading its data
+def window_length(files):
+    return np.load(files[0], mmap_mode='r').shape[0] if files else 30
+
+# Second pass: write every window into a preallocated float32 .npy memmap one video at a time, so only
+# one window is in memory however large the dataset is. Written to a temporary file and renamed
+def build_dataset(files, output_file, schema=FULL):
+    window_len = window_length(files)
+    tmp_file = output_file + '.tmp'
+    dataset = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.float32, shape=(len(files), window_len, schema.size))
+    for i, path in enumerate(files):
+        print(f'{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}')
+        dataset[i] = schema.project(np.load(path))
+    dataset.flush()
+    del dataset
+    os.replace(tmp_file, output_file)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the training dataset from the captured npy files')
+    # Shards can be larger than memory in total, full_dataset.npy is the older single file
+    parser.add_argument('--format', choices=['shards', 'npy'], default='shards')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='windows per shard file')
+    args = parser.parse_args()
+
+    DATA_DIR = 'Processed_NPY_test_dataset'
+    DATA_PATH = os.path.join(os.getcwd(), DATA_DIR)
+    OUTPUT_PATH = os.path.join(os.getcwd(), 'Processed_test_dataset')
+
+    # Landmarks to keep for training, see schema.py
+    SCHEMA = get_schema('full')
+
+    if not os.path.exists(OUTPUT_PATH):
+        os.makedirs(OUTPUT_PATH)
+
+    print('Extracting data!')
+    sign_mapping, files, target = extract_signs(DATA_PATH, SCHEMA)
+    print(f'Found {len(files)} videos of {len(sign_mapping)} signs')
+
+    # Export the feature schema so training and inference build the same vector
+    SCHEMA.save(OUTPUT_PATH)
+
+    # Export signs to json file
+    with open(os.path.join(OUTPUT_PATH, 'sign_mapping.json'), 'w') as f:
+        json.dump(sign_mapping, f, indent=4)
+        f.close()
+
+    # Export target col
+    with open(os.path.join(OUTPUT_PATH, 'target.json'), 'w') as f:
+        json.dump(target, f, indent=4)
+        f.close()
+
+    # Export Preprocessed video data
+    if args.format == 'shards':
+        windows = (np.load(path) for path in files)
+        write_shards(windows, target, os.path.join(OUTPUT_PATH, 'shards'), SCHEMA, window_length(files), args.shard_size)
+    else:
+        # Open it with np.load(..., mmap_mode='r')
+        build_dataset(files, os.path.join(OUTPUT_PATH, 'full_dataset.npy'), SCHEMA)
@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+
+# Landmarks MediaPipe Holistic returns for each part, and the values kept per landmark
+POSE_LANDMARKS, POSE_FIELDS = 33, 4
+FACE_LANDMARKS, FACE_FIELDS = 468, 3
+HAND_LANDMARKS, HAND_FIELDS = 21, 3
+
+# Face mesh points outlining the lips (mp.solutions.face_mesh_connections.FACEMESH_LIPS)
+LIPS_LANDMARKS = [
+    0, 13, 14, 17, 37, 39, 40, 61, 78, 80, 81, 82, 84, 87, 88, 91, 95, 146, 178, 181,
+    185, 191, 267, 269, 270, 291, 308, 310, 311, 312, 314, 317, 318, 321, 324, 375, 402, 405, 409, 415,
+]
+
+SCHEMA_FILE = 'feature_schema.json'
+
+# Which landmarks make up the per-frame feature vector, in the order pose, face, right hand, left hand
+class FeatureSchema:
+    def __init__(self, name, version, face_landmarks):
+        self.name = name
+        self.version = version
+        # Indices of the face mesh points to keep, all 468 for the full schema, none to drop the face
+        self.face_landmarks = list(face_landmarks)
+
+        self.pose_slice = slice(0, POSE_LANDMARKS * POSE_FIELDS)
+        self.face_slice = slice(self.pose_slice.stop, self.pose_slice.stop + len(self.face_landmarks) * FACE_FIELDS)
+        self.right_hand_slice = slice(self.face_slice.stop, self.face_slice.stop + HAND_LANDMARKS * HAND_FIELDS)
+        self.left_hand_slice = slice(self.right_hand_slice.stop, self.right_hand_slice.stop + HAND_LANDMARKS * HAND_FIELDS)
+        self.size = self.left_hand_slice.stop
+
+        # Columns of the full vector that make up this schema, used to convert full keypoints
+        full_face_start = POSE_LANDMARKS * POSE_FIELDS
+        full_hands_start = full_face_start + FACE_LANDMARKS * FACE_FIELDS
+        face_columns = [full_face_start + i * FACE_FIELDS + f for i in self.face_landmarks for f in range(FACE_FIELDS)]
+        self.indices = np.array(
+            list(range(full_face_start)) + face_columns + list(range(full_hands_start, full_hands_start + 2 * HAND_LANDMARKS * HAND_FIELDS)),
+            dtype=np.intp
+        )
+
+    @property
+    def is_full(self):
+        return len(self.face_landmarks) == FACE_LANDMARKS
+
+    # Convert keypoints captured with the full schema to this one, works on (..., 1662) arrays
+    def project(self, keypoints):
+        keypoints = np.asarray(keypoints)
+        if keypoints.shape[-1] == self.size:
+            return keypoints
+        if keypoints.shape[-1] != FULL.size:
+            raise ValueError(f'Expected {FULL.size} or {self.size} features, got {keypoints.shape[-1]}')
+        return keypoints[..., self.indices]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'size': self.size,
+            'face_landmarks': self.face_landmarks,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        schema = cls(data['name'], data['version'], data['face_landmarks'])
+        if schema.size != data['size']:
+            raise ValueError(f"Schema {data['name']} v{data['version']} has size {schema.size}, file says {data['size']}")
+        return schema
+
+    # Save as feature_schema.json in the given folder, e.g. next to the model or the dataset
+    def save(self, folder):
+        with open(os.path.join(folder, SCHEMA_FILE), 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureSchema) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'FeatureSchema({self.name!r}, v{self.version}, size={self.size})'
+
+FULL = FeatureSchema('full', 1, range(FACE_LANDMARKS))
+HANDS_POSE = FeatureSchema('hands_pose', 1, [])
+HANDS_POSE_LIPS = FeatureSchema('hands_pose_lips', 1, LIPS_LANDMARKS)
+
+SCHEMAS = {schema.name: schema for schema in (FULL, HANDS_POSE, HANDS_POSE_LIPS)}
+
+def get_schema(name):
+    if name not in SCHEMAS:
+        raise ValueError(f"Unknown feature schema '{name}', expected one of {list(SCHEMAS)}")
+    return SCHEMAS[name]
+
+# Read feature_schema.json from a folder, data saved before schemas existed is the full schema
+def load_schema(folder):
+    path = os.path.join(folder, SCHEMA_FILE)
+    if not os.path.exists(path):
+        return FULL
+    with open(path) as f:
+        return FeatureSchema.from_dict(json.load(f))
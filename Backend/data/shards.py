@@ -0,0 +1,96 @@
+import json
+import os
+import numpy as np
+
+try:
+    from data.schema import FULL, FeatureSchema
+except ImportError:
+    from schema import FULL, FeatureSchema
+
+# Windows per shard file, about 200 MB of float32 with the full schema
+SHARD_SIZE = 1000
+
+INDEX_FILE = 'index.json'
+LABELS_FILE = 'labels.npy'
+
+# Write windows into fixed-size float32 shard_NNNNN.npy files, plus labels.npy and an index of the shard
+# offsets. Windows are copied in one at a time, so memory use does not depend on the dataset size.
+# windows is anything that yields (frames, features) arrays, e.g. np.load of each captured file
+def write_shards(windows, labels, output_folder, schema=FULL, window_len=30, shard_size=SHARD_SIZE):
+    os.makedirs(output_folder, exist_ok=True)
+    labels = np.asarray(labels, dtype=np.int32)
+    shards = []
+    shard = None
+    for i, window in enumerate(windows):
+        # Start the next shard, sized for the windows that are left
+        if i % shard_size == 0:
+            if shard is not None:
+                shard.flush()
+            name = f'shard_{len(shards):05d}.npy'
+            count = min(shard_size, len(labels) - i)
+            shard = np.lib.format.open_memmap(os.path.join(output_folder, name + '.tmp'), mode='w+',
+                                              dtype=np.float32, shape=(count, window_len, schema.size))
+            shards.append({'file': name, 'start': i, 'count': count})
+        shard[i % shard_size] = schema.project(window)
+    if shard is not None:
+        shard.flush()
+    del shard
+
+    # Shards are renamed and the index written last, a folder without an index is not a dataset yet
+    for entry in shards:
+        os.replace(os.path.join(output_folder, entry['file'] + '.tmp'), os.path.join(output_folder, entry['file']))
+    np.save(os.path.join(output_folder, LABELS_FILE), labels)
+    index = {
+        'num_samples': len(labels),
+        'window_len': window_len,
+        'schema': schema.to_dict(),
+        'shards': shards,
+    }
+    with open(os.path.join(output_folder, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=4)
+    return index
+
+# Read-only view of a sharded dataset. Shards are memory mapped, so windows are only read from disk
+# when a batch asks for them
+class ShardedDataset:
+    def __init__(self, shards, labels, schema=FULL):
+        self.shards = shards
+        self.labels = np.asarray(labels)
+        self.schema = schema
+        self.window_len = shards[0].shape[1] if shards else 30
+        # First sample of every shard, to find which shard a sample is in
+        self.starts = np.cumsum([0] + [len(shard) for shard in shards[:-1]]).astype(np.int64)
+
+    # Open a folder written by write_shards
+    @classmethod
+    def open(cls, folder):
+        with open(os.path.join(folder, INDEX_FILE)) as f:
+            index = json.load(f)
+        shards = [np.load(os.path.join(folder, entry['file']), mmap_mode='r') for entry in index['shards']]
+        return cls(shards, np.load(os.path.join(folder, LABELS_FILE)), FeatureSchema.from_dict(index['schema']))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def shape(self):
+        return (len(self), self.window_len, self.schema.size)
+
+    # Gather the windows at the given sample indices, in that order, into one float32 array
+    def take(self, indices, out=None):
+        indices = np.asarray(indices, dtype=np.int64)
+        if out is None:
+            out = np.empty((len(indices), self.window_len, self.schema.size), dtype=np.float32)
+        shard_ids = np.searchsorted(self.starts, indices, side='right') - 1
+        # One fancy-indexed read per shard, in file order so reads move forward through each shard
+        for shard_id in np.unique(shard_ids):
+            rows = np.flatnonzero(shard_ids == shard_id)
+            offsets = indices[rows] - self.starts[shard_id]
+            order = np.argsort(offsets, kind='stable')
+            out[rows[order]] = self.shards[shard_id][offsets[order]]
+        return out
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.take([index])[0]
+        return self.take(np.arange(len(self))[index])
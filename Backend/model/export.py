@@ -0,0 +1,183 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import tensorflow as tf
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.schema import load_schema
+from src.backends import MODEL_FILES, load_backend
+from src.engine import WINDOW_SHAPE, make_live_predictor
+
+# Where model.py saves the trained model and where its dataset is
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(root_path, 'data', 'Processed_test_dataset')
+
+# Batch the TFLite models are exported with. XNNPACK cannot resize the fused LSTM after conversion,
+# and the live path scores one window per frame anyway, larger batches run one window at a time
+TFLITE_BATCH = 1
+
+ONNX_OPSET = 17
+
+# SavedModel of the Keras model with a fixed input signature, both converters start from it
+def export_saved_model(model, path, batch=None):
+    signature = tf.TensorSpec((batch,) + tuple(model.input_shape[1:]), tf.float32, name='window')
+    model.export(path, format='tf_saved_model', input_signature=[signature], verbose=False)
+
+# float16 stores the weights in half precision and computes in float32, int8 stores int8 weights and
+# quantizes activations on the fly (dynamic range), so neither needs calibration data
+def export_tflite(saved_model, path, quantize):
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    with open(path + '.tmp', 'wb') as f:
+        f.write(converter.convert())
+    os.replace(path + '.tmp', path)
+
+# Converted by the tf2onnx command line, the batch stays dynamic
+def export_onnx(saved_model, path, opset=ONNX_OPSET):
+    subprocess.run([sys.executable, '-m', 'tf2onnx.convert', '--saved-model', saved_model, '--output', path + '.tmp',
+                    '--opset', str(opset)], check=True, capture_output=True)
+    os.replace(path + '.tmp', path)
+
+# Write the given backends' model files next to model.keras, returns {backend: path}
+def export_models(model_dir=MODEL_DIR, backends=('tflite-fp16', 'tflite-int8')):
+    model = load_backend('keras', model_dir)
+    paths = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fixed_batch, dynamic_batch = os.path.join(tmp, 'fixed_batch'), os.path.join(tmp, 'dynamic_batch')
+        for backend in backends:
+            path = os.path.join(model_dir, MODEL_FILES[backend])
+            if backend.startswith('tflite'):
+                if not os.path.exists(fixed_batch):
+                    export_saved_model(model, fixed_batch, TFLITE_BATCH)
+                export_tflite(fixed_batch, path, backend.split('-')[1])
+            elif backend == 'onnx':
+                # Optional, only exported when tf2onnx is installed
+                if importlib.util.find_spec('tf2onnx') is None:
+                    print('tf2onnx is not installed, skipping the ONNX export')
+                    continue
+                if not os.path.exists(dynamic_batch):
+                    export_saved_model(model, dynamic_batch)
+                export_onnx(dynamic_batch, path)
+            else:
+                raise ValueError(f'Cannot export to {backend}')
+            paths[backend] = path
+    return paths
+
+# Resident memory of this process in MB from /proc (Linux), VmRSS now or VmHWM the highest so far
+def rss(field='VmRSS'):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+# Start a new VmHWM from the current memory, the import of TensorFlow peaks higher than a small model
+def reset_peak_rss():
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+# Held-out windows and labels, the same test split as model.py. Random windows without labels when
+# there is no dataset
+def held_out(data_path, num_features, count=256):
+    if data_path is None or not os.path.exists(data_path):
+        return np.random.default_rng(0).random((count, WINDOW_SHAPE[0], num_features), dtype=np.float32), None
+
+    # Imported here, model.py pulls in the training code. It is next to this file when run as a script
+    try:
+        from model.loader import split_indices
+        from model.model import read_data
+    except ImportError:
+        from loader import split_indices
+        from model import read_data
+    _, dataset, target = read_data(data_path)
+    _, test_idx = split_indices(target, test_size=0.2, seed=42)
+    test_idx = np.sort(test_idx)
+    return dataset.take(test_idx), dataset.labels[test_idx]
+
+# Runs in a fresh process per backend so the peak memory is that backend's alone
+def measure_backend(task):
+    backend, model_dir, data_path, batch_size, live_windows = task
+    # Data is read before the baseline so only the model is counted
+    windows, labels = held_out(data_path, load_schema(model_dir).size)
+    reset_peak_rss()
+    baseline = rss()
+
+    start = time.perf_counter()
+    model = load_backend(backend, model_dir)
+    load_time = time.perf_counter() - start
+    model.predict_on_batch(windows[:batch_size])
+
+    # Server path: the whole split in batches, see engine.predict_windows
+    start = time.perf_counter()
+    probabilities = np.concatenate([np.asarray(model.predict_on_batch(windows[i:i + batch_size]))
+                                    for i in range(0, len(windows), batch_size)])
+    batched = (time.perf_counter() - start) / len(windows)
+
+    # Live path: one window per call, see engine.make_live_predictor
+    predict = make_live_predictor(model)
+    predict(windows[0])
+    times = []
+    for window in windows[:live_windows]:
+        start = time.perf_counter()
+        predict(window)
+        times.append(time.perf_counter() - start)
+
+    predictions = np.argmax(probabilities, axis=1)
+    return {
+        'backend': backend,
+        'size': os.path.getsize(os.path.join(model_dir, MODEL_FILES[backend])) / 2 ** 20,
+        'load': load_time,
+        'live': float(np.median(times)),
+        'batched': batched,
+        'memory': rss('VmHWM') - baseline,
+        'accuracy': float(np.mean(predictions == labels)) if labels is not None else None,
+        'predictions': predictions,
+    }
+
+# Latency, peak memory and held-out accuracy of every backend next to the Keras baseline
+def report(model_dir=MODEL_DIR, data_path=DATA_PATH, backends=tuple(MODEL_FILES), batch_size=256, live_windows=200):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for backend in backends:
+        if not os.path.exists(os.path.join(model_dir, MODEL_FILES[backend])):
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(measure_backend, (backend, model_dir, data_path, batch_size, live_windows)).result())
+
+    baseline = next((r for r in results if r['backend'] == 'keras'), None)
+    print(f'{"backend":<14}{"MB":>8}{"load s":>9}{"live ms":>10}{"batch ms":>10}{"peak MB":>10}{"accuracy":>10}{"agree":>8}')
+    for r in results:
+        accuracy = f'{r["accuracy"] * 100:.2f}%' if r['accuracy'] is not None else '-'
+        agree = f'{np.mean(r["predictions"] == baseline["predictions"]) * 100:.1f}%' if baseline else '-'
+        print(f'{r["backend"]:<14}{r["size"]:>8.2f}{r["load"]:>9.2f}{r["live"] * 1e3:>10.3f}{r["batched"] * 1e3:>10.3f}'
+              f'{r["memory"]:>10.1f}{accuracy:>10}{agree:>8}')
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export model.keras to TFLite (float16, int8) and ONNX, then compare the backends')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--data', default=DATA_PATH, help='processed dataset, its held-out split is used for accuracy')
+    parser.add_argument('--onnx', action='store_true', help='also export model.onnx, needs tf2onnx')
+    parser.add_argument('--skip-export', action='store_true', help='only report on the files already exported')
+    parser.add_argument('--skip-report', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--live-windows', type=int, default=200, help='windows timed one at a time')
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        backends = ['tflite-fp16', 'tflite-int8'] + (['onnx'] if args.onnx else [])
+        for backend, path in export_models(args.model_dir, backends).items():
+            print(f'{backend}: {path} ({os.path.getsize(path) / 2 ** 20:.2f} MB)')
+    if not args.skip_report:
+        report(args.model_dir, args.data, batch_size=args.batch_size, live_windows=args.live_windows)
@@ -0,0 +1,72 @@
+import numpy as np
+from keras.layers import Normalization
+from keras.utils import PyDataset
+from sklearn.model_selection import train_test_split
+
+# Streams batches of a ShardedDataset to Keras. Only the windows of the indices given are used, so a
+# train/test split is two loaders over the same files instead of two copies of the data.
+# workers > 1 reads batches in background threads while the model trains on the current one.
+# augment(x, rng), e.g. data.augment.Augmenter, runs on each batch in those threads too
+class ShardLoader(PyDataset):
+    def __init__(self, dataset, indices, num_classes, batch_size=32, shuffle=True, seed=None,
+                 workers=4, max_queue_size=16, augment=None):
+        super().__init__(workers=workers, use_multiprocessing=False, max_queue_size=max_queue_size)
+        self.dataset = dataset
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.num_classes = num_classes
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.augment = augment
+        self.rng = np.random.default_rng(seed)
+        # Every batch gets its own generator made from (seed, epoch, batch), generators are not
+        # shared between worker threads and an epoch can be repeated exactly
+        self.seed = int(self.rng.integers(2 ** 32))
+        self.epoch = 0
+        self.order = self.indices.copy()
+        if self.shuffle:
+            self.rng.shuffle(self.order)
+
+    def __len__(self):
+        return int(np.ceil(len(self.order) / self.batch_size))
+
+    def __getitem__(self, batch):
+        batch_indices = self.order[batch * self.batch_size:(batch + 1) * self.batch_size]
+        x = self.dataset.take(batch_indices)
+        if self.augment is not None:
+            x = self.augment(x, np.random.default_rng([self.seed, self.epoch, batch]))
+        # One-hot labels, float32 like the model output
+        y = np.zeros((len(batch_indices), self.num_classes), dtype=np.float32)
+        y[np.arange(len(batch_indices)), self.dataset.labels[batch_indices]] = 1
+        return x, y
+
+    # New order every epoch
+    def on_epoch_end(self):
+        self.epoch += 1
+        if self.shuffle:
+            self.rng.shuffle(self.order)
+
+# Stratified split of the sample indices, nothing is copied
+def split_indices(labels, test_size=0.2, seed=42):
+    return train_test_split(np.arange(len(labels)), test_size=test_size, stratify=labels, shuffle=True, random_state=seed)
+
+# Per-feature mean and variance of the windows at the given indices, read one batch at a time and
+# merged in float64 (Chan et al.), so the training set is never in memory as a whole
+def feature_stats(dataset, indices, batch_size=256):
+    indices = np.sort(np.asarray(indices, dtype=np.int64))
+    count, mean, m2 = 0, np.zeros(dataset.shape[-1]), np.zeros(dataset.shape[-1])
+    for start in range(0, len(indices), batch_size):
+        x = dataset.take(indices[start:start + batch_size]).reshape(-1, dataset.shape[-1]).astype(np.float64)
+        batch_mean = x.mean(axis=0)
+        batch_m2 = np.square(x - batch_mean).sum(axis=0)
+        delta = batch_mean - mean
+        total = count + len(x)
+        mean += delta * len(x) / total
+        m2 += batch_m2 + np.square(delta) * count * len(x) / total
+        count = total
+    return mean, m2 / max(count, 1)
+
+# Normalization layer with fixed statistics, the first layer of a model so inference feeds raw
+# keypoints. Constant features are left unscaled like StandardScaler does
+def normalization_layer(mean, variance):
+    variance = np.where(variance > 0, variance, 1)
+    return Normalization(mean=mean.astype(np.float32), variance=variance.astype(np.float32))
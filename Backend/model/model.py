@@ -1,14 +1,33 @@
+import argparse
 import os
+import sys
 import json
+import time
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+from keras.src import ops
 from keras.src.utils import to_categorical
-from keras.src.models import Sequential
-from keras.src.layers import LSTM, Dense, Dropout, BatchNormalization, Conv1D, MaxPooling1D, Input
+from keras.src.models import Model, Sequential
+from keras.src.layers import (LSTM, Dense, Dropout, BatchNormalization, Conv1D, MaxPooling1D, Input, Identity,
+                              SeparableConv1D, GlobalAveragePooling1D)
+from keras.src.losses import categorical_crossentropy, kl_divergence
 from keras.src.callbacks import TensorBoard, ReduceLROnPlateau, EarlyStopping
 
-# Read captured data
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.schema import load_schema
+from data.augment import Augmenter
+from data.shards import ShardedDataset
+from src.backends import load_backend
+from src.engine import make_live_predictor
+try:
+    from model.loader import ShardLoader, feature_stats, normalization_layer, split_indices
+    from model.simple_lstm_model import create_wide_model
+except ImportError:
+    from loader import ShardLoader, feature_stats, normalization_layer, split_indices
+    from simple_lstm_model import create_wide_model
+
+# Read captured data, the dataset is a ShardedDataset whose windows stay on disk until a batch needs them
 def read_data(data_path):
     sign_mapping, dataset, target = {}, [], []
     # Checks if file path exists
@@ -16,26 +35,32 @@ def read_data(data_path):
         return sign_mapping, dataset, target
     
     # Expected filenames
-    file_names = ['sign_mapping.json', 'full_dataset.npy', 'target.json']
+    file_names = ['sign_mapping.json', 'shards', 'target.json', 'full_dataset.npy']
     
     # Open json files and read data
     with open(os.path.join(data_path, file_names[0]), 'r') as f:
         sign_mapping = json.load(f)
         f.close()
-    
-    # Open npy file and read data
-    dataset = np.load(os.path.join(data_path, file_names[1]))
 
     with open(os.path.join(data_path, file_names[2]), 'r') as f:
         target = json.load(f)
         f.close()
+
+    # Sharded dataset written by process.py, or the older single npy file memory mapped as one shard
+    if os.path.exists(os.path.join(data_path, file_names[1])):
+        dataset = ShardedDataset.open(os.path.join(data_path, file_names[1]))
+    else:
+        full_dataset = np.load(os.path.join(data_path, file_names[3]), mmap_mode='r')
+        dataset = ShardedDataset([full_dataset], target, load_schema(data_path))
     
     return sign_mapping, dataset, target
 
 # Create a simple LSTM model to demo
-def create_simple_model():
+def create_simple_model(num_classes, num_features=1662, normalization=None):
     model = Sequential([
-        Input(shape=(30,1662)),
+        Input(shape=(30, num_features)),
+        # Scales raw keypoints with the training set statistics, see loader.normalization_layer
+        normalization or Identity(),
 
         # Hidden layers to capture sequential movements
         LSTM(64, activation='relu', return_sequences=True),
@@ -48,15 +73,16 @@ def create_simple_model():
         Dense(64, activation='relu'),
         Dense(32, activation='relu'),
         # Output layer
-        Dense(actions.shape[0], activation='softmax')
+        Dense(num_classes, activation='softmax')
     ])
     return model
 
 # Create a complex LSTM Model
-def create_complex_model(): # Create model
+def create_complex_model(num_classes, num_features=1662, normalization=None): # Create model
     model = Sequential([
         # Input Layer
-        Input(shape=(30,1662)),
+        Input(shape=(30, num_features)),
+        normalization or Identity(),
         BatchNormalization(),
         
         # Captures short-term temporal features
@@ -81,11 +107,86 @@ def create_complex_model(): # Create model
         Dense(32, activation='relu'), 
 
         # Output Layer
-        Dense(len(actions), activation='softmax'),
+        Dense(num_classes, activation='softmax'),
+    ])
+    return model
+
+# Small model for real-time CPU inference, trained from the complex model with Distiller. Depthwise
+# separable temporal convolutions filter each feature over time on its own and then mix the features
+# with a 1x1 convolution, a fraction of the cost of the Conv1D and LSTM stack
+def create_student_model(num_classes, num_features=1662, normalization=None):
+    model = Sequential([
+        Input(shape=(30, num_features)),
+        normalization or Identity(),
+
+        # Short then, with dilation, longer temporal patterns
+        SeparableConv1D(64, kernel_size=5, activation='relu', padding='same'),
+        BatchNormalization(),
+        SeparableConv1D(64, kernel_size=5, dilation_rate=2, activation='relu', padding='same'),
+        BatchNormalization(),
+
+        # Decision layer
+        GlobalAveragePooling1D(),
+        Dropout(0.2),
+        Dense(num_classes, activation='softmax'),
     ])
     return model
 
-# Fit model based on the the inputted model
+# Architectures by name, for training (--architecture) and for benchmarks/bench_architectures.py. Every
+# builder takes (num_classes, num_features, normalization)
+ARCHITECTURES = {
+    'simple': create_simple_model,
+    'complex': create_complex_model,
+    'wide': create_wide_model,
+    'student': create_student_model,
+}
+
+# Trains a student on the teacher's softened probabilities mixed with the true labels (Hinton et al.).
+# alpha is the weight of the true labels, a temperature above 1 softens both distributions so the
+# student also learns which signs the teacher finds alike. Only the student is saved afterwards
+class Distiller(Model):
+    def __init__(self, student, teacher, alpha=0.1, temperature=4.0):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.alpha = alpha
+        self.temperature = temperature
+
+    def call(self, x, training=False):
+        return self.student(x, training=training)
+
+    def compute_loss(self, x=None, y=None, y_pred=None, sample_weight=None, training=True):
+        teacher_pred = self.teacher(x, training=False)
+        # Both models end in softmax, log probabilities are the logits up to a constant
+        soft_teacher = ops.softmax(ops.log(teacher_pred + 1e-7) / self.temperature)
+        soft_student = ops.softmax(ops.log(y_pred + 1e-7) / self.temperature)
+        distillation = ops.mean(kl_divergence(soft_teacher, soft_student)) * self.temperature ** 2
+        return self.alpha * ops.mean(categorical_crossentropy(y, y_pred)) + (1 - self.alpha) * distillation
+
+# Accuracy, parameter count and CPU latency per window of each model on the test loader. Live is one
+# window per call like detect.py, batched is the whole test set like video_to_text
+def compare_models(models, test_data, labels, live_windows=200):
+    windows = np.concatenate([test_data[i][0] for i in range(len(test_data))])
+    print(f'{"model":<10}{"params":>10}{"accuracy":>10}{"live ms":>10}{"batch ms":>10}')
+    for name, model in models.items():
+        model.predict(windows, verbose=0)
+        start = time.perf_counter()
+        predictions = np.argmax(model.predict(windows, verbose=0), axis=1)
+        batched = (time.perf_counter() - start) / len(windows)
+
+        predict = make_live_predictor(model)
+        predict(windows[0])
+        times = []
+        for window in windows[:live_windows]:
+            start = time.perf_counter()
+            predict(window)
+            times.append(time.perf_counter() - start)
+
+        accuracy = np.mean(predictions == labels)
+        print(f'{name:<10}{model.count_params():>10}{accuracy * 100:>9.2f}%{np.median(times) * 1e3:>10.3f}{batched * 1e3:>10.3f}')
+
+# Fit model based on the the inputted model, X_train can also be a loader yielding (x, y) batches
 def fit_model(model, X_train, y_train, epochs): 
     log_dir = os.path.join('Logs')
     # Create callbacks
@@ -120,31 +221,59 @@ def compare_results(actions, res, y_test):
         print(f'Pred: {predicted} -> Exp: {expected}')
     
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the sign classifier')
+    parser.add_argument('--architecture', choices=ARCHITECTURES, help='complex by default, student with --distill')
+    parser.add_argument('--distill', metavar='TEACHER_DIR',
+                        help='train the small student model on the soft labels of the model saved in TEACHER_DIR')
+    parser.add_argument('--epochs', type=int, default=200)
+    args = parser.parse_args()
+    architecture = args.architecture or ('student' if args.distill else 'complex')
+
     PREPROCESSED_DATA_PATH = os.path.join(os.getcwd(), '..', 'data', 'Processed_test_dataset')
 
     # Read preprocessed data
     sign_mapping, dataset, target = read_data(PREPROCESSED_DATA_PATH)
 
+    # Landmarks in each frame of the dataset, saved with the model so inference builds the same vector
+    schema = load_schema(PREPROCESSED_DATA_PATH)
+
     # Cast map to list then to npy array
     actions = np.array(list(sign_mapping.items())) # Output is in the format of ['sign', 'index']
 
-    X = dataset
     y = to_categorical(target).astype(int)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, shuffle=True, random_state=42)
+    # Split by index, both loaders stream batches from the same files instead of copying them
+    train_idx, test_idx = split_indices(target, test_size=0.2, seed=42)
+    # Training batches are mirrored, jittered, scaled, shifted, time warped and lose frames at random
+    train_data = ShardLoader(dataset, train_idx, len(actions), batch_size=32, shuffle=True, seed=42,
+                             augment=Augmenter(schema))
+    test_data = ShardLoader(dataset, test_idx, len(actions), batch_size=32, shuffle=False)
+    y_test = y[test_idx]
+
+    # Feature mean and variance of the training windows in one streaming pass, stored in the model
+    # itself so inference feeds raw keypoints with no separate scaler
+    normalization = normalization_layer(*feature_stats(dataset, train_idx))
 
-    # Fit based on training dataset
-    model = create_complex_model() # Change this function to use a more complex model
-    fit_model(model, X_train, y_train, 200)
+    model = ARCHITECTURES[architecture](len(actions), schema.size, normalization)
+    if args.distill:
+        # Student learns from the trained model in TEACHER_DIR and is saved here in its place, a drop-in
+        # model for video_to_text and detect.py
+        teacher = load_backend('keras', args.distill)
+        fit_model(Distiller(model, teacher), train_data, None, args.epochs)
+        model.compile(optimizer='Adam', loss='categorical_crossentropy', metrics=['categorical_accuracy'])
+        compare_models({'teacher': teacher, 'student': model}, test_data, np.asarray(target)[test_idx])
+    else:
+        # Fit based on training dataset
+        fit_model(model, train_data, None, args.epochs)
 
     # Predict test
-    res = model.predict(X_test)
+    res = model.predict(test_data)
 
     # Print predicted and expected
     compare_results(actions, res, y_test)
 
     # Output Accuracy
-    test_loss, test_acc = model.evaluate(X_test, y_test)
+    test_loss, test_acc = model.evaluate(test_data)
     print(f"test acc: {test_acc*100:.4f}%")
 
     # Save model to keras file
@@ -152,4 +281,6 @@ if __name__ == '__main__':
     model.save('model.keras')
     print('Saving model weigths to .weights.h5')
     model.save_weights('model.weights.h5')
+    print(f'Saving feature schema ({schema.name})')
+    schema.save(os.getcwd())
     del model
\ No newline at end of file
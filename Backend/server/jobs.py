@@ -0,0 +1,149 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+class QueueFullError(Exception):
+    pass
+
+# A single video waiting for or going through transcription
+class Job:
+    def __init__(self, video_path, options=None):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        # Extra keyword arguments of the transcription, e.g. profiling
+        self.options = options or {}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        # Set to ask a running transcription to stop early
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    # Block until the job has finished, returns False on timeout
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        now = time.time()
+        # Time spent waiting for a worker, and time spent transcribing
+        queue_wait = (self.started_at or self.finished_at or now) - self.submitted_at
+        run_time = (self.finished_at or now) - self.started_at if self.started_at else None
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'queue_wait': queue_wait,
+            'run_time': run_time,
+        }
+
+# In-process job queue, videos are transcribed by a bounded pool of worker threads
+class JobQueue:
+    def __init__(self, func, max_workers=2, max_queued=32, max_finished=256, on_finish=None):
+        # func(video_path, cancel_event, **options) returns the transcription, on_finish(job) is called once a job
+        # has finished, whatever its status
+        self.func = func
+        self.on_finish = on_finish
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcribe')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # options are passed on to func as keyword arguments
+    def submit(self, video_path, **options):
+        with self._lock:
+            if self._count(QUEUED) >= self.max_queued:
+                raise QueueFullError(f'Queue is full ({self.max_queued} jobs waiting)')
+            job = Job(video_path, options)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # Cancel a job, queued jobs never start and running jobs stop at the next frame
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+        return True
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        run_times = [job.finished_at - job.started_at for job in jobs if job.status == DONE]
+        return {
+            'workers': self.max_workers,
+            'queued': sum(job.status == QUEUED for job in jobs),
+            'running': sum(job.status == RUNNING for job in jobs),
+            'done': sum(job.status == DONE for job in jobs),
+            'failed': sum(job.status == FAILED for job in jobs),
+            'cancelled': sum(job.status == CANCELLED for job in jobs),
+            'avg_run_time': sum(run_times) / len(run_times) if run_times else None,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            result = self.func(job.video_path, job.cancel_event, **job.options)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+            return
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.result = result
+        self._finish(job, DONE)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        # A failing callback must not leave the job's waiters hanging
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception:
+                pass
+        job._done.set()
+
+    def _count(self, status):
+        return sum(job.status == status for job in self._jobs.values())
+
+    # Forget the oldest finished jobs so memory stays bounded
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -1,21 +1,158 @@
-from flask import Flask, request, send_from_directory, jsonify
+from flask import Flask, Response, g, request, send_from_directory, jsonify
 from flask_cors import CORS
+import contextlib
+import cProfile
+import glob
+import json
 import os
 import sys
+import time
+import uuid
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(root_path)
 
+from src.engine import get_engine
+from src.stages import StageRecorder
 from src.Video_to_Text import video_to_text
+from jobs import JobQueue, QueueFullError
+from metrics import CONTENT_TYPE, SIZE_BUCKETS, Registry
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*", "send_wildcard": "False"}})
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Number of videos transcribed at the same time, and how many may wait for a worker
+JOB_WORKERS = int(os.environ.get('ASLIGATOR_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('ASLIGATOR_JOB_QUEUE_SIZE', 32))
+
+# Uploads are resampled to this frame rate before landmarks are extracted
+TARGET_FPS = float(os.environ.get('ASLIGATOR_TARGET_FPS', 30))
+
+# Longest side of the frames given to MediaPipe, larger uploads are scaled down
+MP_MAX_SIDE = int(os.environ.get('ASLIGATOR_MP_MAX_SIDE', 960))
+
+# MediaPipe processes per upload, 1 keeps everything in the job thread (see src/pipeline.py)
+PIPELINE_WORKERS = int(os.environ.get('ASLIGATOR_PIPELINE_WORKERS', 1))
+
+# Time segments of long uploads processed side by side, 1 turns it off (see src/segments.py)
+SEGMENT_WORKERS = int(os.environ.get('ASLIGATOR_SEGMENT_WORKERS', 1))
+
+# What runs the sign classifier: keras, tflite-fp16, tflite-int8 or onnx (see src/backends.py and model/export.py)
+INFERENCE_BACKEND = os.environ.get('ASLIGATOR_BACKEND', 'keras')
+
+# Profiling of uploads: 'trace' writes a Chrome trace of every stage call next to the upload, 'cprofile'
+# also writes a cProfile dump. Set here it applies to every upload, otherwise an upload asks for it
+# with the X-Profile header. Traces are listed on /traces
+PROFILE_MODES = ('trace', 'cprofile')
+PROFILE = os.environ.get('ASLIGATOR_PROFILE') or None
+if PROFILE is not None and PROFILE not in PROFILE_MODES:
+    raise ValueError(f'ASLIGATOR_PROFILE must be one of {", ".join(PROFILE_MODES)}, got {PROFILE}')
+
+# Most traces listed by /traces, newest first
+MAX_TRACES = 50
+
 # Make sure upload folder exists so videos can be uploaded to it
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Load and warm up the model once at start instead of on every upload
+engine = get_engine(INFERENCE_BACKEND)
+engine.start()
+
+# Telemetry served on /metrics in the Prometheus text format
+registry = Registry()
+http_requests = registry.counter('asligator_http_requests_total', 'HTTP requests answered', ('endpoint', 'method', 'status'))
+http_request_seconds = registry.histogram('asligator_http_request_seconds', 'Time to answer an HTTP request', ('endpoint', 'method'))
+requests_in_flight = registry.gauge('asligator_http_requests_in_flight', 'HTTP requests being answered')
+upload_bytes = registry.histogram('asligator_upload_bytes', 'Size of the uploaded videos', buckets=SIZE_BUCKETS)
+queue_wait = registry.histogram('asligator_job_queue_wait_seconds', 'Time a job waited for a transcription worker')
+job_seconds = registry.histogram('asligator_job_run_seconds', 'Time a job spent being transcribed', ('status',))
+jobs_by_status = registry.gauge('asligator_jobs', 'Jobs the queue knows about', ('status',))
+# Stages are the ones marked in Video_to_Text.py: probe, decode, preprocess, mp_detect (MediaPipe),
+# extract_landmarks (features), load_model, predict (inference), smooth and gloss
+stage_seconds = registry.histogram('asligator_stage_seconds', 'Time one transcription spent in a stage of video_to_text', ('stage',))
+frames_processed = registry.counter('asligator_frames_processed_total', 'Video frames transcribed')
+frames_per_second = registry.histogram('asligator_frames_per_second', 'Frames per second of each transcription',
+                                       buckets=(1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120))
+model_ready = registry.gauge('asligator_model_ready', '1 once the model is loaded and warmed up', ('backend',))
+model_load_seconds = registry.gauge('asligator_model_load_seconds', 'Time to load the model', ('backend',))
+model_warmup_seconds = registry.gauge('asligator_model_warmup_seconds', 'Time of the first prediction', ('backend',))
+
+# Chrome trace of a profiled transcription next to the upload, and the cProfile dump when there is one
+def write_profile(video_path, recorder, profiler=None):
+    with open(video_path + '.trace.json', 'w') as f:
+        json.dump(recorder.chrome_trace(os.path.basename(video_path)), f)
+    if profiler is not None:
+        profiler.dump_stats(video_path + '.prof')
+
+# Run video_to_text on an uploaded video, stopping early if the job is cancelled.
+# Its stages are recorded for the metrics, the hooks do nothing outside a recorder.
+# profile is None or one of PROFILE_MODES
+def transcribe(video_path, cancel_event, profile=None):
+    recorder = StageRecorder(trace=profile is not None)
+    profiler = cProfile.Profile() if profile == 'cprofile' else None
+    try:
+        with recorder, profiler or contextlib.nullcontext():
+            start = time.perf_counter()
+            sentence = video_to_text(video_path, cancel_event=cancel_event, target_fps=TARGET_FPS, mp_max_side=MP_MAX_SIDE,
+                                     workers=PIPELINE_WORKERS, segment_workers=SEGMENT_WORKERS, backend=INFERENCE_BACKEND)
+            seconds = time.perf_counter() - start
+    finally:
+        # Failed transcriptions are traced too
+        if profile is not None:
+            write_profile(video_path, recorder, profiler)
+
+    stages = recorder.report()
+    frames = stages.pop('frames', {}).get('calls', 0)
+    for name, totals in stages.items():
+        stage_seconds.observe(totals['seconds'], stage=name)
+    frames_processed.inc(frames)
+    if frames and seconds > 0:
+        frames_per_second.observe(frames / seconds)
+    return sentence
+
+# Queue wait and run time of every job that got a worker
+def record_job(job):
+    if job.started_at is None:
+        return
+    queue_wait.observe(job.started_at - job.submitted_at)
+    job_seconds.observe(job.finished_at - job.started_at, status=job.status)
+
+# Uploads are only needed until their job has finished, whatever its status. Traces of profiled
+# uploads are separate files and stay
+def finish_job(job):
+    if os.path.exists(job.video_path):
+        os.remove(job.video_path)
+    record_job(job)
+
+jobs = JobQueue(transcribe, max_workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, on_finish=finish_job)
+
+# Request timing, labelled by route so job ids and file names do not make new series
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    requests_in_flight.inc()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    http_request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method)
+    return response
+
+# Runs even when the request failed, the start time is popped so a request is only counted out once
+@app.teardown_request
+def finish_request(exc):
+    if g.pop('request_start', None) is not None:
+        requests_in_flight.dec()
+
+# Reports whether the model has been loaded and warmed up
+@app.route('/ready')
+def ready():
+    status = engine.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 # Post method to allow frontend to send videos to the server and for the model to process it
 @app.route('/upload', methods=['POST'])
 def upload_video():
@@ -28,15 +165,81 @@ def upload_video():
     if video.filename == '':
         return {"error": "Empty filename"}, 400
 
-    # Upload video to uploads folder
-    video_path = os.path.join(app.config['UPLOAD_FOLDER'], video.filename)
+    # Profiling asked for by the upload, or the server default
+    profile = request.headers.get('X-Profile', PROFILE) or None
+    if profile is not None and profile not in PROFILE_MODES:
+        return {"error": f"X-Profile must be one of {', '.join(PROFILE_MODES)}"}, 400
+
+    # Upload video to uploads folder, prefixed so uploads with the same name don't overwrite each other
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{uuid.uuid4().hex}_{video.filename}')
     video.save(video_path)
+    upload_bytes.observe(os.path.getsize(video_path))
+
+    # Queue the video for transcription, the result is fetched from /jobs/<job_id>
+    try:
+        job = jobs.submit(video_path, profile=profile)
+    except QueueFullError as e:
+        os.remove(video_path)
+        return {"error": str(e)}, 503
+
+    # Send the job id as a json message to the frontend, with where the trace will be when profiling
+    response = {"message": "Video uploaded successfully", 'job_id': job.id, 'status': job.status}
+    if profile is not None:
+        response['trace'] = f'/videos/{os.path.basename(video_path)}.trace.json'
+    return jsonify(response), 202
+
+# Queue depth and job timing
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    return jsonify(jobs.stats())
+
+# Status of a transcription job, includes the result once it is done
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}, 404
+    return jsonify(job.to_dict())
+
+# Cancel a queued or running transcription job
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}, 404
+    if not jobs.cancel(job_id):
+        return {"error": f"Job already {job.status}"}, 409
+    return jsonify(job.to_dict())
 
-    # Run video_to_text on the uploaded video
-    results = video_to_text(video_path)
+# Telemetry in the Prometheus text format, queue and model gauges are read at scrape time
+@app.route('/metrics')
+def metrics():
+    stats = jobs.stats()
+    for status in ('queued', 'running', 'done', 'failed', 'cancelled'):
+        jobs_by_status.set(stats[status], status=status)
+    status = engine.status()
+    model_ready.set(int(status['ready']), backend=status['backend'])
+    model_load_seconds.set(status['load_time'] or 0, backend=status['backend'])
+    model_warmup_seconds.set(status['warmup_time'] or 0, backend=status['backend'])
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
-    # Send results as a json message to the frontend
-    return jsonify({"message": "Video uploaded successfully", 'result': results})
+# Most recent traces of profiled uploads, newest first. The files are served by /videos/<filename>
+@app.route('/traces')
+def list_traces():
+    paths = sorted(glob.glob(os.path.join(UPLOAD_FOLDER, '*.trace.json')), key=os.path.getmtime, reverse=True)
+    traces = []
+    for path in paths[:MAX_TRACES]:
+        name = os.path.basename(path)
+        video = name[:-len('.trace.json')]
+        has_profile = os.path.exists(os.path.join(UPLOAD_FOLDER, video + '.prof'))
+        traces.append({
+            'video': video,
+            'trace': f'/videos/{name}',
+            'cprofile': f'/videos/{video}.prof' if has_profile else None,
+            'created': os.path.getmtime(path),
+            'size': os.path.getsize(path),
+        })
+    return jsonify(traces)
 
 @app.route('/videos/<filename>')
 def serve_video(filename):
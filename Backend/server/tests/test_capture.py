@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import numpy as np
+
+# The capture scripts import their siblings directly, like when run from the data folder
+data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data"))
+sys.path.append(data_path)
+
+from Capture_MSASL import group_by_source, read_frames_at, segment_frame_numbers, split_name
+from Capture_Video import MANIFEST_FILE, append_manifest, load_manifest
+from process import build_dataset, extract_signs
+from schema import FULL, get_schema
+
+# Test that samples of different MS-ASL splits sharing an output folder get different ids
+def test_msasl_sample_ids():
+    data = [{'clean_text': 'hello', 'file': 'a', 'start_time': 1.0, 'end_time': 2.0},
+            {'clean_text': 'thanks', 'file': 'a', 'start_time': 0.0, 'end_time': 1.0}]
+    train = group_by_source(data, 'videos', split_name('MSASL/MSASL_train.json'))
+    val = group_by_source(data, 'videos', split_name('MSASL_val.json'))
+
+    source = os.path.join('videos', 'a_full.mp4')
+    assert [segment[0] for segment in train[source]] == ['MSASL_train_1', 'MSASL_train_0']
+    assert [segment[0] for segment in val[source]] == ['MSASL_val_1', 'MSASL_val_0']
+
+# Test that later manifest lines win and a line cut off by an interrupted run is ignored
+def test_manifest_resume(tmp_path):
+    with open(tmp_path / MANIFEST_FILE, 'a') as f:
+        append_manifest(f, {'path': 'a.mp4', 'frames': 10, 'size': 1, 'mtime': 1})
+        append_manifest(f, {'path': 'b.mp4', 'frames': 30, 'size': 2, 'mtime': 2})
+        append_manifest(f, {'path': 'a.mp4', 'frames': 30, 'size': 3, 'mtime': 3})
+        f.write(json.dumps({'path': 'c.mp4', 'frames': 30})[:12])
+
+    manifest = load_manifest(tmp_path)
+
+    assert sorted(manifest) == ['a.mp4', 'b.mp4']
+    assert manifest['a.mp4']['size'] == 3
+    assert load_manifest(tmp_path / 'missing') == {}
+
+# Stand-in for cv2.VideoCapture that records which frames were decoded
+class FakeCapture:
+    def __init__(self, num_frames):
+        self.num_frames = num_frames
+        self.position = -1
+        self.retrieved = []
+
+    def set(self, prop, value):
+        self.position = value - 1
+
+    def grab(self):
+        self.position += 1
+        return self.position < self.num_frames
+
+    def retrieve(self):
+        self.retrieved.append(self.position)
+        return True, self.position
+
+# Test that segments are sampled evenly and only the sampled frames are decoded, once each
+def test_read_segment_frames():
+    numbers = segment_frame_numbers(2.0, 4.0, fps=30, num_frames=30)
+    assert len(numbers) == 30 and numbers[0] == 60 and numbers[-1] == 119
+
+    capture = FakeCapture(200)
+    assert list(read_frames_at(capture, numbers)) == list(numbers)
+    assert capture.retrieved == list(numbers)
+
+    # Segments shorter than 30 frames repeat frames without decoding them again
+    short = segment_frame_numbers(1.0, 1.5, fps=30, num_frames=30)
+    capture = FakeCapture(200)
+    assert list(read_frames_at(capture, short)) == list(short)
+    assert capture.retrieved == sorted(set(short))
+
+# Test that the dataset is written into a float32 memmap in the order of the targets
+def test_build_dataset(tmp_path):
+    data_path = tmp_path / 'npy'
+    for sign, value in [('hello', 1.0), ('bye', 2.0)]:
+        (data_path / sign).mkdir(parents=True)
+        for i in range(3):
+            np.save(data_path / sign / f'{i}.npy', np.full((30, FULL.size), value + i, dtype=np.float64))
+    (data_path / 'hello' / 'partial.npy.tmp').write_bytes(b'')
+    FULL.save(data_path)
+
+    schema = get_schema('hands_pose')
+    sign_mapping, files, target = extract_signs(str(data_path), schema)
+    output_file = str(tmp_path / 'full_dataset.npy')
+    build_dataset(files, output_file, schema)
+
+    dataset = np.load(output_file, mmap_mode='r')
+    assert isinstance(dataset, np.memmap)
+    assert dataset.shape == (6, 30, schema.size) and dataset.dtype == np.float32
+    for window, path, label in zip(dataset, files, target):
+        np.testing.assert_array_equal(window, schema.project(np.load(path)))
+        assert os.path.basename(os.path.dirname(path)) == list(sign_mapping)[label]
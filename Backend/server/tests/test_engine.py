@@ -0,0 +1,116 @@
+import os
+import sys
+import numpy as np
+import pytest
+import keras
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(root_path)
+sys.path.append(os.path.join(root_path, 'model'))
+
+from data.schema import HANDS_POSE
+from export import export_models
+from model import ARCHITECTURES, Distiller, create_complex_model, create_student_model
+from src.backends import load_backend
+from src.engine import WINDOW_SHAPE, make_live_predictor, predict_windows, smooth_predictions
+
+@pytest.fixture(scope='module')
+def model():
+    return keras.Sequential([
+        keras.Input(shape=WINDOW_SHAPE),
+        keras.layers.LSTM(8),
+        keras.layers.Dense(3, activation='softmax'),
+    ])
+
+# Test that batched windows give the same probabilities as predicting frame by frame
+def test_predict_windows_matches_per_frame(model):
+    keypoints = np.random.default_rng(0).random((45, WINDOW_SHAPE[1]), dtype=np.float32)
+    predict = make_live_predictor(model)
+
+    expected = np.array([predict(keypoints[i:i + 30]) for i in range(len(keypoints) - 29)])
+    result = predict_windows(model, keypoints, batch_size=4)
+
+    assert result.shape == (16, 3)
+    np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6)
+
+# Test that videos shorter than one window give no predictions
+def test_predict_windows_short_video(model):
+    keypoints = np.zeros((10, WINDOW_SHAPE[1]), dtype=np.float32)
+
+    assert predict_windows(model, keypoints).shape == (0, 3)
+
+# Test that a sign is only added once it is the smallest of the last predictions and above the threshold
+def test_smooth_predictions():
+    actions = ['a', 'b', 'c']
+    probabilities = np.array([
+        [0.9, 0.05, 0.05],
+        [0.9, 0.05, 0.05],
+        [0.1, 0.8, 0.1],
+        [0.1, 0.8, 0.1],
+        [0.6, 0.2, 0.2],
+        [0.4, 0.3, 0.3],
+    ])
+
+    assert smooth_predictions(probabilities, actions, history=2) == ['a', 'b', 'a']
+
+@pytest.fixture(scope='module')
+def model_dir(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('model')
+    keras.utils.set_random_seed(0)
+    model = create_complex_model(3, HANDS_POSE.size)
+    model.save(str(folder / 'model.keras'))
+    model.save_weights(str(folder / 'model.weights.h5'))
+    HANDS_POSE.save(str(folder))
+    return folder
+
+# Test that the quantized TFLite models give about the same probabilities as Keras, batched and live
+def test_tflite_backends_match_keras(model_dir):
+    paths = export_models(str(model_dir), ('tflite-fp16', 'tflite-int8'))
+    assert sorted(paths) == ['tflite-fp16', 'tflite-int8']
+
+    keypoints = np.random.default_rng(0).random((40, HANDS_POSE.size), dtype=np.float32)
+    expected = predict_windows(load_backend('keras', str(model_dir)), keypoints)
+    # int8 quantizes the activations too, float16 only rounds the weights
+    for backend, atol in [('tflite-fp16', 0.005), ('tflite-int8', 0.05)]:
+        model = load_backend(backend, str(model_dir))
+        assert model.input_shape == (None, 30, HANDS_POSE.size)
+        result = predict_windows(model, keypoints, batch_size=4)
+        np.testing.assert_allclose(result, expected, atol=atol)
+        np.testing.assert_allclose(make_live_predictor(model)(keypoints[:30]), expected[0], atol=atol)
+
+# Test the optional ONNX export and backend
+def test_onnx_backend_matches_keras(model_dir):
+    pytest.importorskip('tf2onnx')
+    pytest.importorskip('onnxruntime')
+    export_models(str(model_dir), ('onnx',))
+
+    keypoints = np.random.default_rng(1).random((40, HANDS_POSE.size), dtype=np.float32)
+    expected = predict_windows(load_backend('keras', str(model_dir)), keypoints)
+    np.testing.assert_allclose(predict_windows(load_backend('onnx', str(model_dir)), keypoints), expected, atol=1e-4)
+
+# Test that a student trains on the teacher's probabilities and scores windows like any other model
+def test_distill_student(model_dir):
+    rng = np.random.default_rng(0)
+    x = rng.random((64, 30, HANDS_POSE.size), dtype=np.float32)
+    y = np.eye(3, dtype=np.float32)[rng.integers(3, size=64)]
+    teacher = load_backend('keras', str(model_dir))
+    student = create_student_model(3, HANDS_POSE.size)
+    assert student.count_params() < teacher.count_params() / 4
+
+    distiller = Distiller(student, teacher)
+    distiller.compile(optimizer='Adam')
+    history = distiller.fit(x, y, epochs=2, batch_size=32, verbose=0)
+    assert np.all(np.isfinite(history.history['loss']))
+    assert not teacher.trainable
+
+    keypoints = rng.random((40, HANDS_POSE.size), dtype=np.float32)
+    result = predict_windows(student, keypoints)
+    assert result.shape == (11, 3)
+    np.testing.assert_allclose(make_live_predictor(student)(keypoints[:30]), result[0], rtol=1e-4, atol=1e-5)
+
+# Test that every registered architecture takes a window of the schema and scores every class
+def test_architectures_build():
+    for name, create in ARCHITECTURES.items():
+        model = create(4, HANDS_POSE.size)
+        assert model.input_shape == (None, 30, HANDS_POSE.size), name
+        assert model.output_shape == (None, 4), name
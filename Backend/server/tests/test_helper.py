@@ -0,0 +1,205 @@
+import os
+import sys
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from mediapipe.framework.formats import landmark_pb2
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(root_path)
+
+from data.schema import FULL, HANDS_POSE, HANDS_POSE_LIPS, FeatureSchema, load_schema
+import cv2
+from data.frames import FramePreprocessor, sample_frames, sampled_frame_numbers
+from data.helper import FACE_SLICE, LEFT_HAND_SLICE, NUM_KEYPOINTS, POSE_SLICE, RIGHT_HAND_SLICE, KeypointWindow, extract_landmarks
+
+# Test that the window keeps the most recent frames in order as one contiguous float32 view
+def test_keypoint_window_order():
+    window = KeypointWindow(length=3, num_features=2)
+    for i in range(5):
+        window.append([i, i])
+
+    view = window.view()
+    assert window.full
+    assert view.dtype == np.float32
+    assert view.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(view[:, 0], [2, 3, 4])
+    assert window.batch_view().shape == (1, 3, 2)
+
+# Test writing a frame in place and resetting the window
+def test_keypoint_window_next_frame_and_reset():
+    window = KeypointWindow(length=3, num_features=2)
+    window.next_frame()[:] = 7
+    window.advance()
+
+    assert not window.full
+    np.testing.assert_array_equal(window.frames(), [[7, 7]])
+
+    window.reset()
+    assert window.count == 0
+    assert len(window.frames()) == 0
+
+# Landmark list like MediaPipe returns, optionally with visibility set
+def make_landmarks(values, with_visibility=False):
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in values:
+        landmark = landmarks.landmark.add()
+        landmark.x, landmark.y, landmark.z = x, y, z
+        if with_visibility:
+            landmark.visibility = visibility
+    return landmarks
+
+# Test that keypoints are written in place at the pose, face, right and left hand offsets
+def test_extract_landmarks_into_buffer():
+    rng = np.random.default_rng(0)
+    pose = rng.random((33, 4), dtype=np.float32)
+    face = rng.random((468, 4), dtype=np.float32)
+    right = rng.random((21, 4), dtype=np.float32)
+    results = SimpleNamespace(
+        pose_landmarks=make_landmarks(pose, with_visibility=True),
+        face_landmarks=make_landmarks(face),
+        right_hand_landmarks=make_landmarks(right),
+        left_hand_landmarks=None,
+    )
+    out = np.full(NUM_KEYPOINTS, -1, dtype=np.float32)
+
+    assert extract_landmarks(results, out=out) is out
+    np.testing.assert_array_equal(out[POSE_SLICE], pose.flatten())
+    np.testing.assert_array_equal(out[FACE_SLICE], face[:, :3].flatten())
+    np.testing.assert_array_equal(out[RIGHT_HAND_SLICE], right[:, :3].flatten())
+    np.testing.assert_array_equal(out[LEFT_HAND_SLICE], 0)
+
+# Test that landmarks with different fields set still extract correctly
+def test_extract_landmarks_missing_fields():
+    hand = make_landmarks(np.full((21, 4), 0.5))
+    hand.landmark[3].ClearField('z')
+    results = SimpleNamespace(pose_landmarks=None, face_landmarks=None, right_hand_landmarks=None, left_hand_landmarks=hand)
+
+    keypoints = extract_landmarks(results)
+
+    assert keypoints.dtype == np.float32
+    assert keypoints[LEFT_HAND_SLICE][3 * 3 + 2] == 0
+    assert keypoints[LEFT_HAND_SLICE].sum() == 0.5 * (21 * 3 - 1)
+
+# Test that extracting with a reduced schema gives the same values as projecting the full vector
+@pytest.mark.parametrize('schema', [HANDS_POSE, HANDS_POSE_LIPS])
+def test_extract_landmarks_schema(schema):
+    rng = np.random.default_rng(1)
+    results = SimpleNamespace(
+        pose_landmarks=make_landmarks(rng.random((33, 4), dtype=np.float32), with_visibility=True),
+        face_landmarks=make_landmarks(rng.random((468, 4), dtype=np.float32)),
+        right_hand_landmarks=None,
+        left_hand_landmarks=make_landmarks(rng.random((21, 4), dtype=np.float32)),
+    )
+
+    full = extract_landmarks(results)
+    reduced = extract_landmarks(results, schema=schema)
+
+    assert reduced.shape == (schema.size,)
+    np.testing.assert_array_equal(reduced, schema.project(full))
+    np.testing.assert_array_equal(schema.project(full[np.newaxis, np.newaxis]), reduced[np.newaxis, np.newaxis])
+
+# Test that the schema is saved and loaded, and that folders without one are the full schema
+def test_schema_save_and_load(tmp_path):
+    assert load_schema(tmp_path) == FULL
+
+    HANDS_POSE_LIPS.save(tmp_path)
+    schema = load_schema(tmp_path)
+
+    assert schema == HANDS_POSE_LIPS
+    assert schema.size == 33 * 4 + 40 * 3 + 2 * 21 * 3
+    assert FULL.size == 1662
+
+# Test that a schema file with a size that doesn't match is rejected
+def test_schema_size_mismatch():
+    data = HANDS_POSE.to_dict()
+    data['size'] = 100
+
+    with pytest.raises(ValueError):
+        FeatureSchema.from_dict(data)
+
+# Stand-in for cv2.VideoCapture that records which frames were decoded
+class FakeCapture:
+    def __init__(self, num_frames, fps):
+        self.num_frames = num_frames
+        self.fps = fps
+        self.position = -1
+        self.retrieved = []
+
+    def get(self, prop):
+        return self.fps
+
+    def set(self, prop, value):
+        self.position = value - 1
+
+    def grab(self):
+        self.position += 1
+        return self.position < self.num_frames
+
+    def retrieve(self):
+        self.retrieved.append(self.position)
+        return True, self.position
+
+# Test that a 60 fps video is resampled to 30 fps and skipped frames are never retrieved
+def test_sample_frames_halves_60fps():
+    capture = FakeCapture(12, 60)
+
+    frames = list(sample_frames(capture, target_fps=30, skip=2))
+
+    assert frames == [4, 6, 8, 10]
+    assert capture.retrieved == frames
+
+# Test that videos at or below the target rate keep every frame
+@pytest.mark.parametrize('fps', [30, 24, 0])
+def test_sample_frames_keeps_low_fps(fps):
+    capture = FakeCapture(6, fps)
+
+    assert list(sample_frames(capture, target_fps=30)) == [0, 1, 2, 3, 4, 5]
+
+# Test that seeking to sampled frames and reading segments gives the same frames as one pass
+def test_sample_frames_segments_match_full_pass():
+    full = list(sample_frames(FakeCapture(100, 50), target_fps=30, skip=5))
+    numbers = sampled_frame_numbers(100, 30 / 50)
+    assert list(numbers[5:]) == full
+
+    first = list(sample_frames(FakeCapture(100, 50), target_fps=30, skip=5, count=20))
+    second = list(sample_frames(FakeCapture(100, 50), target_fps=30, start=numbers[25], count=20))
+    rest = list(sample_frames(FakeCapture(100, 50), target_fps=30, start=numbers[45]))
+    assert first + second + rest == full
+
+# Test that rotation and color conversion match rotating and converting the full frame
+def test_frame_preprocessor_rotate_rgb():
+    frame = np.random.default_rng(0).integers(0, 255, (72, 128, 3), dtype=np.uint8)
+    preprocess = FramePreprocessor(rotate=True)
+
+    result = preprocess.process(frame)
+
+    assert result.shape == (128, 72, 3)
+    np.testing.assert_array_equal(result, cv2.cvtColor(cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE), cv2.COLOR_BGR2RGB))
+    # The same buffer is reused for the next frame
+    assert preprocess.process(frame) is result
+
+# Test scaling down to a maximum side and cropping landscape frames to portrait mode
+def test_frame_preprocessor_sizes():
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    # Mark the center column so the crop can be checked
+    frame[:, 638:642] = 255
+
+    assert FramePreprocessor(max_side=640).process(frame).shape == (360, 640, 3)
+    assert FramePreprocessor(max_side=640, rotate=True).process(frame).shape == (640, 360, 3)
+
+    portrait = FramePreprocessor(size=(720, 1280), rgb=False).process(frame)
+    assert portrait.shape == (1280, 720, 3)
+    assert portrait[640, 360].min() == 255
+    assert portrait[640, 0].max() == 0
+
+# Test that frames can be written into a caller's buffer, e.g. a shared memory slot
+def test_frame_preprocessor_out():
+    frame = np.random.default_rng(0).integers(0, 255, (72, 128, 3), dtype=np.uint8)
+    preprocess = FramePreprocessor(max_side=64, rotate=True)
+    out = np.empty(preprocess.output_shape(frame.shape), dtype=np.uint8)
+
+    result = preprocess.process(frame, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, FramePreprocessor(max_side=64, rotate=True).process(frame))
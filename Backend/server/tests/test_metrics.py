@@ -0,0 +1,45 @@
+import sys
+import os
+import pytest
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from metrics import Registry
+
+# Test that histograms render cumulative buckets in the Prometheus text format
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, stage='decode')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP latency_seconds Latency', '# TYPE latency_seconds histogram']
+    assert lines[2:] == [
+        'latency_seconds_bucket{stage="decode",le="0.1"} 1',
+        'latency_seconds_bucket{stage="decode",le="1"} 3',
+        'latency_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'latency_seconds_sum{stage="decode"} 4.05',
+        'latency_seconds_count{stage="decode"} 4',
+    ]
+    assert histogram.get(stage='decode') == (4, pytest.approx(4.05))
+
+# Test counters, gauges, label escaping and label checks
+def test_counter_gauge_render():
+    registry = Registry()
+    counter = registry.counter('requests_total', 'Requests', ('path',))
+    gauge = registry.gauge('in_flight', 'In flight')
+    counter.inc(path='/a"b')
+    counter.inc(2, path='/a"b')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    text = registry.render()
+    assert 'requests_total{path="/a\\"b"} 3' in text
+    assert 'in_flight 1' in text
+    with pytest.raises(ValueError):
+        counter.inc(method='GET')
+    with pytest.raises(ValueError):
+        counter.inc(-1, path='/')
@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+import pytest
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(root_path)
+
+from data.schema import HANDS_POSE
+from src import pipeline
+from src.pipeline import extract_keypoints_pipelined
+from src.segments import plan_segments, predict_segments
+from src.stages import StageRecorder, stage, timed_iter
+from src.Video_to_Text import extract_keypoints
+
+# Test that the multi-process pipeline returns the same keypoints, in order, as the single process loop
+def test_pipelined_matches_serial(tmp_path):
+    video = str(tmp_path / 'clip.mp4')
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+    for i in range(50):
+        frame = np.full((120, 160, 3), i * 4, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+
+    expected = extract_keypoints(video, HANDS_POSE)
+    keypoints = extract_keypoints_pipelined(video, HANDS_POSE, workers=2)
+
+    assert keypoints.shape == expected.shape == (45, HANDS_POSE.size)
+    np.testing.assert_allclose(keypoints, expected)
+
+# Test that a worker with no frames to do finishing early is not taken for a crash, the liveness is
+# checked after every poll
+def test_pipelined_short_clip(tmp_path, monkeypatch):
+    video = str(tmp_path / 'clip.mp4')
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+    for i in range(35):
+        writer.write(np.full((120, 160, 3), i * 4, dtype=np.uint8))
+    writer.release()
+    monkeypatch.setattr(pipeline, 'POLL_TIMEOUT', 0.01)
+
+    # 30 frames are one chunk, all of it goes to the first worker
+    keypoints = extract_keypoints_pipelined(video, HANDS_POSE, workers=2)
+    assert keypoints.shape == (30, HANDS_POSE.size)
+
+# Test that a decoder or MediaPipe process killed mid-run is an error instead of a hang
+@pytest.mark.parametrize('victim', ['pipeline-decoder', 'pipeline-mediapipe-0'])
+def test_pipelined_process_killed(tmp_path, victim):
+    video = str(tmp_path / 'clip.mp4')
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+    for i in range(200):
+        writer.write(np.full((120, 160, 3), i % 64 * 4, dtype=np.uint8))
+    writer.release()
+
+    # Two ring slots keep the decoder waiting on the worker, so both are alive when one is killed
+    errors = []
+    def run():
+        try:
+            extract_keypoints_pipelined(video, HANDS_POSE, workers=1, slots=2)
+        except RuntimeError as e:
+            errors.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        process = next((p for p in multiprocessing.active_children() if p.name == victim), None)
+        if process is not None and process.is_alive():
+            process.kill()
+            break
+        time.sleep(0.05)
+    thread.join(60)
+
+    assert not thread.is_alive()
+    assert len(errors) == 1 and 'exited unexpectedly' in str(errors[0])
+
+# Test that segments cover every window exactly once and short clips are not split
+def test_plan_segments():
+    segments = plan_segments(1000, workers=4, min_frames=100)
+    assert len(segments) == 4
+    assert segments[0][0] == 0 and segments[-1][1] == 1000 - 29
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+
+    assert len(plan_segments(200, workers=8, min_frames=100)) == 1
+    assert plan_segments(20, workers=4) == []
+
+# Test that segment probabilities are stitched back in window order
+def test_predict_segments_matches_serial(tmp_path):
+    video = str(tmp_path / 'clip.mp4')
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+    for i in range(100):
+        writer.write(np.full((120, 160, 3), i * 2, dtype=np.uint8))
+    writer.release()
+
+    # Window probabilities only depend on the keypoints, so a short stand-in for the model is enough
+    def predict(keypoints):
+        if len(keypoints) < 30:
+            return np.zeros((0, 1), dtype=np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(keypoints, 30, axis=0)
+        return windows.sum(axis=(1, 2))[:, None]
+
+    expected = predict(extract_keypoints(video, HANDS_POSE))
+    probabilities = predict_segments(video, HANDS_POSE, predict, workers=3, min_frames=20)
+
+    assert probabilities.shape == expected.shape == (95 - 29, 1)
+    np.testing.assert_allclose(probabilities, expected)
+
+# Test that stages are only recorded inside a recorder and that iteration time is counted per item
+def test_stage_recorder():
+    with stage('ignored'):
+        pass
+    assert list(timed_iter('ignored', range(3))) == [0, 1, 2]
+
+    with StageRecorder(allocations=True) as recorder:
+        for i in timed_iter('produce', range(3)):
+            with stage('work'):
+                np.ones(100000)
+    report = recorder.report()
+
+    assert list(report) == ['produce', 'work']
+    # The last call of produce is the one that finds the end
+    assert report['produce']['calls'] == 4
+    assert report['work']['calls'] == 3
+    assert report['work']['peak_bytes'] >= 800000
+    with stage('after'):
+        pass
+    assert 'after' not in recorder.report()
+
+# Test that a traced recording gives one Chrome trace span per stage call
+def test_stage_recorder_trace():
+    with StageRecorder(trace=True) as recorder:
+        for i in timed_iter('decode', range(2)):
+            with stage('work'):
+                pass
+    trace = recorder.chrome_trace('clip.mp4')
+
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert spans[0]['name'] == 'clip.mp4'
+    assert [span['name'] for span in spans[1:]] == ['decode', 'work', 'decode', 'work', 'decode']
+    assert [span['args']['call'] for span in spans[1:]] == [0, 0, 1, 1, 2]
+    # Spans fit inside the recording and do not overlap
+    ends = [span['ts'] + span['dur'] for span in spans[1:]]
+    assert all(end <= start for end, start in zip(ends, [span['ts'] for span in spans[2:]]))
+    assert ends[-1] <= spans[0]['dur']
+    assert trace['otherData']['stages']['work']['calls'] == 2
+
+    # Untraced recordings keep no calls
+    with StageRecorder() as recorder:
+        with stage('work'):
+            pass
+    assert recorder.events is None
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+preprocessing_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "PreProcessing"))
+sys.path.append(preprocessing_path)
+
+from download import STATE_FILE
+from main import download_and_trim_videos, ffmpeg_exe, plan_sources, process_source
+
+def has_ffmpeg():
+    return os.path.exists(ffmpeg_exe()) or shutil.which(ffmpeg_exe()) is not None
+
+# Test that items of the same source are grouped even when they are not next to each other
+def test_plan_sources():
+    data = [
+        {'clean_text': 'beer', 'url': 'www.youtube.com/watch?v=a', 'file': 'a', 'start_time': 2.0, 'end_time': 3.0},
+        {'clean_text': 'key', 'url': 'www.youtube.com/watch?v=b', 'file': 'b', 'start_time': 0.0, 'end_time': 1.0},
+        {'clean_text': 'bad', 'url': 'https://www.youtube.com/watch?v=a', 'file': 'a', 'start_time': 0.0, 'end_time': 1.0},
+        {'clean_text': 'enjoy', 'url': 'www.youtube.com/watch?v=a', 'file': 'a', 'start_time': 1.0, 'end_time': 1.0},
+    ]
+
+    sources = plan_sources(data)
+
+    assert [source['file'] for source in sources] == ['a', 'b']
+    assert sources[0]['segments'] == [(2, 'bad', 0.0, 1.0), (0, 'beer', 2.0, 3.0)]
+
+# Test cutting a local source: stream copy on a keyframe, re-encode otherwise, no download and a re-run skips
+@pytest.mark.skipif(not has_ffmpeg(), reason='ffmpeg not available')
+def test_process_source_offline(tmp_path):
+    subprocess.run([ffmpeg_exe(), '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=30:duration=4',
+                    '-c:v', 'libx264', '-g', '30', '-pix_fmt', 'yuv420p', str(tmp_path / 'a_full.mp4')], check=True)
+    source = {'url': 'https://www.youtube.com/watch?v=a', 'file': 'a', 'segments': [(0, 'beer', 1.0, 2.0), (3, 'bad', 1.5, 2.5)]}
+
+    def no_download(*args):
+        raise AssertionError('source should not be downloaded')
+
+    url, counts = process_source(source, str(tmp_path), trim=True, download=no_download)
+
+    assert counts == {'copy': 1, 'encode': 1, 'skipped': 0, 'failed': 0}
+    assert (tmp_path / 'beer' / 'beer_0.mp4').exists() and (tmp_path / 'bad' / 'bad_3.mp4').exists()
+    assert not (tmp_path / 'a_full.mp4').exists()
+
+    url, counts = process_source(source, str(tmp_path), trim=True, download=no_download)
+    assert counts['skipped'] == 2
+
+# Local stand-in for the video host, counts requests per path. files maps paths to real videos
+class VideoHandler(BaseHTTPRequestHandler):
+    hits = {}
+    files = {}
+
+    def do_GET(self):
+        hits = VideoHandler.hits
+        hits[self.path] = hits.get(self.path, 0) + 1
+        if self.path in VideoHandler.files:
+            body = VideoHandler.files[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/private.mp4':
+            self.send_error(403)
+        elif self.path == '/gone.mp4':
+            self.send_error(404)
+        elif self.path == '/flaky.mp4' and hits[self.path] == 1:
+            self.send_error(503)
+        else:
+            body = self.path.encode() * 100
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def video_server():
+    VideoHandler.hits = {}
+    VideoHandler.files = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), VideoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+# Test downloads with retries, the state file, and that a re-run does not request anything again
+def test_download_state(tmp_path, video_server):
+    names = ['ok', 'flaky', 'private', 'gone']
+    data = [{'clean_text': name, 'url': f'{video_server}/{name}.mp4', 'file': name, 'start_time': 0.0, 'end_time': 1.0}
+            for name in names]
+    json_path = tmp_path / 'msasl.json'
+    json_path.write_text(json.dumps(data))
+    output_folder = tmp_path / 'videos'
+
+    totals = download_and_trim_videos(str(json_path), str(output_folder), trim=False, workers=1, download_workers=2)
+
+    assert totals['unavailable'] == 2 and totals['failed'] == 0
+    assert (output_folder / 'ok_full.mp4').read_bytes() == b'/ok.mp4' * 100
+    assert (output_folder / 'flaky_full.mp4').read_bytes() == b'/flaky.mp4' * 100
+    assert VideoHandler.hits['/flaky.mp4'] == 2
+    state = json.loads((output_folder / STATE_FILE).read_text())
+    assert [state[f'{video_server}/{name}.mp4'] for name in names] == ['done', 'done', 'private', 'unavailable']
+
+    hits = dict(VideoHandler.hits)
+    totals = download_and_trim_videos(str(json_path), str(output_folder), trim=False, workers=1, download_workers=2)
+    assert VideoHandler.hits == hits
+    assert totals['skipped'] == 2 and totals['unavailable'] == 2
+
+# Serve a 4 second test video as /a.mp4 and describe len(times) segments of it
+def serve_test_video(tmp_path, video_server, times):
+    subprocess.run([ffmpeg_exe(), '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=30:duration=4',
+                    '-c:v', 'libx264', '-g', '30', '-pix_fmt', 'yuv420p', str(tmp_path / 'a.mp4')], check=True)
+    VideoHandler.files['/a.mp4'] = (tmp_path / 'a.mp4').read_bytes()
+    data = [{'clean_text': f'sign{i}', 'url': f'{video_server}/a.mp4', 'file': 'a', 'start_time': start, 'end_time': start + 1}
+            for i, start in enumerate(times)]
+    json_path = tmp_path / 'msasl.json'
+    json_path.write_text(json.dumps(data))
+    return str(json_path)
+
+# Test that a download-only run does not keep a later run from cutting the segments
+@pytest.mark.skipif(not has_ffmpeg(), reason='ffmpeg not available')
+def test_download_then_trim(tmp_path, video_server):
+    json_path = serve_test_video(tmp_path, video_server, [1.0, 1.5])
+    output_folder = tmp_path / 'videos'
+
+    download_and_trim_videos(json_path, str(output_folder), trim=False, workers=1, download_workers=1)
+    assert (output_folder / 'a_full.mp4').exists()
+
+    totals = download_and_trim_videos(json_path, str(output_folder), trim=True, workers=1, download_workers=1)
+    assert totals['copy'] + totals['encode'] == 2 and totals['failed'] == 0
+    assert (output_folder / 'sign0' / 'sign0_0.mp4').exists() and (output_folder / 'sign1' / 'sign1_1.mp4').exists()
+    # The full video from the first run was used, not downloaded again
+    assert VideoHandler.hits['/a.mp4'] == 1
+
+# Test that a later index range cuts the new segments of a source an earlier range finished
+@pytest.mark.skipif(not has_ffmpeg(), reason='ffmpeg not available')
+def test_overlapping_ranges(tmp_path, video_server):
+    json_path = serve_test_video(tmp_path, video_server, [1.0, 1.5, 2.0])
+    output_folder = tmp_path / 'videos'
+
+    totals = download_and_trim_videos(json_path, str(output_folder), start_index=0, end_index=2, workers=1, download_workers=1)
+    assert totals['copy'] + totals['encode'] == 2
+    assert not (output_folder / 'a_full.mp4').exists()
+
+    totals = download_and_trim_videos(json_path, str(output_folder), start_index=1, end_index=3, workers=1, download_workers=1)
+    assert totals['skipped'] == 1 and totals['copy'] + totals['encode'] == 1 and totals['failed'] == 0
+    assert (output_folder / 'sign2' / 'sign2_2.mp4').exists()
+    # The full video was deleted after the first range, so it is downloaded again
+    assert VideoHandler.hits['/a.mp4'] == 2
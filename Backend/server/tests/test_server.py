@@ -1,19 +1,28 @@
 import io
 import sys
 import os
+import threading
 import pytest
 from unittest.mock import patch
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(root_path)
 
-from server import app
+from server import UPLOAD_FOLDER, app, jobs
 
 @pytest.fixture
 def client():
     with app.test_client() as client:
         yield client
 
+# Remove whatever a test leaves in the upload folder
+@pytest.fixture(autouse=True)
+def clean_uploads():
+    before = set(os.listdir(UPLOAD_FOLDER))
+    yield
+    for name in set(os.listdir(UPLOAD_FOLDER)) - before:
+        os.remove(os.path.join(UPLOAD_FOLDER, name))
+
 # Test if you can successfully upload a video
 @patch('server.video_to_text')
 def test_upload_success(mock_video_to_text, client):
@@ -28,10 +37,23 @@ def test_upload_success(mock_video_to_text, client):
 
     response = client.post('/upload', data=data, content_type='multipart/form-data')
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     json_data = response.get_json()
     assert json_data['message'] == "Video uploaded successfully"
+    job_id = json_data['job_id']
+
+    # Wait for the worker to finish, then fetch the result
+    assert jobs.get(job_id).wait(5)
+    response = client.get(f'/jobs/{job_id}')
+
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['status'] == "done"
     assert json_data['result'] == "test"
+    assert json_data['run_time'] is not None
+
+    # The upload is deleted once its job has finished
+    assert not os.path.exists(jobs.get(job_id).video_path)
 
 # Test if trying to upload with no video fails
 @patch('server.video_to_text')
@@ -64,7 +86,151 @@ def test_no_filename(mock_video_to_text, client):
     json_data = response.get_json()
     assert json_data['error'] == "Empty filename"
 
+# Test that readiness reports not ready until the model is warmed up
+@patch('server.engine')
+def test_not_ready(mock_engine, client):
+    mock_engine.status.return_value = {'ready': False, 'load_time': None, 'warmup_time': None, 'error': None}
+
+    response = client.get('/ready')
+
+    assert response.status_code == 503
+    assert response.get_json()['ready'] is False
+
+# Test that readiness reports ready after warm-up
+@patch('server.engine')
+def test_ready(mock_engine, client):
+    mock_engine.status.return_value = {'ready': True, 'load_time': 1.5, 'warmup_time': 0.5, 'error': None}
+
+    response = client.get('/ready')
 
+    assert response.status_code == 200
+    assert response.get_json()['ready'] is True
+
+# Test that an unknown job id is not found
+def test_unknown_job(client):
+    response = client.get('/jobs/missing')
+
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "Job not found"
+
+# Test that a running job can be cancelled
+@patch('server.video_to_text')
+def test_cancel_job(mock_video_to_text, client):
+    started = threading.Event()
+
+    # Pretend to transcribe until cancelled
+    def slow_video_to_text(video_path, cancel_event, **kwargs):
+        started.set()
+        cancel_event.wait(5)
+        return "partial"
+    mock_video_to_text.side_effect = slow_video_to_text
+
+    data = {
+        'video': (io.BytesIO(b"test"), 'test_video.mp4')
+    }
+    job_id = client.post('/upload', data=data, content_type='multipart/form-data').get_json()['job_id']
+    assert started.wait(5)
+
+    response = client.delete(f'/jobs/{job_id}')
+    assert response.status_code == 200
 
+    assert jobs.get(job_id).wait(5)
+    json_data = client.get(f'/jobs/{job_id}').get_json()
+    assert json_data['status'] == "cancelled"
+    assert json_data['result'] is None
 
+    # Cancelling a finished job is rejected
+    assert client.delete(f'/jobs/{job_id}').status_code == 409
 
+# Test that queue statistics are reported
+def test_job_stats(client):
+    response = client.get('/jobs')
+
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['workers'] == jobs.max_workers
+    assert 'queued' in json_data
+
+# Test that a transcription shows up in the metrics
+@patch('server.video_to_text')
+def test_metrics(mock_video_to_text, client):
+    from src.stages import count, stage
+
+    # Pretend to decode 60 frames
+    def fake_video_to_text(video_path, cancel_event, **kwargs):
+        with stage('decode'):
+            count('frames', 60)
+        return "test"
+    mock_video_to_text.side_effect = fake_video_to_text
+
+    before = client.get('/metrics').get_data(as_text=True)
+    data = {
+        'video': (io.BytesIO(b"0123456789"), 'test_video.mp4')
+    }
+    job_id = client.post('/upload', data=data, content_type='multipart/form-data').get_json()['job_id']
+    assert jobs.get(job_id).wait(5)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+
+    # Value of a sample line, 0 when it is missing
+    def sample(text, name):
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.split()[-1])
+        return 0.0
+
+    assert sample(text, 'asligator_frames_processed_total') - sample(before, 'asligator_frames_processed_total') == 60
+    assert sample(text, 'asligator_upload_bytes_count') - sample(before, 'asligator_upload_bytes_count') == 1
+    assert sample(text, 'asligator_job_queue_wait_seconds_count') > sample(before, 'asligator_job_queue_wait_seconds_count')
+    assert 'asligator_stage_seconds_count{stage="decode"}' in text
+    assert 'asligator_http_requests_total{endpoint="/upload",method="POST",status="202"}' in text
+    # The scrape itself is in flight
+    assert sample(text, 'asligator_http_requests_in_flight') >= 1
+    assert 'asligator_model_load_seconds{' in text
+
+# Test that a profiled upload writes a Chrome trace and a cProfile dump, listed on /traces
+@patch('server.video_to_text')
+def test_profiled_upload(mock_video_to_text, client):
+    from src.stages import stage
+
+    def fake_video_to_text(video_path, cancel_event, **kwargs):
+        for _ in range(3):
+            with stage('mp_detect'):
+                pass
+        return "test"
+    mock_video_to_text.side_effect = fake_video_to_text
+
+    # Unknown profiling modes are rejected
+    data = {
+        'video': (io.BytesIO(b"test"), 'test_video.mp4')
+    }
+    response = client.post('/upload', data=data, content_type='multipart/form-data', headers={'X-Profile': 'all'})
+    assert response.status_code == 400
+
+    data = {
+        'video': (io.BytesIO(b"test"), 'test_video.mp4')
+    }
+    response = client.post('/upload', data=data, content_type='multipart/form-data', headers={'X-Profile': 'cprofile'})
+    assert response.status_code == 202
+    json_data = response.get_json()
+    assert jobs.get(json_data['job_id']).wait(5)
+
+    trace_path = os.path.join('uploads', os.path.basename(json_data['trace']))
+    profile_path = trace_path[:-len('.trace.json')] + '.prof'
+    try:
+        trace = client.get(json_data['trace']).get_json()
+        assert [event['name'] for event in trace['traceEvents'] if event.get('cat') == 'stage'] == ['mp_detect'] * 3
+        assert os.path.exists(profile_path)
+        # Only the trace and the profile are kept, not the upload
+        assert not os.path.exists(jobs.get(json_data['job_id']).video_path)
+
+        traces = client.get('/traces').get_json()
+        assert traces[0]['trace'] == json_data['trace']
+        assert traces[0]['cprofile'] is not None
+    finally:
+        for path in (trace_path, profile_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,113 @@
+import os
+import sys
+import numpy as np
+import keras
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(root_path)
+sys.path.append(os.path.join(root_path, 'model'))
+
+from data.augment import FACE_MIRROR_PAIRS, Augmenter
+from data.schema import FACE_FIELDS, FULL, HANDS_POSE, HANDS_POSE_LIPS
+from data.shards import ShardedDataset, write_shards
+from loader import ShardLoader, feature_stats, normalization_layer, split_indices
+
+def make_windows(num_samples):
+    # Every value of a window is its sample number, so reads can be checked
+    return [np.full((30, FULL.size), i, dtype=np.float64) for i in range(num_samples)]
+
+# Test that windows are split over fixed-size shards and read back in any order
+def test_write_and_take(tmp_path):
+    labels = np.arange(23) % 3
+    index = write_shards(iter(make_windows(23)), labels, str(tmp_path), HANDS_POSE, shard_size=10)
+
+    assert [shard['count'] for shard in index['shards']] == [10, 10, 3]
+    dataset = ShardedDataset.open(str(tmp_path))
+    assert dataset.shape == (23, 30, HANDS_POSE.size)
+    assert dataset.schema == HANDS_POSE
+    np.testing.assert_array_equal(dataset.labels, labels)
+
+    indices = [22, 3, 15, 3, 0, 10]
+    batch = dataset.take(indices)
+    assert batch.dtype == np.float32
+    np.testing.assert_array_equal(batch[:, 0, 0], indices)
+
+# Test that a split is covered exactly once per epoch and the loader works with model.fit
+def test_loader_streams_split(tmp_path):
+    labels = np.arange(40) % 2
+    write_shards(iter(make_windows(40)), labels, str(tmp_path), HANDS_POSE, shard_size=16)
+    dataset = ShardedDataset.open(str(tmp_path))
+
+    train_idx, test_idx = split_indices(labels, test_size=0.25, seed=0)
+    assert len(set(train_idx) | set(test_idx)) == 40
+    loader = ShardLoader(dataset, train_idx, num_classes=2, batch_size=8, seed=0, workers=2)
+
+    seen = []
+    for i in range(len(loader)):
+        x, y = loader[i]
+        samples = x[:, 0, 0].astype(int)
+        np.testing.assert_array_equal(np.argmax(y, axis=1), labels[samples])
+        seen.extend(samples)
+    assert sorted(seen) == sorted(train_idx)
+    first_order = loader.order.copy()
+    loader.on_epoch_end()
+    assert not np.array_equal(first_order, loader.order)
+
+    model = keras.Sequential([keras.Input((30, HANDS_POSE.size)), keras.layers.LSTM(4), keras.layers.Dense(2, activation='softmax')])
+    model.compile(optimizer='adam', loss='categorical_crossentropy')
+    history = model.fit(loader, epochs=2, verbose=0)
+    assert len(history.history['loss']) == 2
+
+# Test that mirroring swaps the hands, twice gives the batch back, and missing landmarks stay zeros
+def test_augment_mirror():
+    rng = np.random.default_rng(0)
+    for schema in (HANDS_POSE, HANDS_POSE_LIPS, FULL):
+        x = rng.random((4, 30, schema.size), dtype=np.float32)
+        x[:, ::2, schema.left_hand_slice] = 0
+        mirror = Augmenter(schema, mirror=1.0, jitter=0, scale=0, shift=0, speed=0, frame_dropout=0)
+        assert mirror.mirror == 1.0
+
+        mirrored = mirror(x, rng)
+        assert mirrored.shape == x.shape and mirrored.dtype == np.float32
+        np.testing.assert_allclose(mirrored[..., schema.left_hand_slice][..., 0::3], 1 - x[..., schema.right_hand_slice][..., 0::3], atol=1e-6)
+        assert not mirrored[:, ::2, schema.right_hand_slice].any()
+        np.testing.assert_allclose(mirror(mirrored, rng), x, atol=1e-6)
+
+        # A face and its mirror image: each twin is where the other would be in the flipped image,
+        # points on the midline sit on it, so mirroring gives the same face back
+        if schema.face_landmarks:
+            face = x[..., schema.face_slice].reshape(4, 30, -1, FACE_FIELDS)
+            positions = {landmark: i for i, landmark in enumerate(schema.face_landmarks)}
+            twins = dict(FACE_MIRROR_PAIRS + [(b, a) for a, b in FACE_MIRROR_PAIRS])
+            for landmark, i in positions.items():
+                twin = twins.get(landmark)
+                if twin is None:
+                    face[..., i, 0] = 0.5
+                elif landmark < twin:
+                    face[..., positions[twin], :] = face[..., i, :]
+                    face[..., positions[twin], 0] = 1 - face[..., i, 0]
+            x[..., schema.face_slice] = face.reshape(4, 30, -1)
+            np.testing.assert_allclose(mirror(x, rng)[..., schema.face_slice], x[..., schema.face_slice], atol=1e-6)
+
+        augmented = Augmenter(schema, mirror=0, speed=0)(x, rng)
+        assert not augmented[:, ::2, schema.left_hand_slice].any()
+
+# Test that the streamed statistics match numpy and that the layer normalizes inside a saved model
+def test_feature_stats_normalization(tmp_path):
+    rng = np.random.default_rng(0)
+    windows = [rng.normal(i % 5, 2, (30, HANDS_POSE.size)) for i in range(23)]
+    write_shards(iter(windows), np.arange(23) % 3, str(tmp_path), HANDS_POSE, shard_size=10)
+    dataset = ShardedDataset.open(str(tmp_path))
+
+    indices = np.arange(1, 23, 2)
+    mean, variance = feature_stats(dataset, indices, batch_size=4)
+    x = dataset.take(indices).reshape(-1, HANDS_POSE.size).astype(np.float64)
+    np.testing.assert_allclose(mean, x.mean(axis=0), atol=1e-9)
+    np.testing.assert_allclose(variance, x.var(axis=0), atol=1e-9)
+
+    model = keras.Sequential([keras.Input((30, HANDS_POSE.size)), normalization_layer(mean, variance)])
+    model.save(str(tmp_path / 'model.keras'))
+    loaded = keras.models.load_model(str(tmp_path / 'model.keras'))
+    out = np.asarray(loaded.predict_on_batch(dataset.take(indices))).reshape(-1, HANDS_POSE.size)
+    np.testing.assert_allclose(out.mean(axis=0), 0, atol=1e-4)
+    np.testing.assert_allclose(out.std(axis=0), 1, atol=1e-3)
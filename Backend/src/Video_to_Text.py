@@ -1,32 +1,21 @@
 import cv2
-import json
 import os
 import sys
+from collections import deque
 import mediapipe as mp
 import numpy as np
-from keras.api.models import load_model
 from pymediainfo import MediaInfo
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(root_path)
 
-from data.helper import draw_landmarks, extract_landmarks, mp_detect
+from data.frames import MP_MAX_SIDE, TARGET_FPS, FramePreprocessor, sample_frames, sample_ratio
+from data.helper import KeypointWindow, draw_landmarks, extract_landmarks, mp_detect
+from src.engine import WINDOW_SHAPE, get_engine, make_live_predictor, predict_windows, smooth_predictions
 from src.glossing import gloss
-
-def load_trained_model():
-    # Load pre-trained model
-    model_path = os.path.join(os.getcwd(), '..', 'model', 'model.keras')
-    model = load_model(model_path)
-
-    model_weight = os.path.join(os.getcwd(), '..', 'model', 'model.weights.h5')
-    model.load_weights(model_weight)
-
-    # Load action label mapping
-    with open(os.path.join(os.getcwd(), '..', 'data', 'Processed_test_dataset', 'sign_mapping.json')) as f:
-        sign_mapping = json.load(f)
-    actions = list(sign_mapping)
-
-    return model, actions
+from src.pipeline import extract_keypoints_pipelined
+from src.segments import predict_segments
+from src.stages import count, stage, timed_iter
 
 # Helper: Draw probability bars
 def prob_viz(res, actions, input_frame, colors):
@@ -46,7 +35,90 @@ def check_rotation(filename):
                 return True
     return False
 
-def video_to_text(video):
+# Read the video and return the keypoints of every resampled frame as a (frames, schema.size) float32 array
+def extract_keypoints(video, schema, cancel_event=None, target_fps=TARGET_FPS, mp_max_side=MP_MAX_SIDE):
+    # Mediapipe holistic setup
+    mp_holistic = mp.solutions.holistic
+
+    # Open the video sent by the frontend
+    webcam = cv2.VideoCapture(video)
+
+    # Sized from the frame count in the container, which is only grown if the count was wrong
+    expected_frames = int(webcam.get(cv2.CAP_PROP_FRAME_COUNT) * sample_ratio(webcam, target_fps)) + 1
+    keypoints = np.empty((max(expected_frames, 30), schema.size), dtype=np.float32)
+    num_keypoints = 0
+
+    # Mobile device videos will have a rotation value attached to the metadata, rotate them
+    # 90 degrees clockwise while scaling down to the MediaPipe input size and converting to RGB
+    with stage('probe'):
+        rotation_value = check_rotation(video)
+    preprocess = FramePreprocessor(max_side=mp_max_side, rotate=rotation_value)
+
+    with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+        # Resample to the frame rate the model was trained on and skip the first few frames,
+        # might be the user setting up
+        # Stages are timed when a benchmark records them, see stages.py
+        for frame in timed_iter('decode', sample_frames(webcam, target_fps, skip=5)):
+            # Stop early if the caller cancelled the transcription
+            if cancel_event is not None and cancel_event.is_set():
+                break
+
+            # Process frame, the RGB image is not needed afterwards so skip converting it back
+            with stage('preprocess'):
+                image = preprocess.process(frame)
+            with stage('mp_detect'):
+                _, results = mp_detect(image, holistic, to_bgr=False, is_rgb=True)
+
+            # Extract keypoints straight into the next row
+            with stage('extract_landmarks'):
+                if num_keypoints == len(keypoints):
+                    keypoints = np.concatenate([keypoints, np.empty_like(keypoints)])
+                extract_landmarks(results, out=keypoints[num_keypoints], schema=schema)
+            num_keypoints += 1
+
+    webcam.release()
+    return keypoints[:num_keypoints]
+
+# Headless transcription used by the server, no drawing and no windows.
+# With workers > 1 decoding and MediaPipe run in separate processes, see pipeline.py. With
+# segment_workers > 1 long videos are split into time segments processed side by side, see segments.py.
+# backend picks what runs the classifier, e.g. 'tflite-int8' (see backends.py), None is the default engine
+def video_to_text(video, cancel_event=None, return_probabilities=False, target_fps=TARGET_FPS, mp_max_side=MP_MAX_SIDE,
+                  workers=1, segment_workers=1, backend=None):
+    # Get the trained model and each action, loaded once per process
+    engine = get_engine(backend)
+    with stage('load_model'):
+        model, actions = engine.get()
+    schema = engine.schema
+
+    # Score every 30 frame window in batches, then smooth into a sentence
+    # Stages inside the worker processes are not recorded, the parallel paths are timed as one stage
+    if segment_workers > 1:
+        with stage('segments'):
+            probabilities = predict_segments(video, schema, lambda keypoints: predict_windows(model, keypoints),
+                                             check_rotation(video), segment_workers, cancel_event, target_fps, mp_max_side)
+        # n windows cover n + 29 frames, the same as the serial path
+        count('frames', len(probabilities) + WINDOW_SHAPE[0] - 1 if len(probabilities) else 0)
+    else:
+        if workers > 1:
+            with stage('pipeline'):
+                keypoints = extract_keypoints_pipelined(video, schema, check_rotation(video), workers, cancel_event,
+                                                        target_fps, mp_max_side)
+        else:
+            keypoints = extract_keypoints(video, schema, cancel_event, target_fps, mp_max_side)
+        count('frames', len(keypoints))
+        with stage('predict'):
+            probabilities = predict_windows(model, keypoints)
+    with stage('smooth'):
+        signs = smooth_predictions(probabilities, actions)
+    with stage('gloss'):
+        sentence = gloss(signs)
+    if return_probabilities:
+        return sentence, probabilities
+    return sentence
+
+# Interactive viewer for demos, draws landmarks and probabilities in a window
+def view_video_to_text(video, target_fps=TARGET_FPS, backend=None):
     # Visualization colors
     colors = [
         (245, 117, 16), (117, 245, 16), (16, 117, 245),
@@ -54,81 +126,61 @@ def video_to_text(video):
         (50, 100, 245), (180, 117, 26), (216, 0, 245), (100, 50, 245)
     ]
 
-    # Path to video from front end
-    FRONTEND_VIDEO = video
-
     # Mediapipe holistic setup
     mp_holistic = mp.solutions.holistic
     mp_drawings = mp.solutions.drawing_utils
-    mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-    # Load up tained model and each action
-    model, actions = load_trained_model()
-
-    # Webcam setup
-    webcam = cv2.VideoCapture(FRONTEND_VIDEO)
-
-    # Set resolution (width x height), Should be the resolution of the mp4 sent by mobile device
-    width = 1280
-    height = 720
-    webcam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-    webcam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-    
-    # Constants
-    sequence, sentence, predictions = [], [], []
-    threshold = 0.5
-    zoom_out_factor = 0.6  
 
-    # Mobile device videos will have a rotation value attached to the metadata
-    rotation_value = check_rotation(video)
+    # Get the trained model and each action, loaded once per process
+    engine = get_engine(backend)
+    model, actions = engine.get()
+    schema = engine.schema
+    predict = make_live_predictor(model)
 
-    with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
-        frame_count = 0
-        while webcam.isOpened():
-            ret, frame = webcam.read()
-            if not ret:
-                break
+    # Open the video
+    webcam = cv2.VideoCapture(video)
 
-            frame_count += 1
+    # Last 30 frames of keypoints and the last 10 predictions
+    sequence = KeypointWindow(30, schema.size)
+    predictions = deque(maxlen=10)
+    sentence = []
+    threshold = 0.5
+    zoom_out_factor = 0.6
 
-            # Skip the first few frames, might be the user setting up 
-            if frame_count <= 5:
-                continue
-            
-            # Check if rotation is applied 
-            if rotation_value:
-                # Rotate 90 degrees clockwise
-                frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+    # Mobile device videos will have a rotation value attached to the metadata, rotate them 90 degrees clockwise
+    rotation_value = check_rotation(video)
+    preprocess = FramePreprocessor(rotate=rotation_value, rgb=False)
 
+    with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+        # Resample to the frame rate the model was trained on and skip the first few frames
+        for frame in sample_frames(webcam, target_fps, skip=5):
             # Process frame
-            image, results = mp_detect(frame, holistic)
+            image, results = mp_detect(preprocess.process(frame), holistic)
             draw_landmarks(image, results, mp_holistic, mp_drawings)
 
-            # Extract keypoints
-            keypoints = extract_landmarks(results)
-            sequence.append(keypoints)
-            sequence = sequence[-30:]
-            
+            # Extract keypoints straight into the window
+            extract_landmarks(results, out=sequence.next_frame(), schema=schema)
+            sequence.advance()
+
             # Zoom out video to fit screen
             image = cv2.resize(image, None, fx=zoom_out_factor, fy=zoom_out_factor, interpolation=cv2.INTER_LINEAR)
-            
+
             # Prediction logic
-            if len(sequence) == 30:
-                res = model.predict(np.expand_dims(sequence, axis=0))[0]
+            if sequence.full:
+                res = predict(sequence.view())
                 pred_index = np.argmax(res)
                 predictions.append(pred_index)
 
                 # Smoothing, make sure last 10 predictions all match and that the prediction % is past the threshhold
-                if np.unique(predictions[-10:])[0] == pred_index and res[pred_index] > threshold:
+                if np.unique(predictions)[0] == pred_index and res[pred_index] > threshold:
                     if not sentence or actions[pred_index] != sentence[-1]:
                         sentence.append(actions[pred_index])
 
                 image = prob_viz(res, actions, image, colors)
 
             cv2.rectangle(image, (0,0), (1280, 40), (245, 117, 16), -1)
-            cv2.putText(image, ' '.join(sentence), (3,30), 
+            cv2.putText(image, ' '.join(sentence), (3,30),
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-            
+
             # Show window
             cv2.imshow('Hand Tracking', image)
 
@@ -141,4 +193,8 @@ def video_to_text(video):
     webcam.release()
     cv2.destroyAllWindows()
     sentence = gloss(sentence)
-    return sentence
\ No newline at end of file
+    return sentence
+
+if __name__ == '__main__':
+    # Opt-in viewer: python Video_to_Text.py <video>
+    print(view_video_to_text(sys.argv[1]))
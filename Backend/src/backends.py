@@ -0,0 +1,95 @@
+import os
+import threading
+import numpy as np
+import tensorflow as tf
+from keras.api.models import load_model
+
+# Backends the classifier can run on and the file each one loads from the model folder. The TFLite and
+# ONNX files are written by model/export.py
+MODEL_FILES = {
+    'keras': 'model.keras',
+    'tflite-fp16': 'model_fp16.tflite',
+    'tflite-int8': 'model_int8.tflite',
+    'onnx': 'model.onnx',
+}
+
+# Every backend looks like the part of a Keras model the engine uses: input_shape, output_shape and
+# predict_on_batch(windows) returning (windows, actions) float32 probabilities
+
+# TFLite interpreter. The model is exported with a fixed batch (XNNPACK cannot resize the fused LSTM),
+# larger batches are run a slice at a time. An interpreter is not thread safe, each thread gets its own.
+# xnnpack=False runs the builtin float32 kernels instead of the XNNPACK delegate
+class TFLiteBackend:
+    def __init__(self, path, num_threads=None, xnnpack=True):
+        with open(path, 'rb') as f:
+            self.content = f.read()
+        self.num_threads = num_threads
+        self.op_resolver = (tf.lite.experimental.OpResolverType.AUTO if xnnpack
+                            else tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+        self._local = threading.local()
+
+        interpreter = self._interpreter()
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.batch = int(input_details['shape'][0])
+        self.input_shape = (None,) + tuple(int(d) for d in input_details['shape'][1:])
+        self.output_shape = (None,) + tuple(int(d) for d in output_details['shape'][1:])
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None:
+            interpreter = tf.lite.Interpreter(model_content=self.content, num_threads=self.num_threads,
+                                              experimental_op_resolver_type=self.op_resolver)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+        return interpreter
+
+    def predict_on_batch(self, windows):
+        windows = np.asarray(windows, dtype=np.float32)
+        interpreter = self._interpreter()
+        input_index = interpreter.get_input_details()[0]['index']
+        output_index = interpreter.get_output_details()[0]['index']
+        results = np.empty((len(windows), self.output_shape[-1]), dtype=np.float32)
+        for start in range(0, len(windows), self.batch):
+            chunk = windows[start:start + self.batch]
+            # The last slice is padded up to the exported batch
+            if len(chunk) < self.batch:
+                chunk = np.concatenate([chunk, np.zeros((self.batch - len(chunk),) + chunk.shape[1:], dtype=np.float32)])
+            interpreter.set_tensor(input_index, chunk)
+            interpreter.invoke()
+            results[start:start + self.batch] = interpreter.get_tensor(output_index)[:len(windows) - start]
+        return results
+
+# ONNX Runtime session on the CPU, sessions can be shared between threads
+class OnnxBackend:
+    def __init__(self, path, num_threads=None):
+        # Only needed for ONNX models
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = (None,) + tuple(model_input.shape[1:])
+        self.output_shape = (None,) + tuple(self.session.get_outputs()[0].shape[1:])
+
+    def predict_on_batch(self, windows):
+        return self.session.run(None, {self.input_name: np.asarray(windows, dtype=np.float32)})[0]
+
+# Load the classifier of model_dir on the given backend
+def load_backend(backend, model_dir, num_threads=None):
+    if backend not in MODEL_FILES:
+        raise ValueError(f'Unknown backend {backend}, expected one of {", ".join(MODEL_FILES)}')
+    path = os.path.join(model_dir, MODEL_FILES[backend])
+
+    if backend == 'keras':
+        model = load_model(path)
+        model.load_weights(os.path.join(model_dir, 'model.weights.h5'))
+        return model
+    if backend == 'onnx':
+        return OnnxBackend(path, num_threads)
+    # On CPUs with native float16 XNNPACK runs float16 models in half precision, which gave near-uniform
+    # probabilities for the complex model. The builtin kernels compute in float32
+    return TFLiteBackend(path, num_threads, xnnpack=backend != 'tflite-fp16')
@@ -1,31 +1,16 @@
 import cv2
-import json
 import os
 import mediapipe as mp
 import numpy as np
 import sys
-from keras.api.models import load_model
+from collections import deque
 
 root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(root_path)
 
-from data.helper import draw_landmarks, extract_landmarks, mp_detect
-
-# Load pre-trained model
-def load_trained_model():
-    # Load pre-trained model
-    model_path = os.path.join(os.getcwd(), '..', 'model', 'model.keras')
-    model = load_model(model_path)
-
-    model_weight = os.path.join(os.getcwd(), '..', 'model', 'model.weights.h5')
-    model.load_weights(model_weight)
-
-    # Load action label mapping
-    with open(os.path.join(os.getcwd(), '..', 'data', 'Processed_test_dataset', 'sign_mapping.json')) as f:
-        sign_mapping = json.load(f)
-    actions = list(sign_mapping)
-
-    return model, actions
+from data.frames import FramePreprocessor
+from data.helper import KeypointWindow, draw_landmarks, extract_landmarks, mp_detect
+from src.engine import get_engine, make_live_predictor
 
 # Helper: Draw probability bars
 def prob_viz(res, actions, input_frame, colors):
@@ -42,38 +27,6 @@ def draw_landmarks(image, results):
     mp_drawing.draw_landmarks(image, results.face_landmarks, mp_holistic.FACEMESH_TESSELATION)
     mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_holistic.POSE_CONNECTIONS)
 
-# Helper: Extract keypoints
-def extract_landmarks(results):
-    def flatten_landmarks(landmarks, dimensions=3):
-        return np.array([[getattr(res, attr) for attr in ('x', 'y', 'z')[:dimensions]] for res in landmarks.landmark]).flatten()
-    
-    left = flatten_landmarks(results.left_hand_landmarks) if results.left_hand_landmarks else np.zeros(21 * 3)
-    right = flatten_landmarks(results.right_hand_landmarks) if results.right_hand_landmarks else np.zeros(21 * 3)
-    face = flatten_landmarks(results.face_landmarks) if results.face_landmarks else np.zeros(468 * 3)
-    pose = np.array([[res.x, res.y, res.z, res.visibility] for res in results.pose_landmarks.landmark]).flatten() if results.pose_landmarks else np.zeros(33 * 4)
-    
-    return np.concatenate([pose, face, right, left])
-
-def resize_portrait(frame, target_size=(720,1280)):
-    target_w, target_h = target_size
-    h, w = frame.shape[:2]
-
-    # scale factor to englarge the height from 720 to 1280 or 16:9 aspect ratio
-    scale_factor = float(16) / 9
-
-    # Resize the frame with the scale factor
-    resized_frame = cv2.resize(frame, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_LINEAR)
-
-    # Reset new width to new frame
-    w = resized_frame.shape[1]
-
-    # Compute the starting x coordinatefor center-cropping to 720p width
-    start_x = (w - target_w) // 2
-    end_x = start_x + target_w
-    portrait_frame = resized_frame[:, start_x:end_x]
-
-    return portrait_frame
-
 # Visualization colors
 colors = [
     (245, 117, 16), (117, 245, 16), (16, 117, 245),
@@ -81,8 +34,11 @@ colors = [
     (50, 100, 245), (180, 117, 26), (216, 0, 245), (100, 50, 245)
 ]
 
-# Load Model
-model, actions = load_trained_model()
+# Load Model, on another backend when one is given: python detect.py tflite-int8
+engine = get_engine(sys.argv[1] if len(sys.argv) > 1 else None)
+model, actions = engine.get()
+schema = engine.schema
+predict = make_live_predictor(model)
 
 # Mediapipe holistic setup
 mp_holistic = mp.solutions.holistic
@@ -98,9 +54,15 @@ height = 720
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
 
+# Crops and scales webcam frames to 720x1280 portrait mode
+portrait = FramePreprocessor(size=(720, 1280), rgb=False)
+
 # Constants
 BAR_HEIGHT = 50
-sequence, sentence, predictions = [], [], []
+# Last 30 frames of keypoints and the last 10 predictions
+sequence = KeypointWindow(30, schema.size)
+predictions = deque(maxlen=10)
+sentence = []
 threshold = 0.5
 # Zooms out the portrait mode image to fit on screen
 zoom_out_factor = 0.6
@@ -111,29 +73,28 @@ while cap.isOpened():
         break
 
     # Change to portrait mode
-    frame = resize_portrait(frame)
+    frame = portrait.process(frame)
 
     # Process frame
     image, results = mp_detect(frame, holistic)
     draw_landmarks(image, results)
 
-    # Extract keypoints
-    keypoints = extract_landmarks(results)
-    sequence.append(keypoints)
-    sequence = sequence[-30:]
+    # Extract keypoints straight into the window
+    extract_landmarks(results, out=sequence.next_frame(), schema=schema)
+    sequence.advance()
     
     # Zoom out video to fit screen
     image = cv2.resize(image, None, fx=zoom_out_factor, fy=zoom_out_factor, interpolation=cv2.INTER_LINEAR) 
     
     text = "Awaiting Gesture..."
     # Prediction logic
-    if len(sequence) == 30:
-        res = model.predict(np.expand_dims(sequence, axis=0))[0]
+    if sequence.full:
+        res = predict(sequence.view())
         pred_index = np.argmax(res)
         predictions.append(pred_index)
 
         # Smoothing, make sure last 10 predictions all match and that the prediction % is past the threshhold
-        if np.unique(predictions[-10:])[0] == pred_index and res[pred_index] > threshold:
+        if np.unique(predictions)[0] == pred_index and res[pred_index] > threshold:
             if not sentence or actions[pred_index] != sentence[-1]:
                 sentence.append(actions[pred_index])
             
@@ -0,0 +1,167 @@
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+import keras
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.schema import load_schema
+from src.backends import load_backend
+
+# Default locations of the trained model and the action label mapping
+MODEL_DIR = os.path.join(root_path, 'model')
+SIGN_MAPPING_PATH = os.path.join(root_path, 'data', 'Processed_test_dataset', 'sign_mapping.json')
+
+# Backend the model runs on unless another one is asked for, see backends.py
+BACKEND = 'keras'
+
+# Shape of a single model input window (frames, keypoints per frame) for the full feature schema
+WINDOW_SHAPE = (30, 1662)
+
+# Holds the trained model and actions for the whole process so they are only loaded once
+class InferenceEngine:
+    def __init__(self, model_dir=MODEL_DIR, mapping_path=SIGN_MAPPING_PATH, backend=BACKEND):
+        self.model_dir = model_dir
+        self.backend = backend
+        self.mapping_path = mapping_path
+        self.model = None
+        self.actions = None
+        self.schema = None
+        self.error = None
+        self.load_time = None
+        self.warmup_time = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    # Load model, weights and actions, then run a warm-up prediction
+    def load(self):
+        # Only one thread loads, any other caller waits here until it is done
+        with self._lock:
+            if self.ready:
+                return
+
+            try:
+                start = time.perf_counter()
+                model = load_backend(self.backend, self.model_dir)
+
+                # Load action label mapping
+                with open(self.mapping_path) as f:
+                    sign_mapping = json.load(f)
+                actions = list(sign_mapping)
+
+                # Landmarks the model was trained on, saved next to it
+                schema = load_schema(self.model_dir)
+                if model.input_shape[-1] != schema.size:
+                    raise ValueError(f'Model expects {model.input_shape[-1]} features but {schema} has {schema.size}')
+                self.load_time = time.perf_counter() - start
+
+                # First prediction builds the graph, do it now instead of on the first upload
+                start = time.perf_counter()
+                model.predict_on_batch(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32))
+                self.warmup_time = time.perf_counter() - start
+            except Exception as e:
+                self.error = e
+                raise
+
+            self.model, self.actions, self.schema = model, actions, schema
+            self.error = None
+            self._ready.set()
+
+    # Load in a background thread so the caller (e.g. the server) can start right away
+    def start(self):
+        thread = threading.Thread(target=self._load_in_background, daemon=True)
+        thread.start()
+        return thread
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print('Error loading model:', e)
+
+    # Return the loaded model and actions, loading them first if needed
+    def get(self):
+        if not self.ready:
+            self.load()
+        return self.model, self.actions
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'backend': self.backend,
+            'load_time': self.load_time,
+            'warmup_time': self.warmup_time,
+            'schema': self.schema.name if self.schema else None,
+            'error': str(self.error) if self.error else None,
+        }
+
+# Score every 30-frame window of a (frames, keypoints) array, returns (windows, actions) probabilities
+def predict_windows(model, keypoints, batch_size=256):
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    window_len = WINDOW_SHAPE[0]
+    if len(keypoints) < window_len:
+        return np.zeros((0, model.output_shape[-1]), dtype=np.float32)
+
+    # Strided view of all windows, window i covers frames i..i+29, nothing is copied here
+    windows = np.lib.stride_tricks.sliding_window_view(keypoints, window_len, axis=0).transpose(0, 2, 1)
+
+    # Score in a few large batches instead of one predict call per frame
+    results = []
+    for start in range(0, len(windows), batch_size):
+        batch = np.ascontiguousarray(windows[start:start + batch_size])
+        results.append(np.asarray(model.predict_on_batch(batch)))
+    return np.concatenate(results)
+
+# Build the sentence from per-window probabilities, same smoothing as the frame by frame loop
+def smooth_predictions(probabilities, actions, threshold=0.5, history=10):
+    sentence = []
+    pred_indices = np.argmax(probabilities, axis=1)
+    for i, pred_index in enumerate(pred_indices):
+        # Make sure last 10 predictions all match and that the prediction % is past the threshhold
+        if np.unique(pred_indices[max(0, i - history + 1):i + 1])[0] == pred_index and probabilities[i, pred_index] > threshold:
+            if not sentence or actions[pred_index] != sentence[-1]:
+                sentence.append(actions[pred_index])
+    return sentence
+
+# Lightweight predictor for live video, one window per call with a fixed input signature
+def make_live_predictor(model):
+    window_shape = (1,) + tuple(model.input_shape[1:])
+
+    # TFLite and ONNX backends already run one window without any graph building
+    if not isinstance(model, keras.Model):
+        return lambda window: model.predict_on_batch(np.asarray(window, dtype=np.float32).reshape(window_shape))[0]
+
+    @tf.function(input_signature=[tf.TensorSpec(window_shape, tf.float32)])
+    def predict(window):
+        return model(window, training=False)
+
+    def live_predict(window):
+        return predict(np.asarray(window, dtype=np.float32).reshape(window_shape)).numpy()[0]
+
+    return live_predict
+
+# Process-wide engine shared by the server and the detection scripts
+engine = InferenceEngine()
+
+# One engine per backend, created the first time a backend is asked for
+engines = {BACKEND: engine}
+_engines_lock = threading.Lock()
+
+def get_engine(backend=None):
+    backend = backend or BACKEND
+    with _engines_lock:
+        if backend not in engines:
+            engines[backend] = InferenceEngine(backend=backend)
+        return engines[backend]
+
+def load_trained_model(backend=None):
+    return get_engine(backend).get()
@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import queue
+import sys
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.frames import MP_MAX_SIDE, TARGET_FPS, FramePreprocessor, sample_frames, sample_ratio
+from data.schema import FeatureSchema
+
+# Consecutive frames sent to the same MediaPipe worker, so its tracking sees mostly continuous motion
+CHUNK_FRAMES = 30
+
+# Seconds to wait for a result before checking that the processes are still alive
+POLL_TIMEOUT = 1.0
+
+# Frames in flight are stored in a ring of slots in shared memory, only the slot number is sent
+# between processes, never the pixels
+class FrameRing:
+    def __init__(self, slots, frame_shape, name=None):
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        size = slots * int(np.prod(self.frame_shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def close(self):
+        del self.frames
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+# Decoder process: resample and preprocess frames straight into free ring slots
+def _decode(video, ring_name, slots, frame_shape, rotate, target_fps, mp_max_side, free_slots, task_queues):
+    ring = FrameRing(slots, frame_shape, name=ring_name)
+    capture = cv2.VideoCapture(video)
+    preprocess = FramePreprocessor(max_side=mp_max_side, rotate=rotate)
+    try:
+        for index, frame in enumerate(sample_frames(capture, target_fps, skip=5)):
+            # Blocks while every slot is in use, so decoding can't run far ahead of MediaPipe
+            slot = free_slots.get()
+            preprocess.process(frame, out=ring.frames[slot])
+            task_queues[(index // CHUNK_FRAMES) % len(task_queues)].put((index, slot))
+    finally:
+        capture.release()
+        for tasks in task_queues:
+            tasks.put(None)
+        ring.close()
+
+# MediaPipe worker process: one Holistic graph each, landmarks go back tagged with the frame index.
+# (None, worker) tells the parent this worker has finished
+def _extract(worker, ring_name, slots, frame_shape, schema_dict, tasks, free_slots, results):
+    import mediapipe as mp
+    from data.helper import extract_landmarks
+
+    ring = FrameRing(slots, frame_shape, name=ring_name)
+    schema = FeatureSchema.from_dict(schema_dict)
+    keypoints = np.empty(schema.size, dtype=np.float32)
+    with mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, slot = task
+            image = ring.frames[slot]
+            image.flags.writeable = False
+            detection = holistic.process(image)
+            image.flags.writeable = True
+            # MediaPipe has copied the frame, the slot can be reused
+            free_slots.put(slot)
+            results.put((index, extract_landmarks(detection, out=keypoints, schema=schema)))
+    results.put((None, worker))
+    ring.close()
+
+# A process that ended without finishing its part, e.g. a native crash or the OOM killer. Processes
+# that return normally exit with 0
+def _died(process):
+    return not process.is_alive() and process.exitcode != 0
+
+# Run decode -> MediaPipe in separate processes: one decoder and `workers` MediaPipe processes.
+# Returns the keypoints of every resampled frame in order, like Video_to_Text.extract_keypoints
+def extract_keypoints_pipelined(video, schema, rotate=False, workers=2, cancel_event=None,
+                                target_fps=TARGET_FPS, mp_max_side=MP_MAX_SIDE, slots=None):
+    # Size of the preprocessed frames, needed up front to lay out the ring
+    capture = cv2.VideoCapture(video)
+    source_shape = (int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    expected_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) * sample_ratio(capture, target_fps)) + 1
+    capture.release()
+    if source_shape[0] == 0 or source_shape[1] == 0:
+        return np.zeros((0, schema.size), dtype=np.float32)
+    frame_shape = FramePreprocessor(max_side=mp_max_side, rotate=rotate).output_shape(source_shape)
+
+    # Spawn instead of fork, the parent has TensorFlow threads running
+    context = multiprocessing.get_context('spawn')
+    # Enough slots for every worker to have a whole chunk in flight, fewer and the chunks run one at a time
+    slots = slots or CHUNK_FRAMES * workers
+    ring = FrameRing(slots, frame_shape)
+    free_slots = context.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+    task_queues = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+
+    processes = [context.Process(
+        target=_decode,
+        args=(video, ring.shm.name, slots, frame_shape, rotate, target_fps, mp_max_side, free_slots, task_queues),
+        name='pipeline-decoder',
+        daemon=True,
+    )]
+    processes += [context.Process(
+        target=_extract,
+        args=(worker, ring.shm.name, slots, frame_shape, schema.to_dict(), tasks, free_slots, results),
+        name=f'pipeline-mediapipe-{worker}',
+        daemon=True,
+    ) for worker, tasks in enumerate(task_queues)]
+    decoder, extractors = processes[0], processes[1:]
+
+    # Results arrive out of order, they are put back in frame order here
+    keypoints = np.zeros((max(expected_frames, 30), schema.size), dtype=np.float32)
+    num_frames = 0
+    completed = False
+    try:
+        for process in processes:
+            process.start()
+
+        # Workers that have sent their last result, a finished worker has exited and that is fine
+        finished = set()
+        while len(finished) < workers:
+            if cancel_event is not None and cancel_event.is_set():
+                return keypoints[:0]
+            try:
+                result = results.get(timeout=POLL_TIMEOUT)
+            except queue.Empty:
+                # Without the decoder the workers would wait for frames forever
+                if _died(decoder):
+                    raise RuntimeError(f'The decoder process exited unexpectedly (exit code {decoder.exitcode})')
+                for worker, process in enumerate(extractors):
+                    if worker not in finished and _died(process):
+                        raise RuntimeError(f'A MediaPipe worker process exited unexpectedly (exit code {process.exitcode})')
+                continue
+
+            if result[0] is None:
+                finished.add(result[1])
+                continue
+            index, frame_keypoints = result
+            while index >= len(keypoints):
+                keypoints = np.concatenate([keypoints, np.zeros_like(keypoints)])
+            keypoints[index] = frame_keypoints
+            num_frames = max(num_frames, index + 1)
+        completed = True
+    finally:
+        # Processes are only waited on after a clean run, on cancel or error they are stopped
+        for process in processes:
+            if completed:
+                process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        ring.close()
+        ring.unlink()
+
+    return keypoints[:num_frames]
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import cv2
+import numpy as np
+
+root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(root_path)
+
+from data.frames import MP_MAX_SIDE, TARGET_FPS, FramePreprocessor, sample_frames, sample_ratio, sampled_frame_numbers
+from data.schema import FeatureSchema
+
+# Frames in a model window, each segment reads this many frames past its last window start
+WINDOW_FRAMES = 30
+
+# Resampled frames skipped at the start of every video, same as Video_to_Text.extract_keypoints
+SKIP_FRAMES = 5
+
+# Shortest segment worth its own process (10 seconds at 30 fps), shorter clips use fewer segments
+MIN_SEGMENT_FRAMES = 300
+
+# Seconds between checks of the cancel event while segments are running
+POLL_TIMEOUT = 1.0
+
+# Split the windows of a clip into contiguous segments, one per worker but none shorter than
+# min_frames. Returns (first_window, last_window) ranges; segment i reads frames
+# first_window .. last_window + 29, so consecutive segments overlap by one window
+def plan_segments(num_frames, workers=None, min_frames=MIN_SEGMENT_FRAMES):
+    num_windows = num_frames - WINDOW_FRAMES + 1
+    if num_windows <= 0:
+        return []
+    workers = workers or os.cpu_count() or 1
+    count = max(1, min(workers, num_windows // max(1, min_frames)))
+    bounds = np.linspace(0, num_windows, count + 1).astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+# Set in every worker process, lets the parent stop segments that are already running
+_cancel = None
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+# Worker: seek to the segment and extract count frames (None reads to the end) with a fresh Holistic
+def _extract_segment(video, schema_dict, start, skip, count, rotate, target_fps, mp_max_side, cancel=None):
+    import mediapipe as mp
+    from data.helper import extract_landmarks, mp_detect
+
+    schema = FeatureSchema.from_dict(schema_dict)
+    capture = cv2.VideoCapture(video)
+    preprocess = FramePreprocessor(max_side=mp_max_side, rotate=rotate)
+    keypoints = np.empty((count or 1, schema.size), dtype=np.float32)
+    num_keypoints = 0
+    cancel = cancel or _cancel
+    with mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+        for frame in sample_frames(capture, target_fps, skip=skip, start=start, count=count):
+            if cancel is not None and cancel.is_set():
+                break
+            _, results = mp_detect(preprocess.process(frame), holistic, to_bgr=False, is_rgb=True)
+            if num_keypoints == len(keypoints):
+                keypoints = np.concatenate([keypoints, np.empty_like(keypoints)])
+            extract_landmarks(results, out=keypoints[num_keypoints], schema=schema)
+            num_keypoints += 1
+    capture.release()
+    return keypoints[:num_keypoints]
+
+# Score a clip in time segments on separate processes. predict(keypoints) returns the probabilities of
+# every window of a keypoint array (e.g. engine.predict_windows), it runs here as each segment finishes.
+# Returns (windows, actions) probabilities stitched in order, the same rows as one sequential run
+def predict_segments(video, schema, predict, rotate=False, workers=None, cancel_event=None,
+                     target_fps=TARGET_FPS, mp_max_side=MP_MAX_SIDE, min_frames=MIN_SEGMENT_FRAMES):
+    capture = cv2.VideoCapture(video)
+    frame_numbers = sampled_frame_numbers(capture.get(cv2.CAP_PROP_FRAME_COUNT), sample_ratio(capture, target_fps))
+    capture.release()
+    frame_numbers = frame_numbers[SKIP_FRAMES:]
+    segments = plan_segments(len(frame_numbers), workers, min_frames)
+    if len(segments) < 2:
+        # Too short to split, no need for another process
+        keypoints = _extract_segment(video, schema.to_dict(), 0, SKIP_FRAMES, None, rotate, target_fps, mp_max_side, cancel_event)
+        return predict(keypoints)
+
+    context = multiprocessing.get_context('spawn')
+    cancel = context.Event()
+    executor = ProcessPoolExecutor(max_workers=len(segments), mp_context=context,
+                                   initializer=_init_worker, initargs=(cancel,))
+    futures = {}
+    results = {}
+    try:
+        for i, (first, last) in enumerate(segments):
+            # The first segment also skips the set-up frames, the last one reads to the end in case
+            # the container's frame count is off
+            start = 0 if i == 0 else int(frame_numbers[first])
+            skip = SKIP_FRAMES if i == 0 else 0
+            count = None if i == len(segments) - 1 else last - first + WINDOW_FRAMES - 1
+            futures[executor.submit(_extract_segment, video, schema.to_dict(), start, skip, count,
+                                    rotate, target_fps, mp_max_side)] = i
+
+        pending = set(futures)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                cancel.set()
+                return predict(np.zeros((0, schema.size), dtype=np.float32))
+            done, pending = wait(pending, timeout=POLL_TIMEOUT, return_when=FIRST_COMPLETED)
+            # Predict finished segments while the others are still extracting
+            for future in done:
+                results[futures[future]] = predict(future.result())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # Each segment scored its own windows plus nothing past the next segment's first window
+    stitched = []
+    for i, (first, last) in enumerate(segments):
+        probabilities = results[i]
+        if i < len(segments) - 1:
+            probabilities = probabilities[:last - first]
+        stitched.append(probabilities)
+    return np.concatenate(stitched)
@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+
+# Recorder of the current thread, None when nothing is being measured
+_recorder = ContextVar('stage_recorder', default=None)
+
+# Wall time, calls and allocations of each named stage of a transcription, for benchmarks/bench_stages.py
+# and the metrics and traces of the server.
+# Used as `with StageRecorder() as recorder: video_to_text(...)`, the code being measured marks its
+# stages with stage(name) and timed_iter(name, iterable). Stages are not nested.
+# With allocations=True tracemalloc runs for the whole recording, which slows everything down, so wall
+# times are best taken from a recording without it.
+# With trace=True every call is also kept as (name, start, seconds) for chrome_trace()
+class StageRecorder:
+    def __init__(self, allocations=False, trace=False):
+        self.allocations = allocations
+        self.stages = {}
+        self.events = [] if trace else None
+        self.started = None
+        self.finished = None
+        self._thread = None
+        self._token = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        self._token = _recorder.set(self)
+        self._thread = threading.get_ident()
+        self.started = time.perf_counter()
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        self.finished = time.perf_counter()
+        _recorder.reset(self._token)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds, blocks=0, peak=0, calls=1):
+        totals = self.stages.get(name)
+        if totals is None:
+            totals = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'blocks': 0, 'peak_bytes': 0}
+        totals['calls'] += calls
+        totals['seconds'] += seconds
+        totals['blocks'] += blocks
+        totals['peak_bytes'] = max(totals['peak_bytes'], peak)
+
+    # {stage: {calls, seconds, blocks, peak_bytes}} in the order the stages first ran. blocks is the net
+    # number of Python memory blocks a stage left allocated, peak_bytes the most memory one call of the
+    # stage allocated on top of what was there (numpy buffers included)
+    def report(self):
+        return {name: dict(totals) for name, totals in self.stages.items()}
+
+    # Recorded calls in the Chrome trace event format, opens in chrome://tracing and ui.perfetto.dev.
+    # One span for the whole recording named name, one span per stage call numbered by call
+    def chrome_trace(self, name='video_to_text'):
+        pid, tid = os.getpid(), self._thread
+        end = self.finished or time.perf_counter()
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}},
+            {'name': name, 'cat': 'recording', 'ph': 'X', 'ts': 0, 'dur': (end - self.started) * 1e6, 'pid': pid, 'tid': tid},
+        ]
+        calls = {}
+        for stage_name, start, seconds in self.events or ():
+            calls[stage_name] = calls.get(stage_name, -1) + 1
+            events.append({'name': stage_name, 'cat': 'stage', 'ph': 'X', 'ts': (start - self.started) * 1e6,
+                           'dur': seconds * 1e6, 'pid': pid, 'tid': tid, 'args': {'call': calls[stage_name]}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'stages': self.report()}}
+
+class _Stage:
+    __slots__ = ('recorder', 'name', 'start', 'blocks', 'memory')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        if self.recorder.allocations:
+            self.blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        if self.recorder.events is not None:
+            self.recorder.events.append((self.name, self.start, seconds))
+        if self.recorder.allocations:
+            self.recorder.add(self.name, seconds, sys.getallocatedblocks() - self.blocks,
+                              tracemalloc.get_traced_memory()[1] - self.memory)
+        else:
+            self.recorder.add(self.name, seconds)
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NO_STAGE = _NoStage()
+
+# Context manager timing one call of a stage, nothing is done when no recorder is active
+def stage(name):
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NO_STAGE
+    return recorder.stage(name)
+
+# Count items without timing anything, e.g. the frames of a video, recorded as calls of an untimed stage
+def count(name, amount):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(name, 0.0, calls=amount)
+
+# Iterate with the time spent producing each item counted as a stage, e.g. decoding frames
+def timed_iter(name, iterable):
+    if _recorder.get() is None:
+        return iterable
+    return _timed_iter(name, iter(iterable))
+
+def _timed_iter(name, iterator):
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
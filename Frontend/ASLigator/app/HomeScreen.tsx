@@ -12,6 +12,10 @@ import { useFocusEffect } from '@react-navigation/native';
 // Retrieve API URL from .env file
 const API_URL = process.env.EXPO_PUBLIC_API_URL
 
+// How often the translation job is polled, and how long to wait for it before giving up
+const POLL_INTERVAL_MS = 1000
+const JOB_TIMEOUT_MS = 5 * 60 * 1000
+
 export default function HomeScreen() {
   const router = useRouter();
   const auth = getAuth();
@@ -87,6 +91,28 @@ export default function HomeScreen() {
     );
   }
 
+  // Poll the server until the transcription job has finished, throws if it takes longer than
+  // JOB_TIMEOUT_MS or the server no longer knows the job (e.g. it was restarted)
+  const waitForJob = async (jobId: string) => {
+    const deadline = Date.now() + JOB_TIMEOUT_MS
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS))
+      let res
+      try {
+        res = await axios.get(`${API_URL}/jobs/${jobId}`)
+      } catch (error) {
+        if (axios.isAxiosError(error) && error.response?.status === 404) {
+          throw new Error('The server lost the translation, please record again.')
+        }
+        throw error
+      }
+      if (res.data.status !== 'queued' && res.data.status !== 'running') {
+        return res.data
+      }
+    }
+    throw new Error('The translation is taking too long, please try again later.')
+  };
+
   // Function to send video to Flask server
   const sendToServer = async (videoUri: string) => {
     try {
@@ -110,13 +136,21 @@ export default function HomeScreen() {
         },
       });
   
-      // On success, display message
+      // On success, display message and wait for the translation
       if (res.data.message) {
         alert('Video uploaded successfully!')
-        setTranslatedText(res.data.result.join(" "))
+        const job = await waitForJob(res.data.job_id)
+        if (job.status === 'done') {
+          setTranslatedText(job.result.join(" "))
+        } else if (job.status === 'cancelled') {
+          alert('The translation was cancelled.')
+        } else {
+          alert(`The translation failed: ${job.error || 'unknown error'}`)
+        }
       }
     } catch (error) {
       console.error('Error uploading video:', error)
+      alert(error instanceof Error ? error.message : 'Could not translate the video, please try again.')
     }
   };
 
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+# Parallel downloads, they wait on the network so threads are enough
+DOWNLOAD_WORKERS = 8
+
+# Attempts per request and the first wait between them, doubled after every failed attempt
+RETRIES = 4
+BACKOFF = 1.0
+
+# Seconds to wait for the server to answer
+TIMEOUT = 30
+
+# Status codes worth another attempt, anything else is final
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Outcome of each source, kept in the output folder so re-runs skip them
+STATE_FILE = 'download_state.json'
+DONE, FAILED, PRIVATE, UNAVAILABLE = 'done', 'failed', 'private', 'unavailable'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+# Raised when a source will never download, e.g. private or removed, so it is not retried
+class SourceUnavailable(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# One session shared by every download thread, keeps connections open between requests
+def create_session(workers=DOWNLOAD_WORKERS):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Call attempt() until it succeeds, waiting backoff, 2 * backoff, ... between attempts.
+# SourceUnavailable is final and raised right away
+def with_retry(attempt, retries=RETRIES, backoff=BACKOFF):
+    for i in range(retries):
+        try:
+            return attempt()
+        except SourceUnavailable:
+            raise
+        except Exception:
+            if i == retries - 1:
+                raise
+            time.sleep(backoff * 2 ** i)
+
+# GET with retries on connection errors and on the status codes in RETRY_STATUS
+def get_with_retry(session, url, retries=RETRIES, backoff=BACKOFF, **kwargs):
+    def attempt():
+        r = session.get(url, timeout=TIMEOUT, **kwargs)
+        if r.status_code in RETRY_STATUS:
+            r.close()
+            raise requests.HTTPError(f'{r.status_code} from {url}', response=r)
+        if r.status_code in (401, 403):
+            r.close()
+            raise SourceUnavailable(PRIVATE, f'{url} is private')
+        if r.status_code >= 400:
+            r.close()
+            raise SourceUnavailable(UNAVAILABLE, f'{r.status_code} from {url}')
+        return r
+    return with_retry(attempt, retries, backoff)
+
+# Write through a temporary file and rename it, a crash never leaves a half written file behind
+def download_file(session, url, path, retries=RETRIES, backoff=BACKOFF):
+    def attempt():
+        tmp_path = path + '.part'
+        with get_with_retry(session, url, 1, backoff, stream=True) as r, open(tmp_path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    with_retry(attempt, retries, backoff)
+
+def is_youtube(url):
+    host = urlparse(url).netloc.lower()
+    return host.endswith('youtube.com') or host.endswith('youtu.be')
+
+# Download a full source video to output_folder/full_video_name. YouTube pages are checked for
+# privacy through the shared session and the stream is fetched with pytubefix, any other URL is
+# downloaded directly. Raises SourceUnavailable for sources that will never download
+def download_source(session, url, output_folder, full_video_name, retries=RETRIES, backoff=BACKOFF):
+    path = os.path.join(output_folder, full_video_name)
+    if not is_youtube(url):
+        download_file(session, url, path, retries, backoff)
+        return path
+
+    # Only needed for YouTube sources
+    from pytubefix import YouTube, extract
+    from pytube.exceptions import VideoUnavailable
+
+    r = get_with_retry(session, url, retries, backoff)
+    if extract.is_private(r.text):
+        raise SourceUnavailable(PRIVATE, f'{url} is private')
+
+    def attempt():
+        try:
+            yt = YouTube(url)
+            if hasattr(yt, 'privacy_status') and yt.privacy_status == 'private':
+                raise SourceUnavailable(PRIVATE, f'{url} is private')
+            stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
+        except VideoUnavailable as e:
+            raise SourceUnavailable(UNAVAILABLE, str(e))
+        if not stream:
+            raise SourceUnavailable(UNAVAILABLE, f'{url} has no mp4 stream')
+        stream.download(output_path=output_folder, filename=full_video_name + '.part')
+        os.replace(path + '.part', path)
+    with_retry(attempt, retries, backoff)
+    return path
+
+# Download outcome of every source so far, {url: 'done' | 'failed' | 'private' | 'unavailable'}. 'done'
+# only says the source could be downloaded, which segments are cut is read from the output folder
+class DownloadState:
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, STATE_FILE)
+        self.sources = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.sources = json.load(f)
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        return self.sources.get(url)
+
+    # Record an outcome and save the whole state through a temporary file
+    def set(self, url, status):
+        with self._lock:
+            self.sources[url] = status
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.sources, f, indent=4)
+            os.replace(tmp_path, self.path)
@@ -1,128 +1,208 @@
 import json
 import os
-import requests
-from pytubefix import YouTube, extract
-from pytube.exceptions import VideoUnavailable
-from moviepy.editor import VideoFileClip
-
-def get_unique_path(output_folder, clean_text):
-    counter = 1
-    unique_path = os.path.join(output_folder, clean_text, f'{clean_text}.mp4')
-    
-    while os.path.exists(unique_path):
-        unique_path = os.path.join(output_folder, clean_text, f'{clean_text}_{counter}.mp4')  
-        counter += 1
-    return unique_path
-
-def download_and_trim_videos(json_file_path, output_folder, start_index=0, end_index=None):
-    os.makedirs(output_folder, exist_ok=True)
-    with open(json_file_path, 'r') as f:
-        data = json.load(f)
-    
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from download import DONE, DOWNLOAD_WORKERS, FAILED, DownloadState, SourceUnavailable, create_session, download_source
+
+# A segment starting this close to a keyframe (seconds) is cut with stream copy
+KEYFRAME_TOLERANCE = 0.05
+
+def normalize_url(url):
+    if not url.startswith('http'):
+        url = 'https://' + url
+    return url
+
+# Group MS-ASL items by source video so each one is downloaded and opened once, wherever its items are
+# in the file. Returns [{'url', 'file', 'segments': [(index, clean_text, start_time, end_time)]}]
+def plan_sources(data, start_index=0, end_index=None):
     if end_index is None or end_index > len(data):
         end_index = len(data)
-    
-    data_range = data[start_index:end_index]
-    
-    
-    
-    for idx, item in enumerate(data_range):
+
+    sources = {}
+    for idx, item in enumerate(data[start_index:end_index]):
         curr_idx = start_index + idx
-        
-        url = item.get('url', '')
-        
-        if not url.startswith('http'):
-            url = 'https://' + url
-            
-        clean_text = str(item.get('clean_text', 'video'))
-        vid_text = str(item.get('file', 'video'))
-        full_video_path = os.path.join(output_folder, vid_text + '_full.mp4')
-        trimmed_video_path = get_unique_path(output_folder, clean_text)
-
-        if os.path.exists(full_video_path):
-            print(f'Video {vid_text} already exists, Skipping to trimming')
-        else:    
-            # print(f"Downloading {file_name} from {url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9'
-            }
-            try:
-                r = requests.get(url, headers=headers)
-                if r.status_code == 200 and extract.is_private(r.text):
-                    None
-                    # print(f"Private.")
-                    continue
-                elif r.status_code != 200: 
-                    None
-                    # print(f"Warning")
-            except Exception as e:
-                None
-                # print(f"Error")
-            try:
-                yt = YouTube(url)
-                if hasattr(yt, 'privacy_status') and yt.privacy_status == 'private':
-                    None
-                    # print(f"Skipping {file_name}: Video is private.")
-                    continue
-            except VideoUnavailable:
-                None
-                # print(f"Skipping {file_name}: Video unavailable.")
-                continue
-            except Exception as e:
-                None
-                # print(f"Skipping {clean_text} due to error: {e}")
-                continue
-            try:
-                stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
-                if not stream:
-                    None
-                    # print(f"Skipping {file_name}.")
-                    continue
-                
-                stream.download(output_path=output_folder, filename=vid_text + '_full.mp4')     
-            except Exception as e:
-                print(f"Error downloading {clean_text}: {e}")
-                continue
         try:
             start_time = float(item.get('start_time', 0))
             end_time = float(item.get('end_time', 0))
-            if end_time <= start_time:
-                # print(f"Skipping {file_name}: Invalid time range.")
-                os.remove(full_video_path)
-                continue
-        except Exception as e:
+        except (TypeError, ValueError):
             # print(f"Error reading start/end times for {file_name}: {e}")
-            os.remove(full_video_path)
             continue
-        
+        if end_time <= start_time:
+            # print(f"Skipping {file_name}: Invalid time range.")
+            continue
+
+        url = normalize_url(item.get('url', ''))
+        source = sources.setdefault(url, {'url': url, 'file': str(item.get('file', 'video')), 'segments': []})
+        source['segments'].append((curr_idx, str(item.get('clean_text', 'video')), start_time, end_time))
+
+    for source in sources.values():
+        source['segments'].sort(key=lambda segment: segment[2])
+    return list(sources.values())
+
+# ffmpeg bundled with moviepy's imageio-ffmpeg, or the one on the PATH
+def ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return 'ffmpeg'
+
+# Timestamps of the keyframes of a video, only keyframes are decoded
+def keyframe_times(video_path):
+    result = subprocess.run(
+        [ffmpeg_exe(), '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', video_path,
+         '-an', '-vf', 'showinfo', '-f', 'null', '-'],
+        capture_output=True, text=True, check=True
+    )
+    return [float(t) for t in re.findall(r'pts_time:\s*([-\d.]+)', result.stderr)]
+
+# Cut start_time..end_time out of a source video. Stream copy when the segment starts on a keyframe,
+# otherwise a fast re-encode since a copy could only start at the keyframe before. Returns which was used
+def cut_segment(source_path, start_time, end_time, output_path, keyframes):
+    copy = any(abs(keyframe - start_time) <= KEYFRAME_TOLERANCE for keyframe in keyframes)
+    if copy:
+        codec = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+    else:
+        codec = ['-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac']
+
+    # Write to a temporary name so an interrupted cut is not mistaken for a finished one
+    tmp_path = output_path + '.part.mp4'
+    subprocess.run(
+        [ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y', '-ss', f'{start_time:.3f}', '-i', source_path,
+         '-t', f'{end_time - start_time:.3f}', *codec, tmp_path],
+        capture_output=True, check=True
+    )
+    os.replace(tmp_path, output_path)
+    return 'copy' if copy else 'encode'
+
+# Trimmed videos are named by their index in the MS-ASL file, so parallel sources never pick the
+# same name and a re-run can skip segments that are already cut
+def segment_path(output_folder, clean_text, index):
+    return os.path.join(output_folder, clean_text, f'{clean_text}_{index}.mp4')
+
+# Cut every segment of one source video, download(url, output_folder, name) fetches it first if it is
+# missing. Returns (url, {'copy': n, 'encode': n, 'skipped': n, 'failed': n})
+def process_source(source, output_folder, trim=True, download=None):
+    counts = {'copy': 0, 'encode': 0, 'skipped': 0, 'failed': 0}
+    full_video_name = source['file'] + '_full.mp4'
+    full_video_path = os.path.join(output_folder, full_video_name)
+
+    todo = [segment for segment in source['segments'] if not os.path.exists(segment_path(output_folder, segment[1], segment[0]))]
+    counts['skipped'] = len(source['segments']) - len(todo)
+    if not trim:
+        todo = []
+
+    if os.path.exists(full_video_path):
+        print(f'Video {source["file"]} already exists, Skipping to trimming')
+    elif todo:
         try:
-            # Make dir for folder/class
-            class_dir = os.path.join(output_folder, clean_text)
-            os.makedirs(class_dir, exist_ok=True)
-            print(f'downloading to: {class_dir}')
-            
-            clip = VideoFileClip(full_video_path)
-            trimmed_clip = clip.subclip(start_time, end_time)
-            trimmed_clip.write_videofile(trimmed_video_path, codec="libx264", audio_codec="aac", verbose=False,
-                                         logger=None)
-            clip.close()
-            trimmed_clip.close()
-            print(f"Trimmed video saved as {trimmed_video_path}")
+            download(source['url'], output_folder, full_video_name)
+        except Exception as e:
+            print(f'Error downloading {source["url"]}: {e}')
+            counts['failed'] += len(todo)
+            return source['url'], counts
 
+    if todo:
+        try:
+            keyframes = keyframe_times(full_video_path)
         except Exception as e:
-            print(f"Error trimming {clean_text}: {e}")
-            continue
-        
-        next_item = data[curr_idx + 1] if curr_idx + 1 < len(data) else None
-        next_url = next_item.get('url', '') if next_item else None
-        if not next_url.startswith('http'):
-            next_url = 'https://' + next_url
-        if next_url != url:
-            if os.path.exists(full_video_path):
-                os.remove(full_video_path)
-                print(f'Deleting full video {vid_text}')
+            print(f'Error reading {full_video_path}: {e}')
+            counts['failed'] += len(todo)
+            return source['url'], counts
+
+        for index, clean_text, start_time, end_time in todo:
+            trimmed_video_path = segment_path(output_folder, clean_text, index)
+            try:
+                # Make dir for folder/class
+                os.makedirs(os.path.dirname(trimmed_video_path), exist_ok=True)
+                counts[cut_segment(full_video_path, start_time, end_time, trimmed_video_path, keyframes)] += 1
+                print(f"Trimmed video saved as {trimmed_video_path}")
+            except Exception as e:
+                print(f"Error trimming {clean_text}: {e}")
+                counts['failed'] += 1
+
+    # Every segment of this source is cut, the full video is no longer needed
+    if trim and counts['failed'] == 0 and os.path.exists(full_video_path):
+        os.remove(full_video_path)
+        print(f'Deleting full video {source["file"]}')
+    return source['url'], counts
+
+# Download a source in a fetch thread, returns (source, None) or (source, state of the failure)
+def fetch_source(session, source, output_folder):
+    try:
+        download_source(session, source['url'], output_folder, source['file'] + '_full.mp4')
+    except SourceUnavailable as e:
+        print(f'Skipping {source["url"]}: {e}')
+        return source, e.status
+    except Exception as e:
+        print(f'Error downloading {source["url"]}: {e}')
+        return source, FAILED
+    return source, None
+
+# Downloads run in a pool of threads sharing one HTTP session, each finished download is handed to the
+# trimming processes right away so cutting overlaps with the downloads still running. The download
+# outcome of every source is kept in download_state.json, re-runs skip sources that are private or
+# unavailable, and failed ones unless retry_failed. What is left to do for a downloaded source is read
+# from disk: segments that are not cut yet, e.g. from a download-only run or a new index range, are
+# cut, downloading the source again if its full video was already deleted.
+# trim=False only downloads and keeps the full videos, for Backend/data/Capture_MSASL.py to read by timestamp
+def download_and_trim_videos(json_file_path, output_folder, start_index=0, end_index=None, trim=True, workers=None,
+                             download_workers=DOWNLOAD_WORKERS, retry_failed=False, session=None):
+    os.makedirs(output_folder, exist_ok=True)
+    with open(json_file_path, 'r') as f:
+        data = json.load(f)
+
+    sources = plan_sources(data, start_index, end_index)
+    print(f'{sum(len(source["segments"]) for source in sources)} segments from {len(sources)} source videos')
+
+    state = DownloadState(output_folder)
+    session = session or create_session(download_workers)
+    totals = {'copy': 0, 'encode': 0, 'skipped': 0, 'failed': 0, 'unavailable': 0}
+
+    # Record the outcome of a source once its segments are cut
+    def add_counts(url, counts):
+        for key in counts:
+            totals[key] += counts[key]
+        state.set(url, DONE if counts['failed'] == 0 else FAILED)
+
+    # Whether a source still has work: segments to cut, or for download-only runs its full video
+    def has_work(source):
+        if trim:
+            return any(not os.path.exists(segment_path(output_folder, clean_text, index))
+                       for index, clean_text, _, _ in source['segments'])
+        return not os.path.exists(os.path.join(output_folder, source['file'] + '_full.mp4'))
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as trimmers, \
+            ThreadPoolExecutor(max_workers=download_workers) as fetchers:
+        trims, fetches = [], []
+        for source in sources:
+            status = state.get(source['url'])
+            if status not in (None, DONE) and (status != FAILED or not retry_failed):
+                totals['unavailable'] += len(source['segments'])
+            elif not has_work(source):
+                totals['skipped'] += len(source['segments'])
+            elif os.path.exists(os.path.join(output_folder, source['file'] + '_full.mp4')):
+                trims.append(trimmers.submit(process_source, source, output_folder, trim))
+            else:
+                fetches.append(fetchers.submit(fetch_source, session, source, output_folder))
+
+        for fetch in as_completed(fetches):
+            source, status = fetch.result()
+            if status is not None:
+                totals['unavailable' if status != FAILED else 'failed'] += len(source['segments'])
+                state.set(source['url'], status)
+            elif trim:
+                trims.append(trimmers.submit(process_source, source, output_folder, trim))
+            else:
+                state.set(source['url'], DONE)
+
+        for future in as_completed(trims):
+            add_counts(*future.result())
 
+    print(f'Cut {totals["copy"]} segments with stream copy and {totals["encode"]} by re-encoding, '
+          f'{totals["skipped"]} already done, {totals["failed"]} failed, {totals["unavailable"]} private or unavailable')
+    return totals
 
 if __name__ == '__main__':
     # print(os.getcwd())